@@ -0,0 +1,182 @@
+import contextvars
+import sqlite3
+import threading
+
+from config import ACCOUNTS_PATH, ACCOUNTS_SECRET
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    name TEXT PRIMARY KEY,
+    api_key BLOB NOT NULL,
+    api_secret BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    account TEXT NOT NULL
+);
+"""
+
+# Account built from the binance_api_key and binance_api_secret variables
+DEFAULT_ACCOUNT = "default"
+
+NONCE_SIZE = 16
+TAG_SIZE = 16
+
+# Account of the Telegram user whose update is being handled
+current_account = contextvars.ContextVar("binance_account")
+
+
+class KeyStore:
+    """
+    Binance API keys of the team accounts and the Telegram users bound to them.
+    Keys are encrypted with AES-GCM under a key derived with scrypt from
+    secret (the accounts_secret variable), the account name is authenticated
+    with each key so a key cannot be moved to another account.
+    """
+
+    def __init__(self, path=None, secret=None):
+        self.path = path or ACCOUNTS_PATH
+        self.secret = secret if secret is not None else ACCOUNTS_SECRET
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._key = None
+
+    def add_account(self, name, api_key, api_secret):
+        row = (name, self._encrypt(name, api_key), self._encrypt(name, api_secret))
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO accounts VALUES (?, ?, ?)", row)
+
+    def account_keys(self, name):
+        """Decrypted (api_key, api_secret) of an account, None if there is no such account"""
+        with self._lock:
+            row = self._db.execute("SELECT api_key, api_secret FROM accounts WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return self._decrypt(name, row[0]), self._decrypt(name, row[1])
+
+    def account_names(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT name FROM accounts ORDER BY name")]
+
+    def bind(self, user_id, name):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO users VALUES (?, ?)", (user_id, name))
+
+    def unbind(self, user_id):
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM users WHERE user_id = ?", (user_id,)).rowcount > 0
+
+    def account_of(self, user_id):
+        """Account bound to a Telegram user, None if the user has none"""
+        with self._lock:
+            row = self._db.execute("SELECT account FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def users(self):
+        with self._lock:
+            return self._db.execute("SELECT user_id, account FROM users ORDER BY account, user_id").fetchall()
+
+    def _cipher_key(self):
+        # pycryptodome is only loaded once there are team accounts
+        from Crypto.Protocol.KDF import scrypt
+        from Crypto.Random import get_random_bytes
+
+        if self._key is None:
+            if not self.secret:
+                raise RuntimeError("Set accounts_secret to store or read account keys")
+            with self._lock, self._db:
+                row = self._db.execute("SELECT value FROM meta WHERE key = 'salt'").fetchone()
+                if row is None:
+                    row = (get_random_bytes(16),)
+                    self._db.execute("INSERT INTO meta VALUES ('salt', ?)", row)
+            self._key = scrypt(self.secret, row[0], 32, N=2 ** 15, r=8, p=1)
+        return self._key
+
+    def _encrypt(self, name, text):
+        from Crypto.Cipher import AES
+        from Crypto.Random import get_random_bytes
+
+        cipher = AES.new(self._cipher_key(), AES.MODE_GCM, nonce=get_random_bytes(NONCE_SIZE))
+        cipher.update(name.encode())
+        ciphertext, tag = cipher.encrypt_and_digest(text.encode())
+        return cipher.nonce + tag + ciphertext
+
+    def _decrypt(self, name, blob):
+        from Crypto.Cipher import AES
+
+        nonce, tag, ciphertext = blob[:NONCE_SIZE], blob[NONCE_SIZE:NONCE_SIZE + TAG_SIZE], blob[NONCE_SIZE + TAG_SIZE:]
+        cipher = AES.new(self._cipher_key(), AES.MODE_GCM, nonce=nonce)
+        cipher.update(name.encode())
+        # Raises ValueError with a wrong accounts_secret or a tampered key
+        return cipher.decrypt_and_verify(ciphertext, tag).decode()
+
+
+class Account:
+    """Client, ledger, streams, portfolio and order watcher of one Binance account"""
+
+    def __init__(self, name, client, ledger, live_state, stream_engine, portfolio, history, order_watcher):
+        self.name = name
+        self.client = client
+        self.ledger = ledger
+        self.live_state = live_state
+        self.stream_engine = stream_engine
+        self.portfolio = portfolio
+        self.history = history
+        self.order_watcher = order_watcher
+
+
+class AccountPool:
+    """
+    Accounts built on first use and kept for the life of the process, so
+    every account keeps its HTTP session, stream and caches.
+    build(name, api_key, api_secret) returns the Account. Once the pool is
+    started every account follows its streams, also when built later.
+    """
+
+    def __init__(self, store, build, default_keys=None, streams=True):
+        self.store = store
+        self.build = build
+        self.default_keys = default_keys
+        self.streams = streams
+        self.started = False
+        self._accounts = {}
+
+    def start(self):
+        """Build every account and start their streams"""
+        for name in self.names():
+            self.get(name)
+        self.started = True
+        if self.streams:
+            for account in self._accounts.values():
+                account.stream_engine.start()
+
+    async def stop(self):
+        for account in self._accounts.values():
+            await account.stream_engine.stop()
+            account.client.close()
+
+    def names(self):
+        names = self.store.account_names()
+        if self.default_keys:
+            names.insert(0, DEFAULT_ACCOUNT)
+        return names
+
+    def get(self, name):
+        """Account called name, None if it is neither stored nor the default"""
+        if name not in self._accounts:
+            keys = self.default_keys if name == DEFAULT_ACCOUNT else self.store.account_keys(name)
+            if not keys:
+                return None
+            account = self._accounts[name] = self.build(name, *keys)
+            if self.started and self.streams:
+                account.stream_engine.start()
+        return self._accounts[name]
+
+    def accounts(self):
+        """Accounts built so far"""
+        return list(self._accounts.values())
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right
+
+from config import ALERTS_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    above INTEGER NOT NULL,
+    threshold REAL NOT NULL
+);
+"""
+
+# Comparison operators accepted by /alert, True for "price goes above"
+OPERATORS = {
+    '>': True,
+    '>=': True,
+    '<': False,
+    '<=': False,
+}
+
+logger = logging.getLogger(__name__)
+
+
+class Alert:
+    """One-shot price alert of a chat"""
+
+    __slots__ = ('id', 'chat_id', 'symbol', 'above', 'threshold')
+
+    def __init__(self, id, chat_id, symbol, above, threshold):
+        self.id = id
+        self.chat_id = chat_id
+        self.symbol = symbol
+        self.above = bool(above)
+        self.threshold = threshold
+
+    @property
+    def operator(self):
+        return '>' if self.above else '<'
+
+    def crossed(self, price):
+        return price >= self.threshold if self.above else price <= self.threshold
+
+
+class SymbolAlerts:
+    """
+    Alerts of one symbol in two lists sorted by threshold.
+    The alerts crossed by a price are always a prefix of the "above" list and
+    a suffix of the "below" list, so a tick finds them with one bisect each.
+    """
+
+    def __init__(self):
+        self.above_thresholds = []
+        self.above = []
+        self.below_thresholds = []
+        self.below = []
+
+    def __len__(self):
+        return len(self.above) + len(self.below)
+
+    def add(self, alert):
+        thresholds, alerts = self._side(alert)
+        i = bisect_right(thresholds, alert.threshold)
+        thresholds.insert(i, alert.threshold)
+        alerts.insert(i, alert)
+
+    def remove(self, alert):
+        thresholds, alerts = self._side(alert)
+        i = bisect_left(thresholds, alert.threshold)
+        while alerts[i] is not alert:
+            i += 1
+        del thresholds[i]
+        del alerts[i]
+
+    def pop_crossed(self, price):
+        """Remove and return the alerts crossed by price"""
+        crossed = []
+        i = bisect_right(self.above_thresholds, price)
+        if i:
+            crossed += self.above[:i]
+            del self.above_thresholds[:i]
+            del self.above[:i]
+        i = bisect_left(self.below_thresholds, price)
+        if i < len(self.below):
+            crossed += self.below[i:]
+            del self.below_thresholds[i:]
+            del self.below[i:]
+        return crossed
+
+    def _side(self, alert):
+        if alert.above:
+            return self.above_thresholds, self.above
+        return self.below_thresholds, self.below
+
+
+class AlertEngine:
+    """
+    Price alerts stored in SQLite and indexed in memory per symbol.
+    on_prices is a Prices listener: each tick only touches the alerts it
+    crossed. Crossed alerts are removed and queued, and every chat gets
+    one message per batch through notify, an awaitable notify(chat_id, alerts).
+    """
+
+    def __init__(self, path=None, notify=None):
+        self.path = path or ALERTS_PATH
+        self.notify = notify
+        self.pending = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._alerts = {}
+        self._index = {}
+        self._flush = None
+        for row in self._db.execute("SELECT id, chat_id, symbol, above, threshold FROM alerts"):
+            self._insert(Alert(*row))
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def add(self, chat_id, symbol, above, threshold):
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO alerts (chat_id, symbol, above, threshold) VALUES (?, ?, ?, ?)",
+                (chat_id, symbol, int(above), threshold)
+            )
+        alert = Alert(cursor.lastrowid, chat_id, symbol, above, threshold)
+        self._insert(alert)
+        return alert
+
+    def remove(self, chat_id, alert_id):
+        """Delete an alert of chat_id, False if it has no such alert"""
+        alert = self._alerts.get(alert_id)
+        if alert is None or alert.chat_id != chat_id:
+            return False
+        self._index[alert.symbol].remove(alert)
+        self._delete([alert])
+        return True
+
+    def alerts(self, chat_id):
+        return sorted((a for a in self._alerts.values() if a.chat_id == chat_id), key=lambda a: a.id)
+
+    def check(self, prices):
+        """Remove and return the alerts crossed by {symbol: price}"""
+        # A bulk snapshot has every symbol, walk whichever side is smaller
+        if len(prices) > len(self._index):
+            symbols = [symbol for symbol in self._index if symbol in prices]
+        else:
+            symbols = [symbol for symbol in prices if symbol in self._index]
+
+        crossed = []
+        for symbol in symbols:
+            crossed += self._index[symbol].pop_crossed(prices[symbol])
+        if crossed:
+            self._delete(crossed)
+        return crossed
+
+    def on_prices(self, prices):
+        crossed = self.check(prices)
+        if not crossed or self.notify is None:
+            return
+        self.pending += crossed
+        # Everything crossed until the flush runs goes out in the same batch
+        if self._flush is None:
+            self._flush = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        """Send the pending alerts, one message per chat"""
+        batch, self.pending = self.pending, []
+        self._flush = None
+        by_chat = {}
+        for alert in batch:
+            by_chat.setdefault(alert.chat_id, []).append(alert)
+        for chat_id, alerts in by_chat.items():
+            try:
+                await self.notify(chat_id, alerts)
+            except Exception as e:
+                logger.warning("Alert notification to %s failed: %s", chat_id, e)
+
+    def _insert(self, alert):
+        self._alerts[alert.id] = alert
+        if alert.symbol not in self._index:
+            self._index[alert.symbol] = SymbolAlerts()
+        self._index[alert.symbol].add(alert)
+
+    def _delete(self, alerts):
+        for alert in alerts:
+            del self._alerts[alert.id]
+            index = self._index.get(alert.symbol)
+            if index is not None and not index:
+                del self._index[alert.symbol]
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM alerts WHERE id = ?", [(alert.id,) for alert in alerts])
@@ -1,18 +1,210 @@
 import asyncio
+import functools
+import importlib
+import itertools
+import logging
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from getpass import getpass
+from urllib.parse import urlsplit
 
-from binance.spot import Spot
 from binance.error import ClientError
 from telegram import Update, ReplyKeyboardMarkup
-from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes
+
+from accounts import DEFAULT_ACCOUNT, Account, AccountPool, KeyStore, current_account
+from alerts import OPERATORS, AlertEngine
+from async_client import AsyncSpot
+from cache import ResponseCache
+from charts import ChartRenderer
+from config import (
+    ACCOUNTS_DIR, ADMIN_USER_IDS, ALERT_POLL_INTERVAL, BINANCE_ACCOUNT_WEIGHT_LIMIT, BINANCE_API_KEY,
+    BINANCE_API_SECRET, BINANCE_API_URL, BINANCE_MAX_CONCURRENCY, BINANCE_STREAM_URL, BINANCE_STREAMS,
+    BINANCE_THREADS, BINANCE_WEIGHT_LIMIT, MAX_ALERTS_PER_CHAT, METRICS_PORT, ORDER_POLL_INTERVAL, PORTFOLIO_INTERVAL,
+    PORTFOLIO_MAX_STALE, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN, TELEGRAM_WEBHOOK_LISTEN,
+    TELEGRAM_WEBHOOK_PORT, TELEGRAM_WEBHOOK_SECRET, TELEGRAM_WEBHOOK_URL,
+)
+import symbol_index
+from ledger import TradeLedger
+from markets import Markets
+from orders import OrderWatcher
+from metrics import Metrics, TracedRequest, serve as serve_metrics
+from prices import USD_ASSET, Prices
+from render import CALLBACK_PREFIX, escape, send_pages, turn_page
+from stream import LiveState, StreamEngine, STREAM_URL
+from ratelimit import WeightScheduler, background
+from warm_state import WarmState
+
+# Updates the handlers consume, Telegram does not send the other types at all
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+logger = logging.getLogger(__name__)
+
+metrics = Metrics()
+metrics_server = None
+# Set once the bot is initialized, for the notifications sent outside of handlers
+telegram_bot = None
+
+# Binance counts request weight per IP, every account shares the bucket and the threads
+weight_scheduler = WeightScheduler(limit=BINANCE_WEIGHT_LIMIT)
+binance_executor = ThreadPoolExecutor(max_workers=BINANCE_THREADS, thread_name_prefix="binance")
+
+def new_spot(api_key=None, api_secret=None):
+    """Spot client reporting the used weight, on binance_api_url when it is set"""
+    # binance-connector and requests take a while to import, only load them when a client is built
+    from binance.spot import Spot
+
+    kwargs = {'base_url': BINANCE_API_URL} if BINANCE_API_URL else {}
+    return Spot(api_key=api_key, api_secret=api_secret, show_limit_usage=True, **kwargs)
+
+# Market data needs no keys, the client is built on first use
+public_client = AsyncSpot(
+    new_spot,
+    max_concurrency=BINANCE_MAX_CONCURRENCY,
+    scheduler=weight_scheduler,
+    executor=binance_executor,
+    metrics=metrics
+)
+markets = Markets(public_client)
+prices = Prices(public_client, markets)
+response_cache = ResponseCache(ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_SIZE)
+chart_renderer = ChartRenderer()
+alert_engine = AlertEngine()
+prices.listeners.append(alert_engine.on_prices)
+warm_state = WarmState()
+startup_task = None
+background_tasks = set()
+
+metrics.gauge("binance_used_weight", "Binance used weight (1m)", lambda: weight_scheduler.used_weight)
+metrics.gauge("binance_weight_tokens", "Request weight left in the bucket", lambda: weight_scheduler.tokens)
+metrics.gauge("response_cache_hit_ratio", "Response cache hit ratio", lambda: response_cache.stats()['hit_ratio'])
+metrics.gauge("chart_cache_hit_ratio", "Chart cache hit ratio", lambda: chart_renderer.cache.stats()['hit_ratio'])
+metrics.gauge("price_alerts", "Price alerts", lambda: len(alert_engine))
+metrics.gauge("accounts", "Accounts built", lambda: len(account_pool.accounts()))
+
+def build_account(name, api_key, api_secret):
+    """Client, ledger, streams, portfolio and order watcher of one account"""
+    # NumPy and the P&L stack are only imported once an account is built
+    from history import History
+    from portfolio import Portfolio
+
+    def new_client():
+        from requests.adapters import HTTPAdapter
+
+        spot = new_spot(api_key, api_secret)
+        # One keep-alive connection per request the account may have in flight
+        spot.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=BINANCE_MAX_CONCURRENCY))
+        return spot
+
+    client = AsyncSpot(
+        new_client,
+        max_concurrency=BINANCE_MAX_CONCURRENCY,
+        scheduler=weight_scheduler,
+        budget=WeightScheduler(limit=BINANCE_ACCOUNT_WEIGHT_LIMIT),
+        executor=binance_executor,
+        metrics=metrics
+    )
 
-# Your keys
-BINANCE_API_KEY = os.environ["binance_api_key"]
-BINANCE_API_SECRET = os.environ["binance_api_secret"]
-TELEGRAM_BOT_TOKEN = os.environ["telegram_bot_token"]
+    if name == DEFAULT_ACCOUNT:
+        ledger = TradeLedger(client)
+        history = History()
+    else:
+        directory = os.path.join(ACCOUNTS_DIR, name)
+        os.makedirs(directory, exist_ok=True)
+        ledger = TradeLedger(client, os.path.join(directory, "trades.db"))
+        history = History(os.path.join(directory, "history"))
+
+    live_state = LiveState(prices)
+    # Prices are shared, the first account also follows the market tickers
+    stream_engine = StreamEngine(
+        client, live_state, ledger, stream_url=BINANCE_STREAM_URL or STREAM_URL, tickers=not account_pool.accounts()
+    )
+    portfolio = Portfolio(ledger, markets, prices)
+    order_watcher = OrderWatcher(client, notify=lambda changes: send_order_changes(name, changes))
+    live_state.listeners.append(order_watcher.on_event)
+    account = Account(name, client, ledger, live_state, stream_engine, portfolio, history, order_watcher)
+    warm_state.restore(account)
+    return account
+
+account_store = KeyStore()
+account_pool = AccountPool(
+    account_store,
+    build_account,
+    default_keys=(BINANCE_API_KEY, BINANCE_API_SECRET) if BINANCE_API_KEY else None,
+    streams=BINANCE_STREAMS
+)
+
+def account_name_of(user_id):
+    """Account a Telegram user may use, admins fall back to the default account"""
+    name = account_store.account_of(user_id)
+    if name is None and user_id in ADMIN_USER_IDS and BINANCE_API_KEY:
+        name = DEFAULT_ACCOUNT
+    return name
+
+def authorized(handler):
+    """Run handler with the account of the user, refuse users bound to no account"""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user_id = update.effective_user.id
+        name = account_name_of(user_id)
+        account = account_pool.get(name) if name else None
+        if account is None:
+            await update.effective_message.reply_text(
+                f"⛔ Not authorized. Your Telegram user id is {user_id}, ask an admin to bind it to an account."
+            )
+            return
+        token = current_account.set(account)
+        try:
+            return await handler(update, context)
+        finally:
+            current_account.reset(token)
 
-binance_client = Spot(api_key=BINANCE_API_KEY, api_secret=BINANCE_API_SECRET)
+    return wrapper
+
+def admin_only(handler):
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.effective_user.id not in ADMIN_USER_IDS:
+            await update.effective_message.reply_text("⛔ Only admins can do this.")
+            return
+        return await handler(update, context)
+
+    return wrapper
+
+# Quote currencies searched for the trades of an asset
+QUOTE_ASSETS = ['USDT', 'USDC', 'BTC', 'ETH']
+
+async def get_account():
+    """Balances from the live stream, from REST while the stream is down"""
+    account = current_account.get()
+    if account.live_state.live:
+        return account.live_state.account()
+    return await account.client.account()
+
+async def get_open_orders():
+    """Open orders from the live stream or the last order poll, from REST when both are stale"""
+    account = current_account.get()
+    if account.live_state.live:
+        return account.live_state.orders()
+    watcher = account.order_watcher
+    if watcher.primed and time.time() - watcher.updated < 2 * ORDER_POLL_INTERVAL:
+        return list(watcher.orders.values())
+    return await account.client.get_open_orders()
+
+async def gather_isolated(coros):
+    """
+    Run coroutines concurrently, a failing one gives its exception back instead of
+    cancelling the others. AsyncSpot already caps how many requests run at once.
+    """
+    results = await asyncio.gather(*coros, return_exceptions=True)
+    # The command still answers, without the parts that failed
+    for result in results:
+        if isinstance(result, Exception):
+            metrics.error(result)
+    return results
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
@@ -22,8 +214,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ["/show_last_trades"],
         ["/trades"]
     ]
+    user_id = update.effective_user.id
+    if account_name_of(user_id) is None:
+        await update.message.reply_text(
+            f"👋 Welcome! Your Telegram user id is {user_id}, ask an admin to bind it to an account."
+        )
+        return
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
-    print(update.effective_user.id)
     await update.message.reply_text(
         "👋 Welcome! Choose a command below:",
         reply_markup=reply_markup
@@ -39,67 +236,70 @@ async def show_all_trades(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Get symbol from command arguments
         symbol_filter = None
         if context.args:
-            symbol_input = context.args[0].upper()
-            # Add USDT if not present
-            if not any(symbol_input.endswith(suffix) for suffix in ['USDT', 'USDC', 'BTC', 'ETH', 'BNB']):
-                symbol_filter = symbol_input + 'USDT'
-            else:
-                symbol_filter = symbol_input
+            await markets.refresh()
+            # BTC becomes BTCUSDT, full symbols like BNBBTC are kept
+            symbol_filter = markets.normalize(context.args[0])
+            if symbol_filter is None:
+                await update.message.reply_text(f"Unknown symbol {context.args[0].upper()}")
+                return
 
         if symbol_filter:
-            trades_data = get_trades_for_symbol(binance_client, symbol_filter)
+            trades_data = await cached_trades(symbol_filter)
             if trades_data['trades']:
-                await send_trades_message(update, trades_data, symbol_filter)
+                await send_trades_message(update, context, trades_data, symbol_filter)
             else:
                 await update.message.reply_text(f"No trades found for {symbol_filter}")
         else:
-            await show_all_symbols_trades(update, binance_client)
+            await show_all_symbols_trades(update, current_account.get().client)
 
     except Exception as e:
+        metrics.error(e)
         await update.message.reply_text(f"⚠️ Error: {e}")
 
 
-def get_trades_for_symbol(client, symbol):
+async def get_trades_for_symbol(ledger, markets, prices, symbol):
     """Get all trades for a specific symbol across different quote currencies"""
     try:
         all_trades = []
 
-        # Try different quote currencies
-        base_symbol = symbol.replace('USDT', '').replace('USDC', '').replace(
-            'BNB', '')
-        trading_pairs = [f"{base_symbol}USDT", f"{base_symbol}USDC", f"{base_symbol}BTC", f"{base_symbol}ETH"]
+        # Try the quote currencies Binance actually lists for the base asset
+        await markets.refresh()
+        base_asset = markets.base_asset(symbol)
+        trading_pairs = [
+            pair for pair in (markets.symbol(base_asset, quote) for quote in QUOTE_ASSETS) if pair
+        ]
 
-        for pair in trading_pairs:
-            try:
-                trades = client.my_trades(symbol=pair)
-                if trades:
-                    for trade in trades:
-                        trade['pair'] = pair
-                    all_trades.extend(trades)
-            except Exception:
+        results = await gather_isolated(ledger.trades(pair) for pair in trading_pairs)
+        for trades in results:
+            if isinstance(trades, Exception):
                 continue
+            all_trades.extend(trades)
 
         # Sort by time (newest first)
-        all_trades.sort(key=lambda x: x['time'], reverse=True)
+        all_trades.sort(key=lambda x: x.time, reverse=True)
+
+        # Calculate summary statistics, prices of every pair converted to USDT
+        from pnl import TradeColumns
 
-        # Calculate summary statistics
-        buy_trades = [t for t in all_trades if t['isBuyer']]
-        sell_trades = [t for t in all_trades if not t['isBuyer']]
+        await prices.snapshot()
+        columns = TradeColumns.load(all_trades, markets, prices)
+        buys = columns.is_buy
 
-        total_bought = sum(float(t['qty']) for t in buy_trades)
-        total_sold = sum(float(t['qty']) for t in sell_trades)
+        total_bought = float(columns.qty[buys].sum())
+        total_sold = float(columns.qty[~buys].sum())
 
-        buy_value = sum(float(t['qty']) * float(t['price']) for t in buy_trades)
-        sell_value = sum(float(t['qty']) * float(t['price']) for t in sell_trades)
+        buy_value = float(columns.value[buys].sum())
+        sell_value = float(columns.value[~buys].sum())
 
         avg_buy_price = buy_value / total_bought if total_bought > 0 else 0
         avg_sell_price = sell_value / total_sold if total_sold > 0 else 0
 
         return {
             'trades': all_trades,
+            'columns': columns,
             'total_trades': len(all_trades),
-            'buy_trades': len(buy_trades),
-            'sell_trades': len(sell_trades),
+            'buy_trades': int(buys.sum()),
+            'sell_trades': int((~buys).sum()),
             'total_bought': total_bought,
             'total_sold': total_sold,
             'avg_buy_price': avg_buy_price,
@@ -111,98 +311,114 @@ def get_trades_for_symbol(client, symbol):
         return {'trades': [], 'error': str(e)}
 
 
-async def send_trades_message(update, trades_data, symbol):
-    """Send formatted trades message"""
-    trades = trades_data['trades']
+async def cached_trades(symbol):
+    """get_trades_for_symbol shared by every command asking for symbol within the cache TTL"""
+    account = current_account.get()
+    key = ("trades", account.name, symbol)
+    with metrics.span("trades"):
+        trades_data = await response_cache.get(
+            key, lambda: get_trades_for_symbol(account.ledger, markets, prices, symbol)
+        )
+    if 'error' in trades_data:
+        metrics.error(trades_data['error'])
+        # Errors are shared with the requests already waiting, not cached
+        response_cache.invalidate(key)
+    return trades_data
 
-    if not trades:
-        await update.message.reply_text(f"No trades found for {symbol}")
-        return
 
-    # Header with summary
-    msg = f"📊 **{symbol} Trade History**\n\n"
-    msg += f"📈 Total Trades: {trades_data['total_trades']}\n"
-    msg += f"🛒 Buys: {trades_data['buy_trades']} | 💰 Sells: {trades_data['sell_trades']}\n"
-    msg += f"📦 Total Bought: {trades_data['total_bought']:.6f}\n"
-    msg += f"📤 Total Sold: {trades_data['total_sold']:.6f}\n"
-    msg += f"📊 Net Position: {trades_data['net_position']:.6f}\n"
+def trade_summary_lines(trades_data):
+    """Summary of get_trades_for_symbol as Markdown lines"""
+    yield f"📈 Total Trades: {trades_data['total_trades']}"
+    yield f"🛒 Buys: {trades_data['buy_trades']} | 💰 Sells: {trades_data['sell_trades']}"
+    yield f"📦 Total Bought: {trades_data['total_bought']:.6f}"
+    yield f"📤 Total Sold: {trades_data['total_sold']:.6f}"
+    yield f"📊 Net Position: {trades_data['net_position']:.6f}"
 
     if trades_data['avg_buy_price'] > 0:
-        msg += f"🛒 Avg Buy Price: ${trades_data['avg_buy_price']:.4f}\n"
+        yield f"🛒 Avg Buy Price: ${trades_data['avg_buy_price']:.4f}"
     if trades_data['avg_sell_price'] > 0:
-        msg += f"💰 Avg Sell Price: ${trades_data['avg_sell_price']:.4f}\n"
+        yield f"💰 Avg Sell Price: ${trades_data['avg_sell_price']:.4f}"
 
-    msg += "\n" + "=" * 30 + "\n\n"
+    yield "\n" + "=" * 30 + "\n"
 
-    # Show recent trades (limit to avoid message length issues)
-    recent_trades = trades[:20]  # Last 20 trades
 
-    for i, trade in enumerate(recent_trades, 1):
-        trade_time = datetime.fromtimestamp(trade['time'] / 1000)
-        side = "🛒 BUY" if trade['isBuyer'] else "💰 SELL"
+def amount(value, quote, decimals=2):
+    """value in quote, as dollars for USDT"""
+    if quote == USD_ASSET:
+        return f"${value:.{decimals}f}"
+    return f"{value:.8g} {quote}"
 
-        # Calculate trade value
-        trade_value = float(trade['qty']) * float(trade['price'])
 
-        msg += (
+def trade_lines(trades):
+    """One Markdown block per trade, formatted only when its page is rendered"""
+    for i, trade in enumerate(trades, 1):
+        trade_time = datetime.fromtimestamp(trade.time / 1000)
+        side = "🛒 BUY" if trade.is_buyer else "💰 SELL"
+        # Price and value of a trade are in the quote of its pair
+        quote = markets.quote_asset(trade.symbol)
+
+        yield (
             f"{i:2d}. {side}\n"
             f"    📅 {trade_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            f"    📦 Qty: {float(trade['qty']):.6f}\n"
-            f"    💵 Price: ${float(trade['price']):.4f}\n"
-            f"    💰 Value: ${trade_value:.2f}\n"
-            f"    🔄 Pair: {trade['pair']}\n"
-            f"    🏷️ ID: {trade['id']}\n\n"
+            f"    📦 Qty: {trade.qty:.6f}\n"
+            f"    💵 Price: {amount(trade.price, quote, 4)}\n"
+            f"    💰 Value: {amount(trade.value, quote)}\n"
+            f"    🔄 Pair: {escape(trade.symbol)}\n"
+            f"    🏷️ ID: {trade.id}\n"
         )
 
-    if len(trades) > 20:
-        msg += f"... and {len(trades) - 20} more trades\n"
-        msg += "Use /tradesall {symbol} for complete history\n"
-
-    # Split message if too long
-    if len(msg) > 4000:
-        # Send summary first
-        summary_msg = f"📊 **{symbol} Trade Summary**\n\n"
-        summary_msg += f"📈 Total Trades: {trades_data['total_trades']}\n"
-        summary_msg += f"🛒 Buys: {trades_data['buy_trades']} | 💰 Sells: {trades_data['sell_trades']}\n"
-        summary_msg += f"📦 Total Bought: {trades_data['total_bought']:.6f}\n"
-        summary_msg += f"📤 Total Sold: {trades_data['total_sold']:.6f}\n"
-        summary_msg += f"📊 Net Position: {trades_data['net_position']:.6f}\n"
-
-        if trades_data['avg_buy_price'] > 0:
-            summary_msg += f"🛒 Avg Buy Price: ${trades_data['avg_buy_price']:.4f}\n"
-        if trades_data['avg_sell_price'] > 0:
-            summary_msg += f"💰 Avg Sell Price: ${trades_data['avg_sell_price']:.4f}\n"
-
-        await update.message.reply_text(summary_msg)
-
-        # Send recent trades
-        trades_msg = f"🕒 Recent Trades for {symbol}:\n\n"
-        for i, trade in enumerate(recent_trades[:10], 1):
-            trade_time = datetime.fromtimestamp(trade['time'] / 1000)
-            side = "🛒 BUY" if trade['isBuyer'] else "💰 SELL"
-            trade_value = float(trade['qty']) * float(trade['price'])
-
-            trades_msg += (
-                f"{i}. {side} | {trade_time.strftime('%m-%d %H:%M')} | "
-                f"{float(trade['qty']):.4f} @ ${float(trade['price']):.4f}\n"
-            )
 
-        await update.message.reply_text(trades_msg)
-    else:
-        await update.message.reply_text(msg)
+async def send_trades_message(update, context, trades_data, symbol, limit=20):
+    """Send the trades summary and history in pages, limit=None pages through every trade"""
+    trades = trades_data['trades']
+
+    if not trades:
+        await update.message.reply_text(f"No trades found for {symbol}")
+        return
+
+    lines = itertools.chain(trade_summary_lines(trades_data), trade_lines(trades[:limit]))
+    if limit and len(trades) > limit:
+        lines = itertools.chain(lines, [
+            f"... and {len(trades) - limit} more trades",
+            f"Use /tradesall {symbol} for complete history",
+        ])
+
+    await send_pages(update, context, f"📊 *{escape(symbol)} Trade History*", lines)
+
+
+async def show_complete_trades(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Page through every trade of a symbol
+    Usage: /tradesall BTC or /tradesall BTCUSDT
+    """
+    try:
+        if not context.args:
+            await update.message.reply_text("Please specify a symbol. Example: `/tradesall BTC`")
+            return
+
+        await markets.refresh()
+        symbol = markets.normalize(context.args[0])
+        if symbol is None:
+            await update.message.reply_text(f"Unknown symbol {context.args[0].upper()}")
+            return
+
+        trades_data = await cached_trades(symbol)
+        await send_trades_message(update, context, trades_data, symbol, limit=None)
+
+    except Exception as e:
+        metrics.error(e)
+        await update.message.reply_text(f"⚠️ Error: {e}")
 
 
 async def show_all_symbols_trades(update, client):
     """Show trades summary for all symbols with trades"""
     try:
         # Get account info to find symbols with balances
-        account_info = binance_client.account()
+        account_info = await client.account()
         balances = account_info['balances']
         symbols_with_balance = [b['asset'] for b in balances if float(b['free']) + float(b['locked']) > 0]
 
-        # Also check for symbols that might have been traded but no longer held
-        exchange_info = binance_client.exchange_info()
-        all_symbols = [s['symbol'] for s in exchange_info['symbols'] if s['symbol'].endswith('USDT')]
+        await markets.refresh()
 
         trades_summary = {}
         symbols_to_check = set()
@@ -210,7 +426,9 @@ async def show_all_symbols_trades(update, client):
         # Add symbols with balance
         for asset in symbols_with_balance:
             if asset not in ['USDT', 'USDC']:
-                symbols_to_check.add(f"{asset}USDT")
+                symbol = markets.normalize(asset)
+                if symbol:
+                    symbols_to_check.add(symbol)
 
         # Limit to prevent too many API calls
         symbols_to_check = list(symbols_to_check)[:10]
@@ -219,13 +437,18 @@ async def show_all_symbols_trades(update, client):
 
         total_symbols_with_trades = 0
 
-        for symbol in symbols_to_check:
+        results = await gather_isolated(
+            cached_trades(symbol) for symbol in symbols_to_check
+        )
+
+        for symbol, trades_data in zip(symbols_to_check, results):
             try:
-                trades_data = get_trades_for_symbol(binance_client, symbol)
+                if isinstance(trades_data, Exception):
+                    continue
                 if trades_data['trades']:
                     total_symbols_with_trades += 1
 
-                    base_asset = symbol.replace('USDT', '')
+                    base_asset = markets.base_asset(symbol)
                     msg += f"**{base_asset}:**\n"
                     msg += f"  📈 Trades: {trades_data['total_trades']} ({trades_data['buy_trades']}B/{trades_data['sell_trades']}S)\n"
                     msg += f"  📊 Net: {trades_data['net_position']:+.4f}\n"
@@ -254,44 +477,50 @@ async def show_all_symbols_trades(update, client):
         await update.message.reply_text(msg)
 
     except Exception as e:
+        metrics.error(e)
         await update.message.reply_text(f"⚠️ Error getting trade summary: {e}")
 
 
 async def trades_pnl(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Show P&L analysis for a specific symbol
-    Usage: /pnl BTCUSDT or /pnl BTC
+    Show P&L analysis for a specific symbol, lots matched FIFO unless told otherwise
+    Usage: /pnl BTCUSDT or /pnl BTC or /pnl BTC lifo|average
     """
+    from pnl import METHODS, analyze
+
     try:
         if not context.args:
             await update.message.reply_text("Please specify a symbol. Example: `/pnl BTC` or `/pnl BTCUSDT`")
             return
 
-        symbol_input = context.args[0].upper()
-        if not any(symbol_input.endswith(suffix) for suffix in ['USDT', 'USDC', 'BTC', 'ETH', 'BNB']):
-            symbol = symbol_input + 'USDT'
-        else:
-            symbol = symbol_input
+        method = context.args[1].lower() if len(context.args) > 1 else 'fifo'
+        if method not in METHODS:
+            await update.message.reply_text(f"Unknown method {method}, use one of: {', '.join(METHODS)}")
+            return
 
-        client = Spot(api_key=BINANCE_API_KEY, api_secret=BINANCE_API_SECRET)
-        trades_data = get_trades_for_symbol(client, symbol)
+        await markets.refresh()
+        symbol = markets.normalize(context.args[0])
+        if symbol is None:
+            await update.message.reply_text(f"Unknown symbol {context.args[0].upper()}")
+            return
+
+        trades_data = await cached_trades(symbol)
 
         if not trades_data['trades']:
             await update.message.reply_text(f"No trades found for {symbol}")
             return
 
-        # Calculate P&L
-        buy_trades = [t for t in trades_data['trades'] if t['isBuyer']]
-        sell_trades = [t for t in trades_data['trades'] if not t['isBuyer']]
-
-        total_buy_cost = sum(float(t['qty']) * float(t['price']) for t in buy_trades)
-        total_sell_revenue = sum(float(t['qty']) * float(t['price']) for t in sell_trades)
-
-        realized_pnl = total_sell_revenue - (trades_data['total_sold'] * trades_data['avg_buy_price'])
+        # Calculate P&L in USDT over every quote pair, commissions included
+        current_price = prices.usd_price(markets.base_asset(symbol))
+        result = analyze(trades_data['columns'], current_price, method)
+        total_buy_cost = result['buy_cost']
+        total_sell_revenue = result['sell_revenue']
+        realized_pnl = result['realized']
 
-        msg = f"📊 **{symbol} P&L Analysis**\n\n"
+        msg = f"📊 **{symbol} P&L Analysis ({method.upper()})**\n\n"
         msg += f"💰 Total Buy Cost: ${total_buy_cost:.2f}\n"
         msg += f"💵 Total Sell Revenue: ${total_sell_revenue:.2f}\n"
+        msg += f"🧾 Fees: ${result['fees']:.2f}\n"
         msg += f"📈 Realized P&L: ${realized_pnl:+.2f}\n"
 
         if realized_pnl != 0:
@@ -300,64 +529,290 @@ async def trades_pnl(update: Update, context: ContextTypes.DEFAULT_TYPE):
             msg += f"{pnl_emoji} P&L Percentage: {pnl_percentage:+.2f}%\n"
 
         # Current position value if any remaining
-        if trades_data['net_position'] > 0:
-            try:
-                current_ticker = client.ticker_price(symbol=symbol)
-                current_price = float(current_ticker['price'])
-                current_value = trades_data['net_position'] * current_price
-                remaining_cost_basis = trades_data['net_position'] * trades_data['avg_buy_price']
-                unrealized_pnl = current_value - remaining_cost_basis
+        if result['position'] > 0:
+            if current_price:
+                current_value = result['position'] * current_price
+                unrealized_pnl = result['unrealized']
 
                 msg += f"\n🏦 **Current Position:**\n"
-                msg += f"📦 Quantity: {trades_data['net_position']:.6f}\n"
+                msg += f"📦 Quantity: {result['position']:.6f}\n"
+                msg += f"🧮 Cost Basis: ${result['cost_basis']:.2f}\n"
                 msg += f"💰 Current Value: ${current_value:.2f}\n"
                 msg += f"📊 Unrealized P&L: ${unrealized_pnl:+.2f}\n"
 
                 total_pnl = realized_pnl + unrealized_pnl
                 msg += f"\n🎯 **Total P&L: ${total_pnl:+.2f}**"
-
-            except Exception:
-                msg += f"\n📦 Remaining Position: {trades_data['net_position']:.6f}"
+            else:
+                msg += f"\n📦 Remaining Position: {result['position']:.6f}"
 
         await update.message.reply_text(msg)
 
     except Exception as e:
+        metrics.error(e)
         await update.message.reply_text(f"⚠️ Error: {e}")
 
-async def get_traded_symbols():
-    exchange_info = binance_client.exchange_info()
-    symbols = [s["symbol"] for s in exchange_info["symbols"] if s["quoteAsset"] == "USDT"]
+CHART_USAGE = (
+    "Usage: /chart value [1d|7d|30d|90d|1y] [ASSET], "
+    "/chart allocation or /chart pnl SYMBOL [fifo|lifo|average]"
+)
 
-    traded_symbols = []
-    for symbol in symbols:
+async def chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Portfolio value, allocation or cumulative realized P&L as a PNG chart"""
+    from pnl import METHODS, realized_series
+
+    try:
+        kind = context.args[0].lower() if context.args else None
+
+        if kind == 'value':
+            period, asset = history_args(context.args[1:])
+            end = time.time()
+            times, values = current_account.get().history.range(end - HISTORY_PERIODS[period], end, asset)
+            if len(values) < 2:
+                await update.message.reply_text(f"No history for {asset or 'the portfolio'} in the last {period} yet.")
+                return
+            # The last point versions the data, a new point is a new chart
+            key = ('value', current_account.get().name, period, asset, int(times[-1]))
+            args = (f"{asset or 'Portfolio'} value, last {period}", times, values)
+
+        elif kind == 'allocation':
+            snapshot = await current_portfolio()
+            if not snapshot.total_value:
+                await update.message.reply_text("Your wallet is empty.")
+                return
+            key = ('allocation', current_account.get().name, snapshot.version)
+            args = (
+                f"Allocation, ${snapshot.total_value:.2f}",
+                [a['asset'] for a in snapshot.assets],
+                [a['value_usd'] for a in snapshot.assets],
+            )
+
+        elif kind == 'pnl' and len(context.args) > 1:
+            method = context.args[2].lower() if len(context.args) > 2 else 'fifo'
+            if method not in METHODS:
+                await update.message.reply_text(f"Unknown method {method}, use one of: {', '.join(METHODS)}")
+                return
+            await markets.refresh()
+            symbol = markets.normalize(context.args[1])
+            if symbol is None:
+                await update.message.reply_text(f"Unknown symbol {context.args[1].upper()}")
+                return
+            trades_data = await cached_trades(symbol)
+            if not trades_data['trades']:
+                await update.message.reply_text(f"No trades found for {symbol}")
+                return
+            times, realized = realized_series(trades_data['columns'], method)
+            if not len(realized):
+                await update.message.reply_text(f"No sells found for {symbol}")
+                return
+            trades = trades_data['trades']
+            key = ('pnl', current_account.get().name, symbol, method, len(trades), trades[0].id)
+            args = (f"{symbol} cumulative realized P&L ({method.upper()})", times, realized)
+
+        else:
+            await update.message.reply_text(CHART_USAGE)
+            return
+
+        with metrics.span("chart.render"):
+            image = await chart_renderer.render(key, kind, *args)
+        await update.message.reply_photo(photo=image)
+
+    except Exception as e:
+        metrics.error(e)
+        await update.message.reply_text(f"⚠️ Error: {e}")
+
+async def alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Set a one-shot price alert, list the alerts of the chat without arguments
+    Usage: /alert BTC > 70000 or /alert ETHBTC < 0.03
+    """
+    try:
+        chat_id = update.effective_chat.id
+        if not context.args:
+            alerts = alert_engine.alerts(chat_id)
+            if not alerts:
+                await update.message.reply_text("No alerts set. Example: /alert BTC > 70000")
+                return
+            msg = "🔔 Your alerts:\n\n"
+            msg += "".join(f"#{a.id}  {a.symbol} {a.operator} {a.threshold:g}\n" for a in alerts)
+            msg += "\nRemove one with /unalert ID"
+            await update.message.reply_text(msg)
+            return
+
+        if len(context.args) != 3 or context.args[1] not in OPERATORS:
+            await update.message.reply_text("Usage: /alert BTC > 70000 or /alert BTC < 50000")
+            return
         try:
-            trades = binance_client.my_trades(symbol=symbol)
-            if trades:
-                traded_symbols.append(symbol)
-        except ClientError as e:
-            if "Invalid symbol" in str(e.error_message):
-                continue
-            raise e
-    return traded_symbols
+            threshold = float(context.args[2])
+        except ValueError:
+            await update.message.reply_text(f"Invalid price {context.args[2]}")
+            return
+
+        await markets.refresh()
+        symbol = markets.normalize(context.args[0])
+        if symbol is None:
+            await update.message.reply_text(f"Unknown symbol {context.args[0].upper()}")
+            return
+        if len(alert_engine.alerts(chat_id)) >= MAX_ALERTS_PER_CHAT:
+            await update.message.reply_text(f"You already have {MAX_ALERTS_PER_CHAT} alerts, remove one first.")
+            return
+
+        above = OPERATORS[context.args[1]]
+        await prices.snapshot()
+        current_price = prices.price(symbol)
+        if current_price is not None and (current_price >= threshold if above else current_price <= threshold):
+            await update.message.reply_text(f"{symbol} is already at {current_price:g}.")
+            return
+
+        new_alert = alert_engine.add(chat_id, symbol, above, threshold)
+        await update.message.reply_text(f"🔔 Alert #{new_alert.id} set: {symbol} {new_alert.operator} {threshold:g}")
+
+    except Exception as e:
+        metrics.error(e)
+        await update.message.reply_text(f"⚠️ Error: {e}")
+
+async def unalert(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Usage: /unalert ID"""
+    if not context.args or not context.args[0].lstrip("#").isdigit():
+        await update.message.reply_text("Usage: /unalert ID, /alert lists your alerts")
+        return
+    alert_id = int(context.args[0].lstrip("#"))
+    if alert_engine.remove(update.effective_chat.id, alert_id):
+        await update.message.reply_text(f"Alert #{alert_id} removed.")
+    else:
+        await update.message.reply_text(f"No alert #{alert_id}.")
+
+async def send_alerts(bot, chat_id, alerts):
+    """One message with every alert of a chat crossed in the same batch"""
+    msg = "🚨 Price alert:\n\n"
+    for a in alerts:
+        current_price = prices.price(a.symbol)
+        msg += f"{a.symbol} {a.operator} {a.threshold:g}, now {current_price:g}\n"
+    await bot.send_message(chat_id=chat_id, text=msg)
+
+def chats_of(name):
+    """Private chats of the users who use account name"""
+    users = {user_id for user_id, _ in account_store.users()} | ADMIN_USER_IDS
+    return sorted(user_id for user_id in users if account_name_of(user_id) == name)
+
+ORDER_CHANGE_ICONS = {'partial': '🟡', 'filled': '✅', 'canceled': '❌', 'expired': '⌛', 'rejected': '⛔'}
+
+def order_change_line(change):
+    order = change.order
+    executed, quantity = float(order['executedQty']), float(order['origQty'])
+    line = f"{ORDER_CHANGE_ICONS[change.kind]} {order['symbol']} {order['side']} "
+    if change.kind == 'partial':
+        return line + f"+{change.filled:g} @ {change.price:g}, {executed:g}/{quantity:g} filled"
+    if change.kind == 'filled':
+        return line + f"filled {quantity:g}" + (f", last {change.filled:g} @ {change.price:g}" if change.filled else "")
+    return line + f"{change.kind}, {executed:g}/{quantity:g} filled"
+
+async def send_order_changes(name, changes):
+    """One message per user of the account with every order change of the batch"""
+    if telegram_bot is None:
+        return
+    title = "📋 Orders:" if name == DEFAULT_ACCOUNT else f"📋 Orders of {name}:"
+    msg = title + "\n\n" + "\n".join(order_change_line(change) for change in changes)
+    for chat_id in chats_of(name):
+        try:
+            await telegram_bot.send_message(chat_id=chat_id, text=msg)
+        except Exception as e:
+            logger.warning("Order notification to %s failed: %s", chat_id, e)
+
+async def poll_orders_job(context: ContextTypes.DEFAULT_TYPE):
+    """JobQueue callback diffing the open orders of the accounts no stream follows"""
+    accounts = [a for a in account_pool.accounts() if not a.live_state.live and chats_of(a.name)]
+    if not accounts:
+        return
+    with background():
+        results = await gather_isolated(account.order_watcher.poll() for account in accounts)
+    for account, result in zip(accounts, results):
+        if isinstance(result, Exception):
+            logger.warning("Open orders poll of %s failed: %s", account.name, result)
+
+async def poll_prices_job(context: ContextTypes.DEFAULT_TYPE):
+    """JobQueue callback checking the alerts while no stream pushes prices"""
+    if not len(alert_engine) or any(
+        a.stream_engine.tickers and a.live_state.live for a in account_pool.accounts()
+    ):
+        return
+    with background():
+        await prices.snapshot()
+
+async def bind(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Usage: /bind USER_ID ACCOUNT"""
+    if len(context.args) != 2 or not context.args[0].isdigit():
+        await update.message.reply_text("Usage: /bind USER_ID ACCOUNT")
+        return
+    user_id, name = int(context.args[0]), context.args[1]
+    if name not in account_pool.names():
+        await update.message.reply_text(f"Unknown account {name}, add it with: python application.py add-account {name}")
+        return
+    account_store.bind(user_id, name)
+    await update.message.reply_text(f"✅ User {user_id} now uses account {name}")
+
+async def unbind(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Usage: /unbind USER_ID"""
+    if len(context.args) != 1 or not context.args[0].isdigit():
+        await update.message.reply_text("Usage: /unbind USER_ID")
+        return
+    if account_store.unbind(int(context.args[0])):
+        await update.message.reply_text(f"User {context.args[0]} unbound.")
+    else:
+        await update.message.reply_text(f"User {context.args[0]} is not bound to an account.")
+
+async def list_accounts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Accounts and the users bound to them"""
+    users = {}
+    for user_id, name in account_store.users():
+        users.setdefault(name, []).append(str(user_id))
+    msg = "👥 Accounts:\n\n"
+    for name in account_pool.names():
+        msg += f"{name}: {', '.join(users.get(name, [])) or 'no users'}\n"
+    await update.message.reply_text(msg)
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Command and Binance latency, request weight and cache hit ratios,
+    with a command the time spent in each awaited call of it
+    Usage: /stats [COMMAND]
+    """
+    if context.args:
+        lines = metrics.span_summary(context.args[0].lstrip("/").lower())
+    else:
+        lines = metrics.summary()
+    await send_pages(update, context, "📊 *Stats*", (escape(line) for line in lines))
+
+async def get_traded_symbols():
+    """Symbols the account has traded, read from the ledger index"""
+    account = current_account.get()
+    if not account.ledger.traded_symbols():
+        await symbol_index.rebuild(account.client, account.ledger, markets, QUOTE_ASSETS)
+    return account.ledger.traded_symbols()
+
+async def reindex(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Rebuild the index of traded symbols from balances, deposits and converts
+    Usage: /reindex
+    """
+    try:
+        account = current_account.get()
+        symbols = await symbol_index.rebuild(account.client, account.ledger, markets, QUOTE_ASSETS)
+        await update.message.reply_text(f"🔄 Symbol index rebuilt: {len(symbols)} traded symbols")
+    except Exception as e:
+        metrics.error(e)
+        await update.message.reply_text(f"⚠️ Error: {e}")
 
-async def show_orders(update: Update, side: str, limit: int = None):
+async def show_orders(update: Update, context: ContextTypes.DEFAULT_TYPE, side: str, limit: int = None):
     try:
-        account_info = binance_client.account()
         symbols = await get_traded_symbols()
 
         trades = []
-        for symbol in symbols:
+        results = await gather_isolated(current_account.get().ledger.trades(symbol) for symbol in symbols)
+        for symbol, symbol_trades in zip(symbols, results):
             try:
-                symbol_trades = binance_client.my_trades(symbol=symbol)
-                for trade in symbol_trades:
-                    is_buy = trade["isBuyer"]
-                    if (side == "BUY" and is_buy) or (side == "SELL" and not is_buy):
-                        trades.append({
-                            "symbol": symbol,
-                            "price": trade["price"],
-                            "qty": trade["qty"],
-                            "time": trade["time"],
-                        })
+                if isinstance(symbol_trades, Exception):
+                    continue
+                trades.extend(trade for trade in symbol_trades if trade.side == side)
             except Exception:
                 continue
 
@@ -365,146 +820,220 @@ async def show_orders(update: Update, side: str, limit: int = None):
             await update.message.reply_text(f"No {side.lower()} orders found.")
             return
 
-        trades = sorted(trades, key=lambda x: x["time"], reverse=True)
+        trades = sorted(trades, key=lambda x: x.time, reverse=True)
         if limit:
             trades = trades[:limit]
 
-        msg_lines = [f"*All {side} orders:*"]
-        for t in trades:
-            date_str = datetime.utcfromtimestamp(t["time"] / 1000).strftime('%Y-%m-%d %H:%M:%S UTC')
-            msg_lines.append(f"- {t['symbol']}: {t['qty']} @ {t['price']} on {date_str}")
-
-        MAX_LENGTH = 4000
-        message = ""
-        for line in msg_lines:
-            if len(message) + len(line) + 1 > MAX_LENGTH:
-                await update.message.reply_text(message, parse_mode="Markdown")
-                message = ""
-            message += line + "\n"
-        if message:
-            await update.message.reply_text(message, parse_mode="Markdown")
+        msg_lines = (
+            f"- {escape(t.symbol)}: {t.qty} @ {t.price} on "
+            f"{datetime.utcfromtimestamp(t.time / 1000).strftime('%Y-%m-%d %H:%M:%S UTC')}"
+            for t in trades
+        )
+        await send_pages(update, context, f"*All {side} orders:*", msg_lines)
 
     except Exception as e:
+        metrics.error(e)
         await update.message.reply_text(f"Error: {str(e)}")
 
-async def wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def refresh_portfolio():
+    """Refresh the portfolio snapshot, the ledger is synced by the stream while it is live"""
+    account = current_account.get()
+    portfolio = account.portfolio
+    await portfolio.refresh(await get_account(), sync=not account.live_state.live)
+    account.history.record(
+        portfolio.updated, portfolio.total_value, {a['asset']: a['value_usd'] for a in portfolio.assets}
+    )
+    return portfolio
+
+async def current_portfolio():
+    """
+    The precomputed portfolio snapshot. When the job missed its last run or
+    does not run at all, e.g. right after a restart, a snapshot younger than
+    portfolio_max_stale is returned while it refreshes in the background,
+    an older one is refreshed first.
+    """
+    account = current_account.get()
+    portfolio = account.portfolio
+    if portfolio.age > 2 * PORTFOLIO_INTERVAL:
+        if portfolio.updated and portfolio.age < PORTFOLIO_MAX_STALE:
+            refresh_in_background(account)
+        else:
+            with metrics.span("portfolio"):
+                await refresh_account_portfolio(account)
+    return portfolio
+
+async def refresh_account_portfolio(account):
+    token = current_account.set(account)
     try:
-        account_info = binance_client.account()
-        balances = account_info['balances']
-        non_zero = [b for b in balances if float(b['free']) + float(b['locked']) > 0]
+        # Commands and the job share one refresh per account
+        await response_cache.get(("portfolio", account.name), refresh_portfolio)
+    finally:
+        current_account.reset(token)
+
+def refresh_in_background(account):
+    async def refresh():
+        with background():
+            await refresh_account_portfolio(account)
+
+    def done(task):
+        background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Portfolio refresh of %s failed: %s", account.name, task.exception())
+
+    task = asyncio.get_running_loop().create_task(refresh())
+    # The loop only keeps weak references to its tasks
+    background_tasks.add(task)
+    task.add_done_callback(done)
+
+async def refresh_portfolio_job(context: ContextTypes.DEFAULT_TYPE):
+    """JobQueue callback precomputing the portfolio snapshot of every account"""
+    accounts = account_pool.accounts()
+    with background():
+        # Each account refreshes in its own task, with its own current_account
+        results = await gather_isolated(refresh_account_portfolio(account) for account in accounts)
+    for account, result in zip(accounts, results):
+        if isinstance(result, Exception):
+            logger.warning("Portfolio refresh of %s failed: %s", account.name, result)
+    warm_state.save(prices, account_pool.accounts())
+
+# /history periods in seconds
+HISTORY_PERIODS = {
+    '1d': 86400,
+    '7d': 7 * 86400,
+    '30d': 30 * 86400,
+    '90d': 90 * 86400,
+    '1y': 365 * 86400,
+}
+
+# Points listed by /history, evenly spread over the period
+HISTORY_POINTS = 24
+
+def history_args(args):
+    """Period and optional asset of /history and /chart value arguments"""
+    args = list(args)
+    period = args.pop(0).lower() if args and args[0].lower() in HISTORY_PERIODS else '7d'
+    asset = args[0].upper() if args else None
+    return period, asset
+
+async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Portfolio value over time, of one asset when given
+    Usage: /history [1d|7d|30d|90d|1y] [ASSET]
+    """
+    import numpy as np
 
-        if not non_zero:
-            await update.message.reply_text("Your wallet is empty.")
+    try:
+        period, asset = history_args(context.args)
+        end = time.time()
+        times, values = current_account.get().history.range(end - HISTORY_PERIODS[period], end, asset)
+        if not len(values):
+            await update.message.reply_text(f"No history for {asset or 'the portfolio'} in the last {period} yet.")
             return
 
-        msg = "💰 Your Wallet:\n\n"
+        change = values[-1] - values[0]
+        percentage = change / values[0] * 100 if values[0] else 0.0
+        msg = f"📈 {asset or 'Portfolio'} value, last {period}\n\n"
+        msg += f"Now: ${values[-1]:.2f}\n"
+        msg += f"Change: ${change:+.2f} ({percentage:+.1f}%)\n"
+        msg += f"Low: ${values.min():.2f}  High: ${values.max():.2f}\n\n"
 
-        for asset in non_zero:
-            symbol = asset['asset']
-            total_qty = float(asset['free']) + float(asset['locked'])
+        for i in np.unique(np.linspace(0, len(values) - 1, HISTORY_POINTS).astype(int)):
+            msg += f"{datetime.fromtimestamp(times[i]).strftime('%Y-%m-%d %H:%M')}  ${values[i]:.2f}\n"
 
-            if symbol in ["BUSD", "USDT"]:
-                avg_price = 1.0
-                value_usd = total_qty
-                current_price = 1.0
-            else:
-                try:
-                    trades = binance_client.my_trades(symbol=symbol + "USDT")
-                    trades += binance_client.my_trades(symbol=symbol + "USDC")
-                except Exception:
-                    trades = []
-
-                if not trades:
-                    avg_price = 0
-                else:
-                    # Only use BUY trades
-                    buy_trades = [t for t in trades if t['isBuyer']]
+        await update.message.reply_text(msg)
 
-                    if not buy_trades:
-                        avg_price = 0
-                    else:
-                        total_qty_bought = sum(float(t['qty']) for t in buy_trades)
-                        total_cost_bought = sum(float(t['qty']) * float(t['price']) for t in buy_trades)
-                        avg_price = total_cost_bought / total_qty_bought if total_qty_bought > 0 else 0
+    except Exception as e:
+        metrics.error(e)
+        await update.message.reply_text(f"⚠️ Error: {e}")
 
-                try:
-                    ticker = binance_client.ticker_price(symbol=symbol + "USDT")
-                    current_price = float(ticker['price'])
-                except Exception:
-                    current_price = 0
+def snapshot_age(snapshot):
+    return f"🕒 Updated {snapshot.age:.0f}s ago"
 
-                value_usd = total_qty * current_price
+async def wallet_message():
+    """Wallet text of the precomputed portfolio snapshot"""
+    snapshot = await current_portfolio()
+    if not snapshot.assets:
+        return "Your wallet is empty."
 
-            msg += (
-                f"{symbol}:\n"
-                f"  Amount: {total_qty:.6f}\n"
-                f"  Avg. Purchase Price: ${avg_price:.4f}\n"
-                f"  Current Value: ${value_usd:.2f}\n"
-                f"  Current {symbol} Value: ${current_price:.4f}\n\n"
-            )
+    msg = "💰 Your Wallet:\n\n"
+    for asset in snapshot.assets:
+        symbol = asset['asset']
+        msg += (
+            f"{symbol}:\n"
+            f"  Amount: {asset['quantity']:.6f}\n"
+            f"  Avg. Purchase Price: ${asset['avg_price']:.4f}\n"
+            f"  Current Value: ${asset['value_usd']:.2f}\n"
+            f"  Current {symbol} Value: ${asset['price']:.4f}\n"
+        )
+        if asset['unrealized'] is not None:
+            msg += f"  Unrealized P&L: ${asset['unrealized']:+.2f}\n"
+        msg += "\n"
+
+    msg += snapshot_age(snapshot)
+    return msg
 
+async def wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        msg = await wallet_message()
         await update.message.reply_text(msg)
 
     except Exception as e:
+        metrics.error(e)
         await update.message.reply_text(f"⚠️ Error: {e}")
 
-async def total(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    try:
-        account_info = binance_client.account()
-        balances = account_info['balances']
-        non_zero = [b for b in balances if float(b['free']) + float(b['locked']) > 0]
-
-        if not non_zero:
-            await update.message.reply_text("Your wallet is empty.")
-            return
-
-        total_value = 0.0
-        asset_values = []
+async def total_message(quote=USD_ASSET):
+    """Portfolio summary text of the precomputed portfolio snapshot, valued in quote"""
+    snapshot = await current_portfolio()
+    if not snapshot.assets:
+        return "Your wallet is empty."
 
-        # Calculate value for each asset
-        for asset in non_zero:
-            symbol = asset['asset']
-            total_qty = float(asset['free']) + float(asset['locked'])
+    if quote == USD_ASSET:
+        values = [asset['value_usd'] for asset in snapshot.assets]
+    else:
+        # Revalued through the conversion graph at the current prices
+        await prices.snapshot()
+        values = snapshot.values_in(quote).tolist()
+    total_value = sum(values)
+
+    # Build response with percentages
+    response = f"💵 **Portfolio Summary**\n"
+    response += f"Total Value: {amount(total_value, quote)}\n\n"
+
+    # Sort assets by value (highest first)
+    asset_values = sorted(zip(snapshot.assets, values), key=lambda x: x[1], reverse=True)
+
+    for asset, value in asset_values:
+        if total_value > 0:
+            percentage = (value / total_value) * 100
+            response += f"{asset['asset']}: {amount(value, quote)} ({percentage:.1f}%)\n"
+        else:
+            response += f"{asset['asset']}: {amount(value, quote)} (0.0%)\n"
 
-            if symbol in ["BUSD", "USDT"]:
-                value_usd = total_qty
-            else:
-                try:
-                    ticker = binance_client.ticker_price(symbol=symbol + "USDT")
-                    current_price = float(ticker['price'])
-                except Exception:
-                    current_price = 0
-                value_usd = total_qty * current_price
-
-            total_value += value_usd
-            asset_values.append({
-                'symbol': symbol,
-                'quantity': total_qty,
-                'value_usd': value_usd
-            })
-
-        # Build response with percentages
-        response = f"💵 **Portfolio Summary**\n"
-        response += f"Total Value: ${total_value:.2f}\n\n"
-
-        # Sort assets by value (highest first)
-        asset_values.sort(key=lambda x: x['value_usd'], reverse=True)
-
-        for asset in asset_values:
-            if total_value > 0:
-                percentage = (asset['value_usd'] / total_value) * 100
-                response += f"{asset['symbol']}: ${asset['value_usd']:.2f} ({percentage:.1f}%)\n"
-            else:
-                response += f"{asset['symbol']}: ${asset['value_usd']:.2f} (0.0%)\n"
+    response += "\n" + snapshot_age(snapshot)
+    return response
 
+async def total(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Portfolio value and allocation, in USDT or in any asset
+    Usage: /total or /total EUR
+    """
+    try:
+        quote = context.args[0].upper() if context.args else USD_ASSET
+        if quote != USD_ASSET:
+            await prices.snapshot()
+            if prices.convert(quote, USD_ASSET) is None:
+                await update.message.reply_text(f"No conversion to {quote}")
+                return
+        response = await total_message(quote)
         await update.message.reply_text(response)
 
     except Exception as e:
+        metrics.error(e)
         await update.message.reply_text(f"⚠️ Error: {e}")
 
 async def open_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        open_orders = binance_client.get_open_orders()
+        open_orders = await get_open_orders()
 
         if not open_orders:
             await update.message.reply_text("You have no open orders.")
@@ -528,6 +1057,7 @@ async def open_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         await update.message.reply_text(msg)
     except Exception as e:
+        metrics.error(e)
         await update.message.reply_text(f"⚠️ Error: {e}")
 
 SELECTED_SYMBOLS = ["ETHUSDT", "AVAXUSDT", "USDCUSDT", "ZROUSDT", "EURUSDT"]
@@ -538,15 +1068,7 @@ async def show_last_trades(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         for symbol in SELECTED_SYMBOLS:
             try:
-                trades = binance_client.my_trades(symbol=symbol)
-                for trade in trades:
-                    all_trades.append({
-                        "symbol": symbol,
-                        "side": "BUY" if trade["isBuyer"] else "SELL",
-                        "qty": trade["qty"],
-                        "price": trade["price"],
-                        "time": trade["time"],
-                    })
+                all_trades.extend(await current_account.get().ledger.trades(symbol))
             except ClientError as e:
                 if "Invalid symbol" in str(e.error_message):
                     continue
@@ -557,29 +1079,151 @@ async def show_last_trades(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("You have no ETH, AVAX, USDC, ZRO, EUR trades.")
             return
 
-        latest_trades = sorted(all_trades, key=lambda t: t["time"], reverse=True)[:50]
+        latest_trades = sorted(all_trades, key=lambda t: t.time, reverse=True)[:50]
 
-        msg_lines = ["*Last 50 orders (ETH, AVAX, USDC, ZRO, EUR):*"]
-        for t in latest_trades:
-            date_str = datetime.utcfromtimestamp(t["time"] / 1000).strftime('%Y-%m-%d %H:%M:%S UTC')
-            msg_lines.append(f"- {t['side']} {t['qty']} {t['symbol']} @ {t['price']} on {date_str}")
-
-        await update.message.reply_text("\n".join(msg_lines), parse_mode="Markdown")
+        msg_lines = (
+            f"- {t.side} {t.qty} {escape(t.symbol)} @ {t.price} on "
+            f"{datetime.utcfromtimestamp(t.time / 1000).strftime('%Y-%m-%d %H:%M:%S UTC')}"
+            for t in latest_trades
+        )
+        await send_pages(update, context, "*Last 50 orders (ETH, AVAX, USDC, ZRO, EUR):*", msg_lines)
 
     except Exception as e:
+        metrics.error(e)
         await update.message.reply_text(f"Error: {str(e)}")
 
-def main() -> None:
-    app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+async def on_startup(app: Application) -> None:
+    global metrics_server, startup_task, telegram_bot
+    telegram_bot = app.bot
+    metrics.start()
+    if METRICS_PORT:
+        metrics_server = await serve_metrics(metrics, METRICS_PORT)
+    # Until their first refresh, accounts answer from the snapshots saved before the restart
+    warm_state.load(prices)
+    alert_engine.notify = lambda chat_id, alerts: send_alerts(app.bot, chat_id, alerts)
+    # The bot starts polling without waiting for this
+    startup_task = asyncio.get_running_loop().create_task(start_background(app))
+
+async def start_background(app: Application) -> None:
+    """Startup work the first replies do not wait for"""
+    # binance-connector and NumPy are imported in a thread instead of on the event loop
+    await asyncio.to_thread(public_client.prepare)
+    await asyncio.to_thread(importlib.import_module, "portfolio")
+    account_pool.start()
+    # job_queue is None without the python-telegram-bot[job-queue] extra
+    if app.job_queue is not None and PORTFOLIO_INTERVAL > 0:
+        app.job_queue.run_repeating(refresh_portfolio_job, interval=PORTFOLIO_INTERVAL, first=0)
+    if app.job_queue is not None:
+        app.job_queue.run_repeating(poll_prices_job, interval=ALERT_POLL_INTERVAL)
+    if app.job_queue is not None and ORDER_POLL_INTERVAL > 0:
+        app.job_queue.run_repeating(poll_orders_job, interval=ORDER_POLL_INTERVAL, first=0)
+    chart_renderer.warm_up()
+
+async def on_shutdown(app: Application) -> None:
+    if startup_task is not None:
+        startup_task.cancel()
+    warm_state.save(prices, account_pool.accounts())
+    await account_pool.stop()
+    chart_renderer.close()
+    metrics.stop()
+    if metrics_server is not None:
+        metrics_server.close()
+
+def build_application() -> Application:
+    """The bot with every handler registered, not running yet"""
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        # Telegram calls made by the commands are timed as spans too
+        .request(TracedRequest(metrics))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if TELEGRAM_API_URL:
+        builder.base_url(TELEGRAM_API_URL)
+    app = builder.build()
+
+    def command(name, callback):
+        # Every command is timed under its name
+        app.add_handler(CommandHandler(name, metrics.command(name, callback)))
+
+    command("start", start)
+    command("wallet", authorized(wallet))
+    command("total", authorized(total))
+    command("open_order", authorized(open_order))
+    command("show_last_trades", authorized(show_last_trades))
+    command("trades", authorized(show_all_trades))
+    command("tradesall", authorized(show_complete_trades))
+    command("pnl", authorized(trades_pnl))
+    command("history", authorized(show_history))
+    command("chart", authorized(chart))
+    command("alert", authorized(alert))
+    command("unalert", authorized(unalert))
+    app.add_handler(CallbackQueryHandler(
+        metrics.command("page", authorized(turn_page)), pattern=f"^{CALLBACK_PREFIX}:"
+    ))
+    command("reindex", authorized(reindex))
+    command("bind", admin_only(bind))
+    command("unbind", admin_only(unbind))
+    command("accounts", admin_only(list_accounts))
+    command("stats", admin_only(stats))
+    return app
+
+def webhook_options():
+    """Arguments of run_webhook, None when the bot polls"""
+    if not TELEGRAM_WEBHOOK_URL:
+        return None
+    return dict(
+        listen=TELEGRAM_WEBHOOK_LISTEN,
+        port=TELEGRAM_WEBHOOK_PORT,
+        url_path=urlsplit(TELEGRAM_WEBHOOK_URL).path.lstrip("/"),
+        webhook_url=TELEGRAM_WEBHOOK_URL,
+        secret_token=TELEGRAM_WEBHOOK_SECRET,
+        allowed_updates=ALLOWED_UPDATES,
+    )
 
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("wallet", wallet))
-    app.add_handler(CommandHandler("total", total))
-    app.add_handler(CommandHandler("open_order", open_order))
-    app.add_handler(CommandHandler("show_last_trades", show_last_trades))
-    app.add_handler(CommandHandler("trades", show_all_trades))
+def main() -> None:
+    # Chart workers are forked first, Application.initialize already runs getMe on executor threads.
+    # They only load matplotlib once the bot has started
+    chart_renderer.start()
+    app = build_application()
+    options = webhook_options()
+    if options:
+        # Updates with a wrong X-Telegram-Bot-Api-Secret-Token header are refused with 403
+        app.run_webhook(**options)
+    else:
+        app.run_polling(allowed_updates=ALLOWED_UPDATES)
 
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+async def backfill(name=DEFAULT_ACCOUNT) -> None:
+    """
+    First-run import of the whole trade history into the local ledger,
+    also rebuilds the index of traded symbols
+    Usage: python application.py backfill [ACCOUNT]
+    """
+    account = account_pool.get(name)
+    if account is None:
+        sys.exit(f"Unknown account {name}")
+    await symbol_index.rebuild(account.client, account.ledger, markets, QUOTE_ASSETS)
+    await account.ledger.backfill(SELECTED_SYMBOLS)
+    symbols = account.ledger.traded_symbols()
+    print(f"{len(symbols)} traded symbols indexed: {', '.join(symbols)}")
+
+def add_account(name) -> None:
+    """
+    Store the encrypted API keys of a team account, read from the terminal
+    Usage: python application.py add-account NAME
+    """
+    if name == DEFAULT_ACCOUNT:
+        sys.exit(f"{DEFAULT_ACCOUNT} is the account of binance_api_key and binance_api_secret")
+    api_key = getpass("API key: ")
+    api_secret = getpass("API secret: ")
+    account_store.add_account(name, api_key, api_secret)
+    print(f"Account {name} stored, bind users to it with /bind USER_ID {name}")
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["backfill"] and len(sys.argv) <= 3:
+        asyncio.run(backfill(*sys.argv[2:]))
+    elif sys.argv[1:2] == ["add-account"] and len(sys.argv) == 3:
+        add_account(sys.argv[2])
+    else:
+        main()
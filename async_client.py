@@ -0,0 +1,108 @@
+import asyncio
+import contextlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from binance.error import ClientError
+
+from ratelimit import request_weight
+
+# Attempts of a request answered with HTTP 429 before giving up
+RETRIES = 3
+
+
+class AsyncSpot:
+    """
+    Awaitable wrapper around the synchronous binance Spot client.
+    Every method of Spot is available with the same name and arguments, but
+    it runs in a thread pool so a slow request does not block the bot loop.
+    At most max_concurrency requests are in flight at the same time, and with a
+    WeightScheduler every request first waits for its Binance request weight.
+    Binance counts weight per IP, so clients of several accounts share one
+    scheduler and each gets its own budget, a WeightScheduler acquired first
+    that keeps one busy account from taking the whole limit. They can also
+    share one thread pool through executor. With metrics every call is timed
+    per endpoint.
+    client can also be a function returning the Spot client, it is then built
+    on first use, e.g. by prepare() in a thread while the bot starts.
+    """
+
+    def __init__(self, client, max_concurrency=8, scheduler=None, budget=None, executor=None, metrics=None):
+        self._factory = client if callable(client) else None
+        self._client = None if callable(client) else client
+        self._build_lock = threading.Lock()
+        self.max_concurrency = max_concurrency
+        self.scheduler = scheduler
+        self.budget = budget
+        self.metrics = metrics
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="binance")
+        self._semaphore = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._build_lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def prepare(self):
+        """Build the client now, blocking, to keep its imports off the event loop"""
+        return self.client
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self.request(name, method, *args, **kwargs)
+
+        return call
+
+    async def request(self, name, method, *args, **kwargs):
+        """Send one Binance request through the scheduler, honouring Retry-After"""
+        for attempt in range(RETRIES):
+            # Time spent waiting for request weight shows as its own span
+            with self.metrics.span("binance.weight_wait") if self.metrics else contextlib.nullcontext():
+                if self.budget is not None:
+                    await self.budget.acquire(request_weight(name, kwargs))
+                if self.scheduler is not None:
+                    await self.scheduler.acquire(request_weight(name, kwargs))
+            try:
+                with self.metrics.request(name) if self.metrics else contextlib.nullcontext():
+                    result = await self.run(method, *args, **kwargs)
+            except ClientError as e:
+                if self.scheduler is None or e.status_code not in (418, 429):
+                    raise e
+                # 429 is a warning, 418 means the IP is already banned
+                self.scheduler.retry_after(int((e.header or {}).get("Retry-After", 60)))
+                if e.status_code == 418 or attempt == RETRIES - 1:
+                    raise e
+                continue
+
+            if getattr(self.client, "show_limit_usage", False):
+                if self.scheduler is not None:
+                    self.scheduler.observe(result["limit_usage"])
+                return result["data"]
+            return result
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking call in the pool, waiting for a free slot first"""
+        # The semaphore is created lazily so it binds to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def close(self):
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
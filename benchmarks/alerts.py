@@ -0,0 +1,60 @@
+"""
+Price alert matching: per-symbol sorted indexes vs checking every alert on every tick.
+Usage: python benchmarks/alerts.py [alerts] [ticks]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from alerts import AlertEngine
+
+SYMBOLS = 1000
+CHATS = 5000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(1)
+    prices = {f"SYM{i}USDT": rng.uniform(0.01, 50000) for i in range(SYMBOLS)}
+    symbols = list(prices)
+
+    engine = AlertEngine(":memory:")
+    start = time.perf_counter()
+    for _ in range(count):
+        symbol = rng.choice(symbols)
+        threshold = prices[symbol] * rng.uniform(0.8, 1.2)
+        engine.add(rng.randrange(CHATS), symbol, threshold > prices[symbol], threshold)
+    print(f"add {count} alerts: {time.perf_counter() - start:.2f} s")
+    alerts = list(engine._alerts.values())
+
+    # Every tick moves every price, like a bulk ticker_price snapshot
+    walk = []
+    for _ in range(ticks):
+        for symbol in symbols:
+            prices[symbol] *= 1 + rng.uniform(-0.005, 0.005)
+        walk.append(dict(prices))
+
+    start = time.perf_counter()
+    naive_crossed = 0
+    for tick in walk:
+        # Crossed alerts are not removed here, this is only the cost of looking at all of them
+        naive_crossed += sum(1 for a in alerts if a.crossed(tick[a.symbol]))
+    naive = (time.perf_counter() - start) / ticks
+
+    start = time.perf_counter()
+    crossed = 0
+    for tick in walk:
+        crossed += len(engine.check(tick))
+    indexed = (time.perf_counter() - start) / ticks
+
+    print(f"scan every alert: {naive * 1000:8.2f} ms/tick")
+    print(f"sorted indexes:   {indexed * 1000:8.2f} ms/tick  ({crossed} alerts fired over {ticks} ticks, "
+          f"{len(engine)} left)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Import time of application.py and time to first reply after a restart.
+The bot runs as `python application.py` against a fake Telegram and a fake
+Binance on local ports. Commands are queued before it starts, like messages
+sent while the bot restarts, and each boot reports when the process called
+getMe, its first getUpdates and each reply. The second boot starts from the
+files the first one left behind.
+The import time is the median of several runs, next to the same for the
+application.py of a baseline commit, the first commit of the repository
+unless given.
+Usage: python benchmarks/cold_start.py [small|medium|large] [latency_seconds] [baseline_commit]
+"""
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_spot import FakeExchange, serve
+from webhook import FakeTelegram, command_update, free_port
+
+APPLICATION = os.path.join(os.path.dirname(__file__), "..", "application.py")
+REPOSITORY = os.path.join(os.path.dirname(__file__), "..")
+
+# Imports timed per tree, after one run that writes the bytecode caches
+IMPORT_RUNS = 7
+
+COMMANDS = ['/wallet', '/trades BTC', '/total']
+
+# Seconds a boot may take to answer every command
+BOOT_TIMEOUT = 120
+
+
+class BootTelegram(FakeTelegram):
+    """FakeTelegram noting when the bot first called it"""
+
+    def reset(self):
+        super().reset()
+        self.calls = {}
+
+    async def getMe(self, **params):
+        self.calls.setdefault('getMe', time.perf_counter())
+        return await super().getMe(**params)
+
+    async def getUpdates(self, **params):
+        self.calls.setdefault('getUpdates', time.perf_counter())
+        return await super().getUpdates(**params)
+
+
+def environment(directory, telegram_port, binance_port):
+    env = dict(os.environ)
+    env.update({
+        'telegram_bot_token': "1:fake",
+        'telegram_api_url': f"http://127.0.0.1:{telegram_port}/bot",
+        'binance_api_url': f"http://127.0.0.1:{binance_port}",
+        'binance_api_key': "fake",
+        'binance_api_secret': "fake",
+        'binance_streams': "0",
+        # The users of command_update
+        'admin_user_ids': ",".join(str(1000 + i) for i in range(1, len(COMMANDS) + 1)),
+        'ledger_path': os.path.join(directory, "trades.db"),
+        'alerts_path': os.path.join(directory, "alerts.db"),
+        'accounts_path': os.path.join(directory, "accounts.db"),
+        'exchange_info_path': os.path.join(directory, "exchange_info.json"),
+        'history_path': os.path.join(directory, "history"),
+        'accounts_dir': os.path.join(directory, "accounts"),
+        'warm_state_path': os.path.join(directory, "warm_state.json"),
+    })
+    return env
+
+
+def import_time(env, directory):
+    """Milliseconds python -X importtime reports for import application in directory"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import application"],
+        cwd=directory, env=env, capture_output=True, text=True
+    )
+    for line in result.stderr.splitlines():
+        if line.endswith("| application"):
+            return int(line.split("|")[1]) / 1000
+    raise RuntimeError(result.stderr[-2000:])
+
+
+def median_import_time(env, directory):
+    import_time(env, directory)
+    return statistics.median(import_time(env, directory) for _ in range(IMPORT_RUNS))
+
+
+def baseline_tree(commit, directory):
+    """Files of commit extracted in directory"""
+    archive = subprocess.run(["git", "archive", commit], cwd=REPOSITORY, capture_output=True, check=True)
+    subprocess.run(["tar", "-x", "-C", directory], input=archive.stdout, check=True)
+    return directory
+
+
+async def boot(label, telegram_port, env, log):
+    updates = [command_update(i, text) for i, text in enumerate(COMMANDS, 1)]
+    fake = BootTelegram(updates)
+    server = fake.app().listen(telegram_port, "127.0.0.1")
+    start = time.perf_counter()
+    # Sent while the bot was down, waiting for its first getUpdates
+    fake.pending = list(updates)
+    fake.sent = {u['update_id']: start for u in updates}
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, APPLICATION, env=env, stdout=log, stderr=log
+    )
+    try:
+        deadline = time.perf_counter() + BOOT_TIMEOUT
+        while len(fake.replies) < len(updates) and time.perf_counter() < deadline and process.returncode is None:
+            await asyncio.sleep(0.01)
+    finally:
+        process.send_signal(signal.SIGINT)
+        await process.wait()
+        fake._arrived.set()
+        await asyncio.sleep(0.1)
+        server.stop()
+
+    def ms(seconds):
+        return f"{seconds * 1000:9.0f}" if seconds is not None else f"{'-':>9s}"
+
+    row = [ms(fake.calls.get(name, start + float("nan")) - start) for name in ('getMe', 'getUpdates')]
+    row += [ms(fake.replies.get(u['update_id'])) for u in updates]
+    print(f"{label:6s} " + " ".join(row))
+
+
+async def run(size, latency, baseline):
+    exchange = FakeExchange(size, latency=latency)
+    binance_port = free_port()
+    telegram_port = free_port()
+    binance = serve(exchange, binance_port)
+    try:
+        with tempfile.TemporaryDirectory() as directory, open(os.path.join(directory, "bot.log"), "w") as log:
+            env = environment(directory, telegram_port, binance_port)
+            current = median_import_time(env, REPOSITORY)
+            with tempfile.TemporaryDirectory() as tree:
+                before = median_import_time(env, baseline_tree(baseline, tree))
+            print(f"import application: {current:.0f} ms, {before:.0f} ms at {baseline[:7]} "
+                  f"(median of {IMPORT_RUNS})")
+            print(f"{size} account, {latency * 1000:.0f} ms per Binance request, milliseconds after the process started")
+            print(f"{'boot':6s} {'getMe':>9s} {'polling':>9s} " + " ".join(f"{c.split()[0]:>9s}" for c in COMMANDS))
+            await boot("cold", telegram_port, env, log)
+            await boot("warm", telegram_port, env, log)
+    finally:
+        binance.stop()
+
+
+def main():
+    size = sys.argv[1] if len(sys.argv) > 1 else 'medium'
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    if len(sys.argv) > 3:
+        baseline = sys.argv[3]
+    else:
+        roots = subprocess.run(["git", "rev-list", "--max-parents=0", "HEAD"], cwd=REPOSITORY,
+                               capture_output=True, text=True, check=True)
+        baseline = roots.stdout.split()[-1]
+    asyncio.run(run(size, latency, baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+End-to-end latency of every bot command against the offline fake Spot API.
+Each CommandHandler of the bot is called with fake Update objects, the
+report shows cold and warm latency, Binance calls and request weight per run.
+Usage: python benchmarks/commands.py [small|medium|large] [runs] [latency_seconds]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fake_spot import SIZES, FakeExchange, FakeSpot
+
+USER_ID = 1
+
+# Arguments each command is run with, the others run without
+ARGS = {
+    'trades': ['BTC'],
+    'tradesall': ['BTC'],
+    'pnl': ['BTC'],
+    'history': ['1d'],
+    'chart': ['allocation'],
+}
+
+# Commands that change state instead of reading it
+SKIPPED = {'bind', 'unbind', 'unalert', 'reindex'}
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+    async def reply_photo(self, photo, **kwargs):
+        self.replies.append(photo)
+
+
+def fake_update():
+    message = FakeMessage()
+    user = SimpleNamespace(id=USER_ID)
+    return SimpleNamespace(
+        message=message, effective_message=message, effective_user=user, effective_chat=user
+    )
+
+
+def setup_environment(directory):
+    """Point every file of the bot at a scratch directory, before application is imported"""
+    os.environ.update({
+        'telegram_bot_token': '1:fake',
+        'binance_api_key': 'fake',
+        'binance_api_secret': 'fake',
+        'admin_user_ids': str(USER_ID),
+        'binance_streams': '0',
+        'ledger_path': ':memory:',
+        'alerts_path': ':memory:',
+        'accounts_path': ':memory:',
+        'exchange_info_path': os.path.join(directory, 'exchange_info.json'),
+        'history_path': os.path.join(directory, 'history'),
+        'warm_state_path': os.path.join(directory, 'warm_state.json'),
+        'accounts_dir': os.path.join(directory, 'accounts'),
+    })
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+async def measure(application, exchange, handler, args, runs):
+    latencies, calls, weights, errors = [], [], [], 0
+    for _ in range(runs):
+        update = fake_update()
+        context = SimpleNamespace(args=list(args), chat_data={}, user_data={}, bot_data={})
+        calls_before, weight_before = exchange.stats()
+        start = time.perf_counter()
+        await handler.callback(update, context)
+        latencies.append(time.perf_counter() - start)
+        calls_after, weight_after = exchange.stats()
+        calls.append(calls_after - calls_before)
+        weights.append(weight_after - weight_before)
+        errors += sum(1 for r in update.message.replies if isinstance(r, str) and r.startswith(("⚠️", "Error")))
+    return latencies, calls, weights, errors
+
+
+async def run(size, runs, latency):
+    import application
+    from telegram.ext import CommandHandler
+
+    exchange = FakeExchange(size, latency=latency)
+    application.public_client.client = FakeSpot(exchange, show_limit_usage=True)
+    application.new_spot = lambda api_key=None, api_secret=None: FakeSpot(
+        exchange, api_key=api_key, api_secret=api_secret, show_limit_usage=True
+    )
+    application.chart_renderer.warm_up()
+
+    bot = application.build_application()
+    handlers = [
+        h for group in bot.handlers.values() for h in group
+        if isinstance(h, CommandHandler) and not h.commands & SKIPPED
+    ]
+
+    print(f"{size} account: {SIZES[size][0]} assets, {SIZES[size][1]} trades per symbol, "
+          f"{latency * 1000:.0f} ms per request, {runs} runs")
+    print(f"{'command':18s} {'cold ms':>9s} {'p50 ms':>9s} {'p99 ms':>9s} {'calls':>7s} {'weight':>7s} {'errors':>6s}")
+    for handler in handlers:
+        command = sorted(handler.commands)[0]
+        args = ARGS.get(command, [])
+        latencies, calls, weights, errors = await measure(application, exchange, handler, args, runs)
+        warm = latencies[1:] or latencies
+        label = " ".join(["/" + command] + args)
+        print(f"{label:18s} {latencies[0] * 1000:9.1f} {percentile(warm, 0.5) * 1000:9.1f} "
+              f"{percentile(warm, 0.99) * 1000:9.1f} {statistics.mean(calls):7.1f} "
+              f"{statistics.mean(weights):7.1f} {errors:6d}")
+
+    calls, weight = exchange.stats()
+    print(f"total: {calls} Binance calls, weight {weight}, by endpoint: {dict(exchange.calls.most_common())}")
+    print("\n".join(application.metrics.summary()))
+    application.chart_renderer.close()
+
+
+def main():
+    size = sys.argv[1] if len(sys.argv) > 1 else 'medium'
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    with tempfile.TemporaryDirectory() as directory:
+        setup_environment(directory)
+        asyncio.run(run(size, runs, latency))
+
+
+if __name__ == "__main__":
+    main()
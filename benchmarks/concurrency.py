@@ -0,0 +1,55 @@
+"""
+Latency of concurrent commands with blocking Spot calls vs the AsyncSpot wrapper.
+Each fake request sleeps like a slow Binance round-trip.
+Usage: python benchmarks/concurrency.py [commands] [latency_seconds]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from async_client import AsyncSpot
+
+
+class SlowSpot:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def account(self):
+        time.sleep(self.latency)
+        return {'balances': []}
+
+
+async def blocking_command(client):
+    client.account()
+
+
+async def async_command(client):
+    await client.account()
+
+
+async def measure(command, client, commands):
+    """Wall time until the last of the concurrent commands has replied"""
+    start = time.perf_counter()
+    await asyncio.gather(*(command(client) for _ in range(commands)))
+    return time.perf_counter() - start
+
+
+def main():
+    commands = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    spot = SlowSpot(latency)
+
+    wall = asyncio.run(measure(blocking_command, spot, commands))
+    print(f"blocking: {commands} commands in {wall:.2f}s")
+
+    async_spot = AsyncSpot(spot, max_concurrency=commands)
+    wall = asyncio.run(measure(async_command, async_spot, commands))
+    async_spot.close()
+    print(f"async:    {commands} commands in {wall:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Valuing a portfolio through the conversion graph: one vectorized pass over the
+path table vs pricing every asset on its own through a pair lookup per hop.
+The market is synthetic, about 2000 pairs quoted in USDT, BTC, ETH, EUR and
+TRY, some assets only listed against BTC, ETH or TRY. A new prices dict, like
+a Prices download, comes in every VALUATIONS valuations, as when several
+users ask for /total within the price TTL.
+The script first checks that a graph fed snapshots whose priced symbols change,
+in a new dict or in place, gives the rates of a fresh graph, and exits
+non-zero on a mismatch.
+Usage: python benchmarks/conversion.py [assets] [valuations]
+"""
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from conversion import ConversionGraph
+from markets import Markets
+from prices import USD_ASSET, Prices
+
+ASSETS = 800
+QUOTES = ['USDT', 'BTC', 'ETH', 'EUR', 'TRY']
+VALUATIONS = 10
+
+
+def synthetic_market(rng):
+    usd = {'USDT': 1.0, 'BTC': 60000.0, 'ETH': 3000.0, 'EUR': 1.1, 'TRY': 0.03}
+    pairs = {('BTC', 'USDT'), ('ETH', 'USDT'), ('ETH', 'BTC'), ('EUR', 'USDT'), ('USDT', 'TRY')}
+    for i in range(ASSETS):
+        asset = f"A{i}"
+        usd[asset] = rng.uniform(0.001, 500)
+        for quote in rng.sample(QUOTES, rng.randint(1, 3)):
+            pairs.add((asset, quote))
+    symbols = {b + q: {'base': b, 'quote': q, 'status': 'TRADING', 'filters': {}} for b, q in pairs}
+    prices = {b + q: usd[b] / usd[q] for b, q in pairs}
+    return symbols, prices, usd
+
+
+def lookup_price(markets, prices, asset, quote, depth=2):
+    """Depth-first pair lookups, like valuing one asset without a table"""
+    if asset == quote:
+        return 1.0
+    price = prices.get(markets.symbol(asset, quote))
+    if price:
+        return price
+    price = prices.get(markets.symbol(quote, asset))
+    if price:
+        return 1 / price
+    if depth == 0:
+        return None
+    for bridge in QUOTES:
+        if bridge in (asset, quote):
+            continue
+        to_bridge = lookup_price(markets, prices, asset, bridge, 0)
+        bridge_quote = lookup_price(markets, prices, bridge, quote, depth - 1) if to_bridge else None
+        if bridge_quote:
+            return to_bridge * bridge_quote
+    return None
+
+
+def markets_of(symbols):
+    markets = Markets.__new__(Markets)
+    markets._build(symbols, time.time())
+    return markets
+
+
+def check():
+    """Rates of a graph reused across snapshots against a fresh graph, returns the number of failures"""
+    failures = 0
+
+    def compare(name, graph, markets, prices, assets, target):
+        nonlocal failures
+        got = graph.rates(prices, assets, target)
+        expected = ConversionGraph(markets).rates(prices, assets, target)
+        if not np.allclose(got, expected, equal_nan=True):
+            failures += 1
+            print(f"FAIL {name}: got {got}, expected {expected}")
+
+    markets = markets_of({b + q: {'base': b, 'quote': q, 'status': 'TRADING', 'filters': {}}
+                          for b, q in [('A', 'USDT'), ('A', 'BTC'), ('BTC', 'USDT')]})
+    graph = ConversionGraph(markets)
+    compare("first snapshot", graph, markets, {'AUSDT': 2.0, 'BTCUSDT': 50.0}, ['A', 'BTC', 'USDT'], 'USDT')
+    # As many symbols as before, not the same ones
+    compare("other symbols, same count", graph, markets, {'ABTC': 0.1, 'BTCUSDT': 50.0}, ['A', 'BTC', 'USDT'], 'USDT')
+    prices = {'BTCUSDT': 50.0}
+    compare("one symbol", graph, markets, prices, ['A', 'USDT'], 'USDT')
+    prices['AUSDT'] = 3.0
+    compare("a symbol added in place", graph, markets, prices, ['A', 'USDT'], 'USDT')
+    prices['AUSDT'] = 4.0
+    compare("a price changed in place", graph, markets, prices, ['A', 'USDT'], 'USDT')
+
+    rng = random.Random(3)
+    symbols, snapshot, usd = synthetic_market(rng)
+    markets = markets_of(symbols)
+    graph = ConversionGraph(markets)
+    names = sorted(snapshot)
+    for i in range(50):
+        # Random subsets of the priced symbols, often of the same size
+        priced = rng.sample(names, len(names) - rng.randint(0, 3) * 100)
+        prices = {name: snapshot[name] * rng.uniform(0.9, 1.1) for name in priced}
+        held = rng.sample(sorted(usd), 20)
+        compare(f"random snapshot {i}", graph, markets, prices, held, rng.choice(QUOTES))
+    print(f"{'FAIL' if failures else 'ok  '} reused graph matches a fresh graph on 55 snapshots")
+    return failures
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    valuations = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    failed = check()
+    rng = random.Random(1)
+    symbols, snapshot, usd = synthetic_market(rng)
+    markets = markets_of(symbols)
+    prices = Prices(None, markets)
+    prices.prices = dict(snapshot)
+    downloads = [{name: price * rng.uniform(0.99, 1.01) for name, price in snapshot.items()} for _ in range(10)]
+    held = rng.sample([f"A{i}" for i in range(ASSETS)], count)
+    quantities = [rng.uniform(0.1, 100) for _ in held]
+    print(f"{len(symbols)} pairs, {count} assets held, {valuations} valuations, a new price snapshot every {VALUATIONS}")
+
+    start = time.perf_counter()
+    ConversionGraph(markets).rates(prices.prices, held, USD_ASSET)
+    print(f"graph and USDT path table: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for quote in (USD_ASSET, 'EUR'):
+        start = time.perf_counter()
+        for i in range(valuations):
+            lookups = [lookup_price(markets, downloads[i // VALUATIONS % 10], a, quote) or 0.0 for a in held]
+        per_pair = (time.perf_counter() - start) / valuations
+
+        start = time.perf_counter()
+        for i in range(valuations):
+            prices.prices = downloads[i // VALUATIONS % 10]
+            rates = prices.rates(held, quote)
+        vectorized = (time.perf_counter() - start) / valuations
+        prices.prices = dict(snapshot)
+        rates = prices.rates(held, quote)
+
+        expected = [usd[a] / usd[quote] for a in held]
+        error = max(abs(r - e) / e for r, e in zip(rates, expected))
+        missed = sum(1 for r in lookups if not r)
+        print(f"in {quote:4s} pair lookups {per_pair * 1e6:8.0f} us ({missed} unpriced), "
+              f"path table {vectorized * 1e6:8.0f} us (max relative error {error:.1e})")
+    total = sum(q * r for q, r in zip(quantities, prices.rates(held, 'EUR')))
+    print(f"portfolio value: {total:.2f} EUR")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
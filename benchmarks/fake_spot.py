@@ -0,0 +1,247 @@
+"""
+Offline stand-in for the binance Spot client.
+FakeExchange holds synthetic markets and an account of a chosen size, FakeSpot
+answers the Spot methods the bot uses from it, sleeping like a Binance
+round-trip and returning X-MBX-USED-WEIGHT-1M like the real API.
+serve() answers the same methods over HTTP, for a bot running in another process.
+"""
+import asyncio
+import collections
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import requests
+import tornado.web
+from binance.error import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ratelimit import request_weight
+
+QUOTES = ['USDT', 'USDC', 'BTC', 'ETH']
+
+# Assets held, trades per symbol and open orders of the synthetic accounts
+SIZES = {
+    'small': (5, 50, 2),
+    'medium': (30, 1000, 10),
+    'large': (150, 5000, 50),
+}
+
+WEIGHT_WINDOW = 60
+
+
+class FakeExchange:
+    """Markets, prices and one account, shared by every FakeSpot"""
+
+    def __init__(self, size='medium', latency=0.05, jitter=0.01, seed=1):
+        assets, trades, orders = SIZES[size]
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.calls = collections.Counter()
+        self.weight = 0
+        self._window = collections.deque()
+        self._lock = threading.Lock()
+
+        names = ['BTC', 'ETH'] + [f"A{i:03d}" for i in range(max(assets - 2, 0))]
+        self.assets = names[:assets]
+        self.prices = {'BTCUSDT': 60000.0, 'ETHUSDT': 3000.0, 'USDCUSDT': 1.0, 'ETHBTC': 0.05}
+        for asset in self.assets[2:]:
+            self.prices[f"{asset}USDT"] = round(self.rng.uniform(0.01, 500), 4)
+            self.prices[f"{asset}BTC"] = round(self.prices[f"{asset}USDT"] / 60000, 8)
+        # Markets the account never traded, like the rest of the exchange
+        for i in range(1000):
+            self.prices[f"X{i:04d}USDT"] = round(self.rng.uniform(0.01, 100), 4)
+
+        self.balances = [
+            {'asset': asset, 'free': f"{self.rng.uniform(0.1, 100):.8f}", 'locked': '0.00000000'}
+            for asset in self.assets
+        ] + [{'asset': 'USDT', 'free': '1000.00000000', 'locked': '0.00000000'}]
+        self.trades = {f"{asset}USDT": self._trades(f"{asset}USDT", trades) for asset in self.assets}
+        self.open_orders = [self._order(i) for i in range(orders)]
+
+    def exchange_info(self):
+        symbols = []
+        for symbol in self.prices:
+            for quote in QUOTES:
+                if symbol.endswith(quote) and symbol != quote:
+                    symbols.append({
+                        'symbol': symbol,
+                        'baseAsset': symbol[:-len(quote)],
+                        'quoteAsset': quote,
+                        'status': 'TRADING',
+                        'filters': [{'filterType': 'PRICE_FILTER', 'tickSize': '0.00000001'}],
+                    })
+                    break
+        return {'timezone': 'UTC', 'symbols': symbols}
+
+    def request(self, name, kwargs):
+        """Count one call and its weight, then wait like the network would"""
+        weight = request_weight(name, kwargs)
+        now = time.monotonic()
+        with self._lock:
+            self.calls[name] += 1
+            self.weight += weight
+            self._window.append((now, weight))
+            while self._window[0][0] < now - WEIGHT_WINDOW:
+                self._window.popleft()
+            used = sum(w for _, w in self._window)
+            delay = max(self.latency + self.rng.uniform(-self.jitter, self.jitter), 0)
+        time.sleep(delay)
+        return {'x-mbx-used-weight-1m': str(used)}
+
+    def stats(self):
+        with self._lock:
+            return sum(self.calls.values()), self.weight
+
+    def _trades(self, symbol, count):
+        price = self.prices[symbol]
+        trades = []
+        for i in range(count):
+            qty = self.rng.uniform(0.01, 1)
+            fill = price * self.rng.uniform(0.8, 1.2)
+            trades.append({
+                'symbol': symbol,
+                'id': i,
+                'orderId': 100000 + i,
+                'orderListId': -1,
+                'price': f"{fill:.8f}",
+                'qty': f"{qty:.8f}",
+                'quoteQty': f"{fill * qty:.8f}",
+                'commission': f"{qty * 0.001:.8f}",
+                'commissionAsset': symbol[:-4],
+                'time': 1600000000000 + i * 3600000,
+                'isBuyer': self.rng.random() < 0.6,
+                'isMaker': self.rng.random() < 0.5,
+                'isBestMatch': True,
+            })
+        return trades
+
+    def _order(self, i):
+        symbol = f"{self.assets[i % len(self.assets)]}USDT"
+        return {
+            'symbol': symbol,
+            'orderId': 500000 + i,
+            'side': 'BUY' if i % 2 else 'SELL',
+            'type': 'LIMIT',
+            'price': f"{self.prices[symbol] * 0.9:.8f}",
+            'origQty': '1.00000000',
+            'executedQty': '0.00000000',
+            'status': 'NEW',
+            'time': 1700000000000 + i,
+        }
+
+
+class FakeSpot:
+    """Spot client answering from a FakeExchange, accepts the Spot constructor arguments"""
+
+    def __init__(self, exchange, api_key=None, api_secret=None, show_limit_usage=False, **kwargs):
+        self.exchange = exchange
+        self.api_key = api_key
+        self.show_limit_usage = show_limit_usage
+        # The bot mounts its connection pool on the session
+        self.session = requests.Session()
+
+    def _reply(self, name, kwargs, data):
+        headers = self.exchange.request(name, kwargs)
+        if self.show_limit_usage:
+            return {'limit_usage': headers, 'data': data}
+        return data
+
+    def account(self, **kwargs):
+        return self._reply('account', kwargs, {
+            'updateTime': 1700000000000,
+            'balances': [dict(b) for b in self.exchange.balances],
+        })
+
+    def my_trades(self, symbol, **kwargs):
+        if symbol not in self.exchange.prices:
+            self.exchange.request('my_trades', kwargs)
+            raise ClientError(400, -1121, "Invalid symbol.", {})
+        trades = self.exchange.trades.get(symbol, [])
+        from_id = kwargs.get('fromId', 0)
+        limit = kwargs.get('limit', 500)
+        return self._reply('my_trades', kwargs, [dict(t) for t in trades[from_id:from_id + limit]])
+
+    def ticker_price(self, symbol=None, symbols=None, **kwargs):
+        kwargs.update(symbol=symbol, symbols=symbols)
+        if symbol:
+            data = {'symbol': symbol, 'price': f"{self.exchange.prices[symbol]:.8f}"}
+        else:
+            data = [{'symbol': s, 'price': f"{p:.8f}"} for s, p in self.exchange.prices.items()]
+        return self._reply('ticker_price', kwargs, data)
+
+    def exchange_info(self, **kwargs):
+        return self._reply('exchange_info', kwargs, self.exchange.exchange_info())
+
+    def get_open_orders(self, symbol=None, **kwargs):
+        kwargs.update(symbol=symbol)
+        orders = [dict(o) for o in self.exchange.open_orders if symbol in (None, o['symbol'])]
+        return self._reply('get_open_orders', kwargs, orders)
+
+    def deposit_history(self, **kwargs):
+        return self._reply('deposit_history', kwargs, [])
+
+    def get_convert_trade_history(self, **kwargs):
+        return self._reply('get_convert_trade_history', kwargs, {'list': []})
+
+    def new_listen_key(self, **kwargs):
+        return self._reply('new_listen_key', kwargs, {'listenKey': 'fake'})
+
+    def renew_listen_key(self, listenKey, **kwargs):
+        return self._reply('renew_listen_key', kwargs, {})
+
+
+# REST paths of the FakeSpot methods
+ROUTES = {
+    ('GET', '/api/v3/account'): 'account',
+    ('GET', '/api/v3/myTrades'): 'my_trades',
+    ('GET', '/api/v3/ticker/price'): 'ticker_price',
+    ('GET', '/api/v3/exchangeInfo'): 'exchange_info',
+    ('GET', '/api/v3/openOrders'): 'get_open_orders',
+    ('GET', '/sapi/v1/capital/deposit/hisrec'): 'deposit_history',
+    ('GET', '/sapi/v1/convert/tradeFlow'): 'get_convert_trade_history',
+    ('POST', '/api/v3/userDataStream'): 'new_listen_key',
+    ('PUT', '/api/v3/userDataStream'): 'renew_listen_key',
+}
+
+# Added by the connector to signed requests
+SIGNATURE_PARAMS = {'timestamp', 'signature', 'recvWindow'}
+
+
+def serve(exchange, port, host="127.0.0.1"):
+    """Answer the Binance REST API from exchange on port, in the running event loop"""
+    spot = FakeSpot(exchange, show_limit_usage=True)
+
+    class Endpoint(tornado.web.RequestHandler):
+        async def handle(self):
+            name = ROUTES.get((self.request.method, self.request.path))
+            if name is None:
+                raise tornado.web.HTTPError(404)
+            kwargs = {}
+            for key, values in self.request.query_arguments.items():
+                if key in SIGNATURE_PARAMS:
+                    continue
+                value = values[0].decode()
+                kwargs[key] = int(value) if value.isdigit() else json.loads(value) if value[:1] == "[" else value
+            try:
+                # FakeSpot sleeps like the network, keep it off the loop
+                result = await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: getattr(spot, name)(**kwargs)
+                )
+            except ClientError as e:
+                self.set_status(e.status_code)
+                self.finish({'code': e.error_code, 'msg': e.error_message})
+                return
+            for header, value in result['limit_usage'].items():
+                self.set_header(header, value)
+            self.set_header("Content-Type", "application/json")
+            self.finish(json.dumps(result['data']))
+
+        get = post = put = handle
+
+    return tornado.web.Application([(r".*", Endpoint)]).listen(port, host)
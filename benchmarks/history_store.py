@@ -0,0 +1,53 @@
+"""
+Portfolio history store: appending a year of 1-minute points and reading ranges back.
+Usage: python benchmarks/history_store.py [days]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from history import History
+
+ASSETS = ['BTC', 'ETH', 'BNB', 'SOL', 'USDT']
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 365
+    count = days * 1440
+    rng = random.Random(1)
+    values = {asset: 1000.0 for asset in ASSETS}
+    start_time = 1700000000 - 1700000000 % 86400
+
+    with tempfile.TemporaryDirectory() as path:
+        history = History(path)
+        start = time.perf_counter()
+        for i in range(count):
+            for asset in ASSETS:
+                values[asset] *= 1 + rng.uniform(-0.001, 0.001)
+            history.record(start_time + i * 60, sum(values.values()), values)
+        elapsed = time.perf_counter() - start
+        print(f"append {count} points: {elapsed:.2f} s ({elapsed / count * 1e6:.1f} us/point)")
+        print(f"files on disk: {directory_size(path) / 2 ** 20:.2f} MiB "
+              f"(unbounded 1m files would be {count * 16 * (1 + len(ASSETS) * 20 / 16) / 2 ** 20:.1f} MiB)")
+
+        end_time = start_time + (count - 1) * 60
+        for label, seconds in (('1d', 86400), ('7d', 7 * 86400), ('90d', 90 * 86400), ('1y', 365 * 86400)):
+            for asset in (None, 'BTC'):
+                start = time.perf_counter()
+                times, points = history.range(end_time - seconds, end_time, asset)
+                elapsed = (time.perf_counter() - start) * 1000
+                tier = history.tier_for(end_time - seconds).name
+                print(f"read {label:>3s} {asset or 'total':5s} from {tier}: {len(points):6d} points {elapsed:7.2f} ms")
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+TradeLedger.sync against a recording fake my_trades.
+The fake pages trades by fromId like Binance, with gaps between trade ids.
+The script syncs 2500 trades, then syncs again with nothing new, with new
+trades spanning a page boundary, with exactly one page of new trades and
+after reopening the ledger file. It checks that no request asks for a trade
+already stored and that no row is stored twice.
+Usage: python benchmarks/ledger_sync.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ledger import PAGE_SIZE, TradeLedger
+
+SYMBOL = 'BTCUSDT'
+
+
+class RecordingSpot:
+    """my_trades of one account by fromId, remembering every request and the ids it returned"""
+
+    def __init__(self):
+        self.trades = {}
+        self.calls = []
+
+    def add(self, symbol, count):
+        trades = self.trades.setdefault(symbol, [])
+        for _ in range(count):
+            # Trade ids of a symbol grow but are not contiguous
+            trade_id = trades[-1]['id'] + 3 if trades else 10
+            trades.append({
+                'symbol': symbol, 'id': trade_id, 'orderId': trade_id // 2, 'price': '30000.00000000',
+                'qty': '0.00100000', 'quoteQty': '30.00000000', 'commission': '0.00000100',
+                'commissionAsset': 'BNB', 'time': 1600000000000 + trade_id, 'isBuyer': trade_id % 2 == 0,
+                'isMaker': False,
+            })
+
+    async def my_trades(self, symbol, fromId, limit=500):
+        page = [dict(t) for t in self.trades.get(symbol, []) if t['id'] >= fromId][:limit]
+        self.calls.append((symbol, fromId, [t['id'] for t in page]))
+        return page
+
+
+def stored(ledger, symbol):
+    """Count of rows and of distinct ids of symbol on disk"""
+    return ledger._db.execute("SELECT COUNT(*), COUNT(DISTINCT id) FROM trades WHERE symbol = ?", (symbol,)).fetchone()
+
+
+async def check(path):
+    spot = RecordingSpot()
+    ledger = TradeLedger(spot, path)
+    results = []
+
+    async def step(name, new_trades, expected_calls, ledger=ledger):
+        synced = ledger.last_id(SYMBOL) is not None
+        before = {t.id for t in await ledger.trades(SYMBOL, sync=False)} if synced else set()
+        spot.add(SYMBOL, new_trades)
+        del spot.calls[:]
+        added = await ledger.sync(SYMBOL)
+        fetched = [trade_id for _, _, ids in spot.calls for trade_id in ids]
+        rows, distinct = stored(ledger, SYMBOL)
+        cached = [t.id for t in await ledger.trades(SYMBOL, sync=False)]
+        expected_ids = [t['id'] for t in spot.trades[SYMBOL]]
+        problems = []
+        if added != new_trades:
+            problems.append(f"added {added} of {new_trades}")
+        if before & set(fetched):
+            problems.append(f"fetched {len(before & set(fetched))} trades already stored")
+        if len(fetched) != len(set(fetched)):
+            problems.append(f"{len(fetched) - len(set(fetched))} trades fetched on two pages")
+        if rows != distinct or rows != len(expected_ids):
+            problems.append(f"{rows} rows, {distinct} distinct, {len(expected_ids)} expected")
+        if cached != expected_ids:
+            problems.append(f"{len(cached)} trades in memory, {len(expected_ids)} expected")
+        if len(spot.calls) != expected_calls:
+            problems.append(f"{len(spot.calls)} requests, {expected_calls} expected")
+        results.append((name, not problems, ", ".join(problems)))
+
+    await step("first sync of 2500 trades", 2500, 3)
+    ids = [t['id'] for t in spot.trades[SYMBOL]]
+    first_calls = [from_id for _, from_id, _ in spot.calls]
+    expected = [0, ids[PAGE_SIZE - 1] + 1, ids[2 * PAGE_SIZE - 1] + 1]
+    results.append(("first sync pages after the last id of each page", first_calls == expected,
+                    f"fromId {first_calls}, expected {expected}"))
+    await step("second sync with nothing new", 0, 1)
+    results.append(("second sync asks after the last id", spot.calls[0][1] == ids[-1] + 1,
+                    f"fromId {spot.calls[0][1]} after {ids[-1]}"))
+    await step("new trades across a page boundary", PAGE_SIZE + 200, 2)
+    await step("exactly one page of new trades", PAGE_SIZE, 2)
+    ledger._db.close()
+
+    last_id = spot.trades[SYMBOL][-1]['id']
+    reopened = TradeLedger(spot, path)
+    await step("sync after reopening the ledger", 5, 1, ledger=reopened)
+    results.append(("reopened ledger asks after the last id", spot.calls[0][1] == last_id + 1,
+                    f"fromId {spot.calls[0][1]} after {last_id}"))
+    reopened._db.close()
+
+    failed = 0
+    for name, ok, detail in results:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}" + ("" if ok else f": {detail}"))
+        failed += not ok
+    return failed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        failed = asyncio.run(check(os.path.join(directory, "ledger.sqlite")))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Order watcher against a scripted fake order feed, then the cost of a poll diff.
+The script places, fills and cancels orders through executionReport events,
+through REST polls and across a stream reconnection, and checks that every
+fill, partial fill and cancel is reported once. The timing part diffs polls of
+up to 10k open orders in which only a few orders moved.
+Usage: python benchmarks/order_feed.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from orders import OrderWatcher
+
+
+class ScriptedExchange:
+    """Orders by id, answering get_open_orders and get_order like AsyncSpot, and the executionReport of each change"""
+
+    def __init__(self):
+        self.orders = {}
+        self.calls = 0
+
+    def place(self, order_id, qty=1.0, price=100.0, symbol='BTCUSDT', side='BUY'):
+        self.orders[order_id] = {
+            'symbol': symbol, 'orderId': order_id, 'side': side, 'type': 'LIMIT',
+            'price': f"{price:.8f}", 'origQty': f"{qty:.8f}", 'executedQty': '0.00000000',
+            'cummulativeQuoteQty': '0.00000000', 'status': 'NEW', 'updateTime': 0,
+        }
+        return self.event(order_id, 'NEW')
+
+    def fill(self, order_id, qty, price):
+        order = self.orders[order_id]
+        executed = float(order['executedQty']) + qty
+        order['executedQty'] = f"{executed:.8f}"
+        order['cummulativeQuoteQty'] = f"{float(order['cummulativeQuoteQty']) + qty * price:.8f}"
+        order['status'] = 'FILLED' if executed >= float(order['origQty']) else 'PARTIALLY_FILLED'
+        return self.event(order_id, 'TRADE')
+
+    def cancel(self, order_id):
+        self.orders[order_id]['status'] = 'CANCELED'
+        return self.event(order_id, 'CANCELED')
+
+    def event(self, order_id, execution):
+        order = self.orders[order_id]
+        return {
+            'e': 'executionReport', 'E': 0, 's': order['symbol'], 'i': order_id, 'S': order['side'],
+            'o': order['type'], 'p': order['price'], 'q': order['origQty'], 'z': order['executedQty'],
+            'Z': order['cummulativeQuoteQty'], 'X': order['status'], 'x': execution,
+        }
+
+    async def get_open_orders(self):
+        self.calls += 1
+        return [dict(o) for o in self.orders.values() if o['status'] in ('NEW', 'PARTIALLY_FILLED')]
+
+    async def get_order(self, symbol, orderId):
+        self.calls += 1
+        return dict(self.orders[orderId])
+
+
+def summary(changes):
+    return [(c.kind, c.order['orderId'], round(c.filled, 8), round(c.price, 8)) for c in changes]
+
+
+async def check():
+    exchange = ScriptedExchange()
+    sent = []
+
+    async def notify(changes):
+        sent.extend(summary(changes))
+
+    watcher = OrderWatcher(exchange, notify)
+    exchange.place(1)
+    exchange.place(2, qty=2.0)
+
+    async def step(expected, *events, poll=False):
+        del sent[:]
+        for event in events:
+            watcher.on_event(event)
+        if poll:
+            await watcher.poll()
+        # Let the flush task run
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return sent == expected, list(sent), expected
+
+    steps = [
+        ("the first poll only primes", await step([], poll=True)),
+        ("a new order is not reported", await step([], exchange.place(3))),
+        ("partial fill from the stream", await step([('partial', 2, 0.5, 101.0)], exchange.fill(2, 0.5, 101.0))),
+        ("the same report twice", await step([], exchange.event(2, 'TRADE'))),
+        ("fill from the stream", await step([('filled', 2, 1.5, 99.0)], exchange.fill(2, 1.5, 99.0))),
+        ("a late duplicate of a fill", await step([], exchange.event(2, 'TRADE'))),
+        ("cancel from the stream", await step([('canceled', 3, 0.0, 100.0)], exchange.cancel(3))),
+    ]
+    # The stream is down, changes only show up in polls
+    exchange.place(4)
+    await watcher.poll()
+    exchange.fill(1, 0.25, 100.0)
+    exchange.fill(4, 1.0, 98.0)
+    steps.append(("partial fill and fill found by a poll",
+                  await step([('partial', 1, 0.25, 100.0), ('filled', 4, 1.0, 98.0)], poll=True)))
+    exchange.cancel(1)
+    steps.append(("cancel found by a poll", await step([('canceled', 1, 0.0, 100.0)], poll=True)))
+    steps.append(("a poll with nothing new", await step([], poll=True)))
+    # A reconnection resyncs with a REST snapshot
+    exchange.place(5)
+    await watcher.poll()
+    exchange.fill(5, 0.5, 97.0)
+    snapshot = {'e': 'openOrders', 'orders': await exchange.get_open_orders()}
+    steps.append(("partial fill while the stream was down", await step([('partial', 5, 0.5, 97.0)], snapshot)))
+
+    failed = 0
+    for name, (ok, got, expected) in steps:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}" + ("" if ok else f": got {got}, expected {expected}"))
+        failed += not ok
+    return failed
+
+
+async def timing():
+    print(f"{'open orders':>12s} {'changed':>8s} {'poll diff us':>13s} {'REST calls':>11s}")
+    for count in (100, 1000, 10000):
+        for changed in (0, 10):
+            exchange = ScriptedExchange()
+            for order_id in range(count):
+                exchange.place(order_id)
+            watcher = OrderWatcher(exchange, notify=None)
+            await watcher.poll()
+            for order_id in range(changed):
+                # Half fill partially and stay, half are canceled and leave
+                if order_id % 2:
+                    exchange.fill(order_id, 0.5, 100.0)
+                else:
+                    exchange.cancel(order_id)
+            open_orders = await exchange.get_open_orders()
+            exchange.calls = 0
+            start = time.perf_counter()
+            await watcher.sync(open_orders)
+            elapsed = time.perf_counter() - start
+            print(f"{count:12d} {changed:8d} {elapsed * 1e6:13.0f} {exchange.calls:11d}")
+
+
+def main():
+    failed = asyncio.run(check())
+    asyncio.run(timing())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
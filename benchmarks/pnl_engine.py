@@ -0,0 +1,153 @@
+"""
+P&L engine on synthetic trades: column load time and each cost basis method.
+Every method is first checked against hand-computed cases and a naive lot by
+lot reference on random trades, including sells of deposited coins never
+bought here. The script exits non-zero on a mismatch.
+Usage: python benchmarks/pnl_engine.py [trades]
+"""
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ledger import Trade
+from pnl import METHODS, TradeColumns, analyze
+
+
+class FakeMarkets:
+    def base_asset(self, symbol):
+        return symbol[:-4]
+
+    def quote_asset(self, symbol):
+        return symbol[-4:]
+
+
+class FakePrices:
+    def usd_price(self, asset):
+        return {'USDT': 1.0, 'USDC': 1.0, 'BNB': 600.0}.get(asset)
+
+
+def synthetic_trades(count):
+    rng = random.Random(1)
+    price = 30000.0
+    trades = []
+    for i in range(count):
+        price *= 1 + rng.uniform(-0.01, 0.01)
+        symbol = rng.choice(['BTCUSDT', 'BTCUSDC'])
+        trades.append(Trade.from_api(symbol, {
+            'id': i,
+            'time': 1600000000000 + i * 60000,
+            'isBuyer': rng.random() < 0.55,
+            'qty': f"{rng.uniform(0.001, 0.1):.6f}",
+            'price': f"{price:.2f}",
+            'commission': f"{rng.uniform(0.00001, 0.001):.8f}",
+            'commissionAsset': rng.choice(['BNB', 'USDT', 'BTC']),
+        }))
+    return trades
+
+
+# (trades as (is_buy, qty, price), current price, method -> (realized, cost basis, position, unrealized))
+HAND_CASES = [
+    ([(True, 1, 100), (True, 1, 200), (False, 1, 300)], 250, {
+        'fifo': (200, 200, 1, 50), 'lifo': (100, 100, 1, 150), 'average': (150, 150, 1, 100),
+    }),
+    # A deposited coin sold before any buy
+    ([(False, 1, 100), (True, 2, 50)], 60, dict.fromkeys(METHODS, (100, 100, 2, 20))),
+    ([(False, 1, 100), (True, 0.5, 50)], 60, dict.fromkeys(METHODS, (100, 25, 0.5, 5))),
+    # Sold one more than bought
+    ([(True, 2, 10), (False, 3, 20)], 30, dict.fromkeys(METHODS, (40, 0, 0, 0))),
+    ([(True, 1, 10), (False, 2, 20), (True, 3, 30), (False, 1, 40)], 60, {
+        'fifo': (40, 60, 2, 60), 'lifo': (40, 60, 2, 60), 'average': (40, 60, 2, 60),
+    }),
+]
+
+
+def columns_of(trades):
+    """Columns of (is_buy, qty, price) trades without fees, one second apart"""
+    qty = np.array([t[1] for t in trades], dtype=float)
+    return TradeColumns(
+        np.arange(len(trades), dtype=np.int64), np.array([t[0] for t in trades], dtype=bool),
+        qty, qty * np.array([t[2] for t in trades], dtype=float), np.zeros(len(trades))
+    )
+
+
+def reference(trades, current_price, method):
+    """Lot by lot: realized, cost basis, position and unrealized"""
+    lots = []
+    realized = 0.0
+    for is_buy, qty, price in trades:
+        if is_buy:
+            lots.append([qty, price])
+            continue
+        if method == 'average' and lots:
+            held = sum(q for q, _ in lots)
+            lots = [[held, sum(q * p for q, p in lots) / held]]
+        realized += qty * price
+        # What no lot covers was never bought here and costs nothing
+        while qty > 1e-12 and lots:
+            lot = lots[0] if method == 'fifo' else lots[-1]
+            used = min(qty, lot[0])
+            realized -= used * lot[1]
+            qty -= used
+            lot[0] -= used
+            if lot[0] <= 1e-12:
+                lots.remove(lot)
+    basis = sum(q * p for q, p in lots)
+    position = sum(q for q, _ in lots)
+    return realized, basis, position, position * current_price - basis
+
+
+def check():
+    failures = 0
+
+    def compare(name, got, expected):
+        nonlocal failures
+        if not np.allclose(got, expected, rtol=1e-9, atol=1e-6):
+            failures += 1
+            print(f"FAIL {name}: got {got}, expected {expected}")
+
+    for i, (trades, price, expected) in enumerate(HAND_CASES):
+        for method in METHODS:
+            r = analyze(columns_of(trades), price, method)
+            compare(f"case {i + 1} {method}", (r['realized'], r['cost_basis'], r['position'], r['unrealized']),
+                    expected[method])
+            compare(f"case {i + 1} {method} reference", reference(trades, price, method), expected[method])
+
+    rng = random.Random(2)
+    for i in range(500):
+        trades = [
+            (rng.random() < 0.5, round(rng.uniform(0.1, 3), 3), round(rng.uniform(1, 100), 2))
+            for _ in range(rng.randint(1, 40))
+        ]
+        for method in METHODS:
+            r = analyze(columns_of(trades), 50.0, method)
+            compare(f"random {i} {method}", (r['realized'], r['cost_basis'], r['position'], r['unrealized']),
+                    reference(trades, 50.0, method))
+    print(f"{len(HAND_CASES)} hand-computed cases and 500 random trade sequences: "
+          + ("ok" if not failures else f"{failures} mismatches"))
+    return failures
+
+
+def main():
+    if check():
+        sys.exit(1)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    trades = synthetic_trades(count)
+
+    start = time.perf_counter()
+    columns = TradeColumns.load(trades, FakeMarkets(), FakePrices())
+    print(f"load {count} trades: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for method in METHODS:
+        start = time.perf_counter()
+        result = analyze(columns, 31000.0, method)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{method:8s} {elapsed:8.1f} ms  realized {result['realized']:+.2f}  unrealized {result['unrealized']:+.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+WeightScheduler driven offline by a SimulatedClock, sleeping moves the clock
+forward at once. The script checks the weights of a few Spot methods, that
+interactive requests overtake background ones waiting for weight, that a
+Retry-After holds every request until it has passed, that the used-weight
+header corrects the bucket, and that a request heavier than the bucket still
+goes out once it is full.
+Usage: python benchmarks/scheduler.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ratelimit import BACKGROUND, INTERACTIVE, SimulatedClock, WeightScheduler, background, request_weight
+
+
+def scheduler(limit=60, interval=60):
+    """A scheduler refilling one weight per simulated second by default"""
+    clock = SimulatedClock()
+    return WeightScheduler(limit=limit, interval=interval, clock=clock), clock
+
+
+async def priority_order():
+    """Background requests queued first, interactive ones while they wait, on an empty bucket"""
+    limiter, clock = scheduler()
+    await limiter.acquire(60)
+    sent = []
+
+    async def request(name, priority):
+        await limiter.acquire(10, priority)
+        sent.append(name)
+
+    async def from_background(name):
+        with background():
+            await request(name, None)
+
+    # Tasks start in order, the first background request is already sleeping when the others queue
+    await asyncio.gather(
+        from_background("background 1"),
+        request("background 2", BACKGROUND),
+        request("interactive 1", INTERACTIVE),
+        request("interactive 2", INTERACTIVE),
+    )
+    expected = ["interactive 1", "interactive 2", "background 1", "background 2"]
+    # Four requests of 10 weight refilled at 1 per second
+    return sent == expected and clock.now == 40, f"sent {sent} at {clock.now} s"
+
+
+async def retry_after():
+    limiter, clock = scheduler()
+    clock.now = 100
+    limiter.retry_after(30)
+    # A shorter Retry-After does not cut the block short
+    limiter.retry_after(5)
+    await limiter.acquire(1)
+    return clock.now == 130 and limiter.tokens == 59, f"sent at {clock.now} s with {limiter.tokens} left"
+
+
+async def used_weight_header():
+    limiter, clock = scheduler()
+    await limiter.acquire(10)
+    # Other processes on the same IP used more than this one counted
+    limiter.observe({'x-mbx-used-weight-1m': '55'})
+    corrected = limiter.tokens == 5
+    await limiter.acquire(20)
+    waited = clock.now == 15
+    # A lower count never adds weight to the bucket
+    limiter.observe({'X-MBX-USED-WEIGHT-1M': '0'})
+    return corrected and waited and limiter.tokens == 0, f"tokens {limiter.tokens} at {clock.now} s"
+
+
+async def heavier_than_bucket():
+    limiter, clock = scheduler()
+    await limiter.acquire(30)
+    await asyncio.wait_for(limiter.acquire(request_weight("get_convert_trade_history", {})), 1)
+    return clock.now == 30 and limiter.tokens == 0, f"sent at {clock.now} s"
+
+
+def weights():
+    expected = {
+        ("account", ()): 20,
+        ("ticker_price", ()): 4,
+        ("ticker_price", ("symbol",)): 2,
+        ("get_open_orders", ()): 80,
+        ("deposit_history", ()): 1,
+        ("get_convert_trade_history", ()): 3000,
+    }
+    got = {(name, keys): request_weight(name, {key: "BTCUSDT" for key in keys}) for name, keys in expected}
+    return got == expected, f"got {got}"
+
+
+async def check():
+    results = [("request weights", weights())]
+    for name, scenario in [
+        ("interactive before background", priority_order),
+        ("Retry-After holds requests", retry_after),
+        ("used-weight header corrects the bucket", used_weight_header),
+        ("request heavier than the bucket", heavier_than_bucket),
+    ]:
+        results.append((name, await asyncio.wait_for(scenario(), 5)))
+
+    failed = 0
+    for name, (ok, detail) in results:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}" + ("" if ok else f": {detail}"))
+        failed += not ok
+    return failed
+
+
+def main():
+    sys.exit(1 if asyncio.run(check()) else 0)
+
+
+if __name__ == "__main__":
+    main()
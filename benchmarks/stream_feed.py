@@ -0,0 +1,158 @@
+"""
+StreamEngine against a local fake Binance WebSocket server and a scripted REST client.
+The fake serves the combined /stream endpoint with tornado, pushes scripted
+messages and can drop the connection. The script checks the resync on
+connect, miniTicker and outboundAccountPosition updates, the resync after a
+dropped connection, the reconnection with a new listenKey after
+listenKeyExpired, and stop().
+Usage: python benchmarks/stream_feed.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+import tornado.web
+import tornado.websocket
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from prices import Prices
+from stream import LiveState, StreamEngine
+from webhook import free_port
+
+# Seconds a scenario may take, reconnecting waits at least a second
+TIMEOUT = 10
+
+
+class FakeStreamServer:
+    """The combined stream endpoint, remembers the streams of every connection"""
+
+    def __init__(self):
+        self.connections = []
+        self.urls = []
+
+    def app(self):
+        server = self
+
+        class Stream(tornado.websocket.WebSocketHandler):
+            def open(self):
+                server.urls.append(self.request.uri)
+                server.connections.append(self)
+
+            def on_close(self):
+                if self in server.connections:
+                    server.connections.remove(self)
+
+        return tornado.web.Application([(r"/stream", Stream)])
+
+    def push(self, data, stream="stream"):
+        for connection in self.connections:
+            connection.write_message(json.dumps({'stream': stream, 'data': data}))
+
+    def drop(self):
+        for connection in list(self.connections):
+            connection.close()
+
+
+class ScriptedClient:
+    """REST answers of AsyncSpot for resync, changed by the scenarios"""
+
+    def __init__(self):
+        self.balances = {'BTC': '1.00000000', 'USDT': '500.00000000'}
+        self.tickers = {'BTCUSDT': '60000.00', 'ETHUSDT': '3000.00'}
+        self.listen_keys = []
+
+    async def account(self):
+        return {
+            'updateTime': int(time.time() * 1000),
+            'balances': [{'asset': a, 'free': f, 'locked': '0.00000000'} for a, f in self.balances.items()],
+        }
+
+    async def get_open_orders(self):
+        return []
+
+    async def ticker_price(self):
+        return [{'symbol': s, 'price': p} for s, p in self.tickers.items()]
+
+    async def new_listen_key(self):
+        self.listen_keys.append(f"key{len(self.listen_keys) + 1}")
+        return {'listenKey': self.listen_keys[-1]}
+
+    async def renew_listen_key(self, listen_key):
+        return {}
+
+
+class StaticMarkets:
+    async def refresh(self):
+        return self
+
+
+async def wait_until(predicate):
+    deadline = time.perf_counter() + TIMEOUT
+    while not predicate():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+async def check():
+    port = free_port()
+    fake = FakeStreamServer()
+    server = fake.app().listen(port, "127.0.0.1")
+    client = ScriptedClient()
+    state = LiveState(Prices(client, StaticMarkets()))
+    engine = StreamEngine(client, state, stream_url=f"ws://127.0.0.1:{port}", tickers=True)
+    results = []
+
+    def result(name, ok, detail=""):
+        results.append(ok)
+        print(f"{'ok  ' if ok else 'FAIL'} {name}" + ("" if ok else f": {detail}"))
+
+    engine.start()
+    try:
+        await wait_until(lambda: state.live and fake.connections)
+        result("connect and resync", state.live and state.balances.get('BTC') == ('1.00000000', '0.00000000')
+               and state.prices.price('ETHUSDT') == 3000.0, state.balances)
+        result("miniTicker and listenKey streams", fake.urls[-1] == "/stream?streams=!miniTicker@arr/key1", fake.urls)
+
+        fake.push([{'e': '24hrMiniTicker', 's': 'BTCUSDT', 'c': '61000.00'}])
+        ok = await wait_until(lambda: state.prices.price('BTCUSDT') == 61000.0)
+        result("miniTicker price update", ok, state.prices.price('BTCUSDT'))
+
+        fake.push({'e': 'outboundAccountPosition', 'u': 1700000000123, 'B': [
+            {'a': 'BTC', 'f': '1.50000000', 'l': '0.10000000'},
+            {'a': 'USDT', 'f': '0.00000000', 'l': '0.00000000'},
+        ]})
+        ok = await wait_until(lambda: 'USDT' not in state.balances)
+        result("outboundAccountPosition balances", ok and state.balances == {'BTC': ('1.50000000', '0.10000000')}
+               and state.update_time == 1700000000123, state.balances)
+
+        # Changes made while the connection is down only show up through the resync
+        client.balances = {'BTC': '2.00000000'}
+        client.tickers['BTCUSDT'] = '62000.00'
+        fake.drop()
+        ok = await wait_until(lambda: not state.live)
+        ok = ok and await wait_until(lambda: state.live and fake.connections)
+        result("dropped connection resyncs", ok and state.balances == {'BTC': ('2.00000000', '0.00000000')}
+               and state.prices.price('BTCUSDT') == 62000.0, state.balances)
+
+        fake.push({'e': 'listenKeyExpired', 'E': 1700000000456})
+        ok = await wait_until(lambda: len(client.listen_keys) == 3 and state.live and fake.connections)
+        result("listenKeyExpired reconnects with a new key", ok and fake.urls[-1].endswith("/key3"), fake.urls)
+    finally:
+        start = time.perf_counter()
+        await asyncio.wait_for(engine.stop(), TIMEOUT)
+        result("stop", not state.live and time.perf_counter() - start < 1, f"{time.perf_counter() - start:.2f} s")
+        server.stop()
+    return results.count(False)
+
+
+def main():
+    sys.exit(1 if asyncio.run(check()) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Memory of trades kept as raw my_trades dicts vs ledger Trade objects.
+Usage: python benchmarks/trade_memory.py [trades]
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ledger import Trade
+
+
+def raw_trade(i):
+    """A my_trades item as decoded from the JSON response"""
+    return {
+        'symbol': 'BTCUSDT',
+        'id': 100000000 + i,
+        'orderId': 200000000 + i,
+        'orderListId': -1,
+        'price': f"{30000 + i % 1000:.8f}",
+        'qty': f"{0.001 + i % 100 / 1000:.8f}",
+        'quoteQty': f"{(30000 + i % 1000) * (0.001 + i % 100 / 1000):.8f}",
+        'commission': f"{0.00001 * (i % 7):.8f}",
+        'commissionAsset': 'BNB',
+        'time': 1600000000000 + i * 1000,
+        'isBuyer': i % 2 == 0,
+        'isMaker': i % 3 == 0,
+        'isBestMatch': True,
+    }
+
+
+def measure(build, count):
+    tracemalloc.start()
+    items = [build(i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    raw = measure(raw_trade, count)
+    # The raw dicts are built and dropped inside the measured block, so only Trade objects stay
+    compact = measure(lambda i: Trade.from_api('BTCUSDT', raw_trade(i)), count)
+    print(f"raw dicts:     {raw / count * 100_000 / 2**20:6.1f} MiB per 100k trades")
+    print(f"Trade objects: {compact / count * 100_000 / 2**20:6.1f} MiB per 100k trades")
+
+
+if __name__ == "__main__":
+    main()
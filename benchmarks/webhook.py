@@ -0,0 +1,307 @@
+"""
+Update throughput of polling and of the webhook, against a local fake Telegram.
+The fake Bot API runs in its own process and answers getUpdates, setWebhook
+and sendMessage. Its sender pushes a burst of /start commands mixed with
+update types no handler uses, either into the getUpdates queue or as POSTs to
+the webhook of the bot, and times every reply.
+Usage: python benchmarks/webhook.py [updates] [noise_fraction]
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+import tornado.httpclient
+import tornado.web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+TOKEN = "1:fake"
+
+# Parallel webhook requests, the max_connections default of setWebhook
+WEBHOOK_CONNECTIONS = 40
+
+# Updates of types the bot has no handler for
+NOISE_TYPES = ["edited_message", "message_reaction", "chat_member", "my_chat_member"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def command_update(update_id, text='/start'):
+    chat = {'id': 1000 + update_id, 'type': 'private'}
+    command = text.split()[0]
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': int(time.time()), 'chat': chat,
+        'from': {'id': 1000 + update_id, 'is_bot': False, 'first_name': 'user'},
+        'text': text, 'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+    }}
+
+
+def noise_update(update_id, kind):
+    chat = {'id': 1000 + update_id, 'type': 'group', 'title': 'group'}
+    user = {'id': 1000 + update_id, 'is_bot': False, 'first_name': 'user'}
+    if kind == "edited_message":
+        body = {'message_id': update_id, 'date': int(time.time()), 'edit_date': int(time.time()),
+                'chat': chat, 'from': user, 'text': 'edited'}
+    elif kind == "message_reaction":
+        body = {'chat': chat, 'message_id': update_id, 'user': user, 'date': int(time.time()),
+                'old_reaction': [], 'new_reaction': [{'type': 'emoji', 'emoji': '👍'}]}
+    else:
+        body = {'chat': chat, 'from': user, 'date': int(time.time()),
+                'old_chat_member': {'status': 'left', 'user': user},
+                'new_chat_member': {'status': 'member', 'user': user}}
+    return {'update_id': update_id, kind: body}
+
+
+def update_type(update):
+    return next(key for key in update if key != 'update_id')
+
+
+class FakeTelegram:
+    """
+    Bot API methods the benchmark needs, updates are filtered by allowed_updates
+    like Telegram does. The /control methods start a burst and report on it.
+    """
+
+    def __init__(self, updates):
+        self.updates = updates
+        self.commands = sum(1 for u in updates if 'message' in u)
+        self.reset()
+
+    def reset(self):
+        self.pending = []
+        self.allowed = None
+        self.webhook = None
+        self.sent = {}
+        self.replies = {}
+        self.delivered = 0
+        self.forged_status = None
+        self._arrived = asyncio.Event()
+        self._replied = asyncio.Event()
+
+    def app(self):
+        fake = self
+
+        class Method(tornado.web.RequestHandler):
+            async def post(self, token, method):
+                params = {}
+                for key, values in self.request.body_arguments.items():
+                    value = values[0].decode()
+                    try:
+                        params[key] = json.loads(value)
+                    except ValueError:
+                        params[key] = value
+                if self.request.headers.get("Content-Type", "").startswith("application/json"):
+                    params.update(json.loads(self.request.body or b"{}"))
+                result = await getattr(fake, method)(**params)
+                self.write({'ok': True, 'result': result})
+
+        class Control(tornado.web.RequestHandler):
+            async def post(self, method):
+                self.write({'result': await getattr(fake, "control_" + method)()})
+
+        return tornado.web.Application([(r"/bot([^/]+)/(\w+)", Method), (r"/control/(\w+)", Control)])
+
+    async def control_reset(self):
+        # Answer the long poll a stopped updater left behind
+        self._arrived.set()
+        self.reset()
+
+    async def control_send(self):
+        """Start the burst, into the getUpdates queue or to the webhook"""
+        if self.webhook:
+            asyncio.get_running_loop().create_task(self._post_webhook())
+        else:
+            now = time.perf_counter()
+            for update in self.updates:
+                self.sent[update['update_id']] = now
+            self.pending += [u for u in self.updates if self._allowed(u)]
+            self._arrived.set()
+        self.start = time.perf_counter()
+
+    async def control_results(self, timeout=120):
+        deadline = time.perf_counter() + timeout
+        while len(self.replies) < self.commands and time.perf_counter() < deadline:
+            self._replied.clear()
+            try:
+                await asyncio.wait_for(self._replied.wait(), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                break
+        latencies = sorted(self.replies.values())
+        return {
+            'elapsed': max(self.replies_at) - self.start if self.replies else timeout,
+            'delivered': self.delivered,
+            'replies': len(self.replies),
+            'p50': statistics.median(latencies),
+            'p99': latencies[int(len(latencies) * 0.99) - 1],
+            'forged_status': self.forged_status,
+        }
+
+    @property
+    def replies_at(self):
+        return [self.sent[update_id] + latency for update_id, latency in self.replies.items()]
+
+    async def _post_webhook(self):
+        url, secret = self.webhook
+        # Telegram keeps up to max_connections requests in flight
+        client = tornado.httpclient.AsyncHTTPClient(max_clients=WEBHOOK_CONNECTIONS)
+
+        async def post(update, token=secret):
+            if token == secret:
+                self.sent[update['update_id']] = time.perf_counter()
+            return await client.fetch(
+                url, method="POST", body=json.dumps(update), raise_error=False,
+                headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": token}
+            )
+
+        responses = await asyncio.gather(*(post(u) for u in self.updates if self._allowed(u)))
+        self.delivered = sum(1 for r in responses if r.code == 200)
+        # An update without the secret of setWebhook must be refused
+        self.forged_status = (await post(self.updates[0], "wrong")).code
+
+    def _allowed(self, update):
+        # No allowed_updates means every type
+        return not self.allowed or update_type(update) in self.allowed
+
+    async def getMe(self, **params):
+        return {'id': 1, 'is_bot': True, 'first_name': 'bot', 'username': 'bot'}
+
+    async def deleteWebhook(self, **params):
+        self.webhook = None
+        return True
+
+    async def setWebhook(self, url, secret_token=None, allowed_updates=None, **params):
+        self.webhook = (url, secret_token)
+        self.allowed = allowed_updates
+        return True
+
+    async def getUpdates(self, offset=0, limit=100, timeout=0, allowed_updates=None, **params):
+        self.allowed = allowed_updates
+        self.pending = [u for u in self.pending if u['update_id'] >= int(offset) and self._allowed(u)]
+        if not self.pending and int(timeout):
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), int(timeout))
+            except asyncio.TimeoutError:
+                pass
+        batch = self.pending[:int(limit)]
+        self.delivered += len(batch)
+        return batch
+
+    async def sendMessage(self, chat_id, text, **params):
+        update_id = int(chat_id) - 1000
+        self.replies[update_id] = time.perf_counter() - self.sent[update_id]
+        self._replied.set()
+        return {'message_id': update_id, 'date': int(time.time()),
+                'chat': {'id': int(chat_id), 'type': 'private'}, 'text': text}
+
+
+def serve_fake(port, updates):
+    async def serve():
+        FakeTelegram(updates).app().listen(port, "127.0.0.1")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+async def control(port, method):
+    async with httpx.AsyncClient(timeout=180) as client:
+        response = await client.post(f"http://127.0.0.1:{port}/control/{method}")
+        return response.json()['result']
+
+
+async def run(mode, port):
+    import application
+    from telegram import Update
+
+    await control(port, "reset")
+    app = application.build_application()
+    async with app:
+        await app.start()
+        try:
+            if mode == "webhook":
+                await app.updater.start_webhook(**application.webhook_options())
+            else:
+                allowed = Update.ALL_TYPES if mode == "polling, all types" else application.ALLOWED_UPDATES
+                await app.updater.start_polling(poll_interval=0, timeout=10, allowed_updates=allowed)
+                # The first getUpdates tells the fake which types to keep
+                await asyncio.sleep(0.2)
+            cpu = time.process_time()
+            await control(port, "send")
+            results = await control(port, "results")
+            cpu = time.process_time() - cpu
+        finally:
+            if app.updater.running:
+                await app.updater.stop()
+            await app.stop()
+
+    print(f"{mode:20s} {results['replies'] / results['elapsed']:9.0f} {results['delivered']:10d} "
+          f"{results['replies']:8d} {results['p50'] * 1000:9.1f} {results['p99'] * 1000:9.1f} "
+          f"{cpu / results['replies'] * 1000:12.2f}")
+    if mode == "webhook":
+        print(f"webhook update with a wrong secret token: HTTP {results['forged_status']}")
+
+
+def wait_for_port(port):
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    noise = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    rng = random.Random(1)
+    updates = [
+        noise_update(i, rng.choice(NOISE_TYPES)) if rng.random() < noise else command_update(i)
+        for i in range(1, count + 1)
+    ]
+    commands = sum(1 for u in updates if 'message' in u)
+
+    api_port = free_port()
+    webhook_port = free_port()
+    fake = multiprocessing.get_context("spawn").Process(target=serve_fake, args=(api_port, updates), daemon=True)
+    fake.start()
+    wait_for_port(api_port)
+
+    directory = tempfile.mkdtemp()
+    os.environ.update({
+        'telegram_bot_token': TOKEN,
+        'telegram_api_url': f"http://127.0.0.1:{api_port}/bot",
+        'telegram_webhook_url': f"http://127.0.0.1:{webhook_port}/telegram",
+        'telegram_webhook_port': str(webhook_port),
+        'binance_streams': '0',
+        'ledger_path': ':memory:',
+        'alerts_path': ':memory:',
+        'accounts_path': ':memory:',
+        'exchange_info_path': os.path.join(directory, 'exchange_info.json'),
+        'history_path': os.path.join(directory, 'history'),
+        'warm_state_path': os.path.join(directory, 'warm_state.json'),
+        'accounts_dir': os.path.join(directory, 'accounts'),
+    })
+
+    print(f"{count} updates, {commands} /start commands, {count - commands} updates of unused types")
+    print(f"{'mode':20s} {'cmds/s':>9s} {'delivered':>10s} {'replies':>8s} {'p50 ms':>9s} {'p99 ms':>9s} {'bot CPU ms':>12s}")
+    try:
+        for mode in ("polling, all types", "polling", "webhook"):
+            asyncio.run(run(mode, api_port))
+    finally:
+        fake.terminate()
+
+
+if __name__ == "__main__":
+    main()
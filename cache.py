@@ -0,0 +1,74 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    TTL and LRU cache of coroutine results.
+    Concurrent requests for a key that is being computed wait for the same
+    in-flight future instead of starting their own Binance calls.
+    """
+
+    def __init__(self, ttl=5, max_entries=256, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    async def get(self, key, compute):
+        """Cached value of key, otherwise the result of awaiting compute()"""
+        entry = self._entries.get(key)
+        if entry is not None and self.clock() - entry[0] < self.ttl:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Waiters re-raise it, nobody waiting is fine too
+                future.exception()
+            else:
+                future.cancel()
+            raise
+        finally:
+            del self._inflight[key]
+
+        future.set_result(value)
+        self._entries[key] = (self.clock(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        requests = self.hits + self.misses + self.coalesced
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_ratio': (self.hits + self.coalesced) / requests if requests else 0.0,
+        }
@@ -0,0 +1,124 @@
+import asyncio
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from cache import ResponseCache
+from config import CHART_CACHE_SIZE, CHART_WORKERS
+
+# Slices of the allocation chart, smaller assets are merged into "Other"
+MAX_SLICES = 8
+
+FIGURE_SIZE = (8, 4.5)
+
+
+def new_figure():
+    # Imported in the worker processes only, the bot itself never loads matplotlib
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+    return Figure(figsize=FIGURE_SIZE, dpi=100)
+
+
+def png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def value_chart(title, times, values):
+    fig = new_figure()
+    ax = fig.subplots()
+    ax.plot([datetime.fromtimestamp(t) for t in times.tolist()], values, linewidth=1.5)
+    ax.set_title(title)
+    ax.set_ylabel("USD")
+    ax.grid(alpha=0.3)
+    fig.autofmt_xdate()
+    return png(fig)
+
+
+def allocation_chart(title, labels, values):
+    pairs = sorted(zip(values, labels), reverse=True)
+    if len(pairs) > MAX_SLICES:
+        other = sum(value for value, _ in pairs[MAX_SLICES - 1:])
+        pairs = pairs[:MAX_SLICES - 1] + [(other, "Other")]
+    fig = new_figure()
+    ax = fig.subplots()
+    ax.pie([value for value, _ in pairs], labels=[label for _, label in pairs], autopct="%1.1f%%", startangle=90)
+    ax.set_title(title)
+    ax.axis("equal")
+    return png(fig)
+
+
+def pnl_chart(title, times, realized):
+    fig = new_figure()
+    ax = fig.subplots()
+    ax.step([datetime.fromtimestamp(t / 1000) for t in times.tolist()], realized, where="post", linewidth=1.5)
+    ax.axhline(0, color="grey", linewidth=0.8)
+    ax.set_title(title)
+    ax.set_ylabel("Realized P&L (USD)")
+    ax.grid(alpha=0.3)
+    fig.autofmt_xdate()
+    return png(fig)
+
+
+CHARTS = {
+    'value': value_chart,
+    'allocation': allocation_chart,
+    'pnl': pnl_chart,
+}
+
+
+def draw(kind, *args):
+    """PNG bytes of one chart, runs in a worker process"""
+    return CHARTS[kind](*args)
+
+
+def warm_up():
+    new_figure()
+
+
+class ChartRenderer:
+    """
+    Renders charts in a process pool so drawing never blocks the bot loop.
+    PNGs are cached by a key that must include the version of the data,
+    so the same chart of the same data is drawn once.
+    """
+
+    def __init__(self, workers=None, max_entries=None):
+        self.workers = workers or CHART_WORKERS
+        max_entries = max_entries or CHART_CACHE_SIZE
+        # Entries never expire, a new data version is a new key
+        self.cache = ResponseCache(ttl=float("inf"), max_entries=max_entries)
+        self._pool = None
+
+    def start(self):
+        """Start the workers, forked when the process has no other thread yet"""
+        if self._pool is not None:
+            return
+        # Forked workers do not import application.py again like spawned ones would, but a fork
+        # taken while another thread runs may copy a lock that thread held
+        method = "fork" if threading.active_count() == 1 else "forkserver"
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+        # The first task starts every worker
+        self._pool.submit(int)
+
+    def warm_up(self):
+        """Load matplotlib in the workers now rather than on the first chart"""
+        self.start()
+        for _ in range(self.workers):
+            self._pool.submit(warm_up)
+
+    async def render(self, key, kind, *args):
+        return await self.cache.get(key, lambda: self._draw(kind, args))
+
+    async def _draw(self, kind, args):
+        self.start()
+        return await asyncio.get_running_loop().run_in_executor(self._pool, draw, kind, *args)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
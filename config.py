@@ -0,0 +1,66 @@
+"""
+Settings of the bot, read from environment variables.
+Nothing here needs the Telegram or Binance libraries, so the command line
+tools and the benchmarks can read the settings without loading them.
+"""
+import os
+import secrets
+
+# Your keys, the default account used by the admins
+BINANCE_API_KEY = os.environ.get("binance_api_key")
+BINANCE_API_SECRET = os.environ.get("binance_api_secret")
+# Only the bot itself needs it, not backfill or add-account
+TELEGRAM_BOT_TOKEN = os.environ.get("telegram_bot_token")
+# A local Bot API server, e.g. http://localhost:8081/bot
+TELEGRAM_API_URL = os.environ.get("telegram_api_url")
+
+# Public HTTPS URL Telegram posts updates to, the bot polls when it is not set
+TELEGRAM_WEBHOOK_URL = os.environ.get("telegram_webhook_url")
+# Address of the webhook server, usually behind a reverse proxy terminating TLS
+TELEGRAM_WEBHOOK_LISTEN = os.environ.get("telegram_webhook_listen", "127.0.0.1")
+TELEGRAM_WEBHOOK_PORT = int(os.environ.get("telegram_webhook_port", "8443"))
+# Sent by Telegram with every update, a new random one on every start when not set
+TELEGRAM_WEBHOOK_SECRET = os.environ.get("telegram_webhook_secret") or secrets.token_urlsafe(32)
+
+# Telegram users allowed to bind users to accounts
+ADMIN_USER_IDS = {int(user_id) for user_id in os.environ.get("admin_user_ids", "").split(",") if user_id.strip()}
+ACCOUNTS_DIR = os.environ.get("accounts_dir", "accounts")
+# Team account keys and user bindings, the keys encrypted under accounts_secret
+ACCOUNTS_PATH = os.environ.get("accounts_path", "accounts.db")
+ACCOUNTS_SECRET = os.environ.get("accounts_secret")
+
+# Files of the default account, team accounts keep theirs under accounts_dir
+LEDGER_PATH = os.environ.get("ledger_path", "trades.db")
+HISTORY_PATH = os.environ.get("history_path", "history")
+ALERTS_PATH = os.environ.get("alerts_path", "alerts.db")
+# Prices and portfolio snapshots restored on start when younger than warm_state_max_age seconds
+WARM_STATE_PATH = os.environ.get("warm_state_path", "warm_state.json")
+WARM_STATE_MAX_AGE = float(os.environ.get("warm_state_max_age", "86400"))
+EXCHANGE_INFO_PATH = os.environ.get("exchange_info_path", "exchange_info.json")
+EXCHANGE_INFO_TTL = int(os.environ.get("exchange_info_ttl", "3600"))
+PRICE_TTL = float(os.environ.get("price_ttl", "10"))
+
+CHART_WORKERS = int(os.environ.get("chart_workers", "2"))
+CHART_CACHE_SIZE = int(os.environ.get("chart_cache_size", "64"))
+
+# Binance REST endpoint, the binance-connector default when not set
+BINANCE_API_URL = os.environ.get("binance_api_url")
+BINANCE_MAX_CONCURRENCY = int(os.environ.get("binance_max_concurrency", "8"))
+BINANCE_THREADS = int(os.environ.get("binance_threads", "32"))
+BINANCE_WEIGHT_LIMIT = int(os.environ.get("binance_weight_limit", "6000"))
+# Weight one account may use per minute, half of the IP limit so a busy account leaves room for the others
+BINANCE_ACCOUNT_WEIGHT_LIMIT = int(os.environ.get("binance_account_weight_limit", str(BINANCE_WEIGHT_LIMIT // 2)))
+BINANCE_STREAMS = os.environ.get("binance_streams", "1") == "1"
+# Binance websocket endpoint, stream.STREAM_URL when not set
+BINANCE_STREAM_URL = os.environ.get("binance_stream_url")
+RESPONSE_CACHE_TTL = float(os.environ.get("response_cache_ttl", "5"))
+RESPONSE_CACHE_SIZE = int(os.environ.get("response_cache_size", "256"))
+PORTFOLIO_INTERVAL = float(os.environ.get("portfolio_interval", "30"))
+# Oldest portfolio snapshot a command shows while a fresh one is computed
+PORTFOLIO_MAX_STALE = float(os.environ.get("portfolio_max_stale", "900"))
+ALERT_POLL_INTERVAL = float(os.environ.get("alert_poll_interval", "15"))
+MAX_ALERTS_PER_CHAT = int(os.environ.get("max_alerts_per_chat", "50"))
+# Seconds between open order polls of the accounts no stream follows, 0 turns them off
+ORDER_POLL_INTERVAL = float(os.environ.get("order_poll_interval", "30"))
+# Port of the Prometheus metrics endpoint, 0 keeps it off
+METRICS_PORT = int(os.environ.get("metrics_port", "0"))
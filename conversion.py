@@ -0,0 +1,135 @@
+import numpy as np
+
+# Bridges preferred when several paths are as short, the most liquid first
+PREFERRED_BRIDGES = ['USDT', 'USDC', 'FDUSD', 'BTC', 'ETH', 'BNB', 'EUR']
+
+# Longest path, in pairs
+MAX_HOPS = 4
+
+# Lists of assets whose gathered prices are kept per path table
+MAX_GATHERS = 1024
+
+ONE = np.ones(1)
+
+
+class ConversionGraph:
+    """
+    Assets linked by every trading pair with a price, to value any asset in
+    any currency through the shortest path of pairs.
+    Paths only change with exchange_info or the set of priced symbols, so the
+    path table of a target is built once: for every asset the symbols to
+    multiply or divide by. The prices a list of assets reads are then indexed
+    once as well, valuing it again is one gather of those prices and one
+    product per asset, whatever the snapshot.
+    The priced symbols are compared when a new prices dict comes in, a dict
+    changed in place is only checked for new symbols (Prices.update never
+    removes any).
+    """
+
+    def __init__(self, markets):
+        self.markets = markets
+        self.assets = {}
+        self.symbols = []
+        self._key = None
+        self._prices = None
+        self._size = 0
+        self._adjacent = {}
+        self._paths = {}
+        self._gathers = {}
+
+    def rates(self, prices, assets, target):
+        """Rates in target of assets, NaN without a path"""
+        self._build(prices)
+        key = (target, tuple(assets))
+        gather = self._gathers.get(key)
+        if gather is None:
+            if len(self._gathers) >= MAX_GATHERS:
+                self._gathers.clear()
+            gather = self._gathers[key] = self._gather(key[1], target)
+        names, positions, fixed, known = gather
+        vector = np.array([prices.get(name, np.nan) for name in names])
+        vector[vector <= 0] = np.nan
+        # Each price once as read from the base and once inverted, then the padding of short paths
+        with np.errstate(divide='ignore'):
+            hops = np.concatenate((vector, 1 / vector, ONE))[positions]
+        return np.where(fixed, known, hops.prod(axis=0))
+
+    def _build(self, prices):
+        if prices is self._prices and len(prices) == self._size and self._key[0] == self.markets.updated:
+            return
+        key = (self.markets.updated, frozenset(prices))
+        self._prices, self._size = prices, len(prices)
+        if key == self._key:
+            return
+        self._key = key
+        self.symbols = []
+        self.assets = {}
+        adjacent = {}
+        for name, s in self.markets.symbols.items():
+            if s.get('status', 'TRADING') != 'TRADING' or not prices.get(name):
+                continue
+            index = len(self.symbols)
+            self.symbols.append(name)
+            # From the base, the price converts to the quote, from the quote its inverse
+            adjacent.setdefault(s['base'], []).append((s['quote'], index, False))
+            adjacent.setdefault(s['quote'], []).append((s['base'], index, True))
+        for asset in adjacent:
+            self.assets[asset] = len(self.assets)
+        self._adjacent = adjacent
+        self._paths = {}
+        self._gathers = {}
+
+    def _gather(self, assets, target):
+        """Symbols read to value assets in target, positions of every hop among their prices, rates known up front"""
+        quotes = np.array([asset == target for asset in assets], dtype=bool)
+        # One quote is worth one quote, even when it has no pair
+        known = np.where(quotes, 1.0, np.nan)
+        if target not in self.assets:
+            return [], np.zeros((MAX_HOPS, len(assets)), dtype=np.intp), np.ones(len(assets), dtype=bool), known
+        missing = len(self.assets)
+        columns = np.array([self.assets.get(a, missing) for a in assets], dtype=np.intp)
+        symbols, inverted, reachable = self._path_table(target)
+        symbols, inverted = symbols[:, columns], inverted[:, columns]
+        # Only the prices on these paths are read, the last slot pads paths shorter than MAX_HOPS
+        used, positions = np.unique(symbols, return_inverse=True)
+        names = [self.symbols[i] for i in used.tolist() if i < len(self.symbols)]
+        positions = np.where(inverted, positions.reshape(symbols.shape) + len(names), positions.reshape(symbols.shape))
+        positions[symbols == len(self.symbols)] = 2 * len(names)
+        return names, positions, quotes | ~reachable[columns], known
+
+    def _path_table(self, target):
+        """Symbols and directions of the path from every asset to target, one row per hop"""
+        table = self._paths.get(target)
+        if table is not None:
+            return table
+        # One more column for assets without any pair
+        count = len(self.assets) + 1
+        symbols = np.full((MAX_HOPS, count), len(self.symbols), dtype=np.intp)
+        inverted = np.zeros((MAX_HOPS, count), dtype=bool)
+        reachable = np.zeros(count, dtype=bool)
+
+        def rank(asset):
+            return (PREFERRED_BRIDGES.index(asset) if asset in PREFERRED_BRIDGES else len(PREFERRED_BRIDGES), asset)
+
+        # Breadth first from target, a frontier expanding preferred bridges first
+        paths = {target: []}
+        frontier = [target]
+        for _ in range(MAX_HOPS):
+            reached = []
+            for asset in sorted(frontier, key=rank):
+                for neighbour, symbol, from_quote in self._adjacent.get(asset, ()):
+                    if neighbour in paths:
+                        continue
+                    # Seen from the neighbour, converting towards asset
+                    paths[neighbour] = [(symbol, not from_quote)] + paths[asset]
+                    reached.append(neighbour)
+            frontier = reached
+        for asset, path in paths.items():
+            column = self.assets[asset]
+            reachable[column] = True
+            for hop, (symbol, invert) in enumerate(path):
+                symbols[hop, column] = symbol
+                inverted[hop, column] = invert
+        table = symbols, inverted, reachable
+        self._paths[target] = table
+        return table
@@ -0,0 +1,198 @@
+import json
+import os
+
+import numpy as np
+
+from config import HISTORY_PATH
+
+TOTAL_DTYPE = np.dtype([('time', '<i8'), ('value', '<f8')])
+ASSET_DTYPE = np.dtype([('time', '<i8'), ('asset', '<u4'), ('value', '<f8')])
+
+# name, seconds per point, seconds kept (None keeps everything)
+TIERS = (
+    ('1m', 60, 7 * 86400),
+    ('1h', 3600, 90 * 86400),
+    ('1d', 86400, None),
+)
+
+# A tier file is rewritten without its expired points once it holds this
+# many times its retention, so compaction is rare and the size stays bounded
+COMPACT_FACTOR = 2
+
+
+class Tier:
+    """Append-only total and per-asset files of one resolution"""
+
+    def __init__(self, directory, name, resolution, retention):
+        self.name = name
+        self.resolution = resolution
+        self.retention = retention
+        self.total_path = os.path.join(directory, f"{name}.total")
+        self.asset_path = os.path.join(directory, f"{name}.assets")
+        self._total_file = open_for_append(self.total_path, TOTAL_DTYPE)
+        self._asset_file = open_for_append(self.asset_path, ASSET_DTYPE)
+        self.last = self._read_last()
+        totals = self.totals()
+        self.first = int(totals['time'][0]) if len(totals) else None
+
+    def append(self, time, total, assets):
+        self._total_file.write(np.array([(time, total)], dtype=TOTAL_DTYPE).tobytes())
+        self._asset_file.write(np.array(
+            [(time, asset, value) for asset, value in assets.items()], dtype=ASSET_DTYPE
+        ).tobytes())
+        # Readers map the files, so every point must be on disk before they look
+        self._total_file.flush()
+        self._asset_file.flush()
+        self.last = (time, total, assets)
+        if self.first is None:
+            self.first = time
+
+        if self.retention is not None and time - self.first > COMPACT_FACTOR * self.retention:
+            self.compact(time - self.retention)
+
+    def totals(self):
+        return read(self.total_path, TOTAL_DTYPE)
+
+    def assets(self):
+        return read(self.asset_path, ASSET_DTYPE)
+
+    def compact(self, start):
+        """Rewrite the files without the points older than start"""
+        for path, points, handle in (
+            (self.total_path, self.totals(), '_total_file'),
+            (self.asset_path, self.assets(), '_asset_file'),
+        ):
+            kept = np.array(points[np.searchsorted(points['time'], start):])
+            getattr(self, handle).close()
+            tmp_path = path + ".tmp"
+            kept.tofile(tmp_path)
+            os.replace(tmp_path, path)
+            setattr(self, handle, open(path, "ab"))
+        totals = self.totals()
+        self.first = int(totals['time'][0]) if len(totals) else None
+
+    def close(self):
+        self._total_file.close()
+        self._asset_file.close()
+
+    def _read_last(self):
+        totals = self.totals()
+        if not len(totals):
+            return None
+        time, total = int(totals['time'][-1]), float(totals['value'][-1])
+        points = self.assets()
+        points = points[np.searchsorted(points['time'], time):]
+        return time, total, {int(p['asset']): float(p['value']) for p in points}
+
+
+def open_for_append(path, dtype):
+    """Open a tier file for appending, after cutting a record that a crash left half written"""
+    f = open(path, "ab")
+    size = f.tell()
+    if size % dtype.itemsize:
+        f.truncate(size - size % dtype.itemsize)
+    return f
+
+
+def read(path, dtype):
+    """Points of a tier file mapped in memory, an interrupted last write is ignored"""
+    try:
+        count = os.path.getsize(path) // dtype.itemsize
+    except OSError:
+        count = 0
+    if not count:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+class History:
+    """
+    Time series of the portfolio value and of the value of each asset, in
+    files of fixed size records that are only appended to.
+    Points are recorded at most once a minute. When a point starts a new hour
+    the last point of the previous hour is copied to the hourly tier, and the
+    same for days, so old ranges are read from the coarser tiers and the
+    minute and hour files are cut to their retention.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or HISTORY_PATH
+        os.makedirs(self.path, exist_ok=True)
+        self._assets_path = os.path.join(self.path, "assets.json")
+        try:
+            with open(self._assets_path) as f:
+                self.asset_names = json.load(f)
+        except (OSError, ValueError):
+            self.asset_names = []
+        self.asset_ids = {name: i for i, name in enumerate(self.asset_names)}
+        self.tiers = [Tier(self.path, *tier) for tier in TIERS]
+
+    def record(self, time, total, assets):
+        """
+        Record the total USD value and the USD value of each asset at time
+        (unix seconds), returns False when the minute already has a point
+        """
+        time = int(time)
+        last = self.tiers[0].last
+        if last is not None and time // self.tiers[0].resolution <= last[0] // self.tiers[0].resolution:
+            return False
+        self._append(0, time, total, {self._asset_id(name): value for name, value in assets.items()})
+        return True
+
+    def range(self, start, end, asset=None):
+        """
+        Times and values between start and end from the finest tier that
+        still covers start, of the total or of one asset
+        """
+        tier = self.tier_for(start)
+        if asset is None:
+            points = tier.totals()
+        else:
+            if asset not in self.asset_ids:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            points = tier.assets()
+
+        times = points['time']
+        points = points[np.searchsorted(times, start):np.searchsorted(times, end, side='right')]
+        if asset is not None:
+            points = points[points['asset'] == self.asset_ids[asset]]
+        times, values = np.array(points['time']), np.array(points['value'])
+
+        # The coarser tiers only get a point when its hour or day is over
+        last = self.tiers[0].last
+        if tier is not self.tiers[0] and last is not None and start <= last[0] <= end:
+            value = last[1] if asset is None else last[2].get(self.asset_ids[asset])
+            if value is not None and (not len(times) or times[-1] < last[0]):
+                times, values = np.append(times, last[0]), np.append(values, value)
+        return times, values
+
+    def tier_for(self, start):
+        """Finest tier whose retention still reaches back to start"""
+        last = self.tiers[0].last
+        for tier in self.tiers:
+            if tier.retention is None or last is None or last[0] - start <= tier.retention:
+                return tier
+        return self.tiers[-1]
+
+    def close(self):
+        for tier in self.tiers:
+            tier.close()
+
+    def _append(self, index, time, total, assets):
+        tier = self.tiers[index]
+        if index + 1 < len(self.tiers) and tier.last is not None:
+            resolution = self.tiers[index + 1].resolution
+            if time // resolution > tier.last[0] // resolution:
+                # The last point of a finished hour or day is that bucket's point
+                self._append(index + 1, *tier.last)
+        tier.append(time, total, assets)
+
+    def _asset_id(self, name):
+        if name not in self.asset_ids:
+            self.asset_ids[name] = len(self.asset_names)
+            self.asset_names.append(name)
+            tmp_path = self._assets_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.asset_names, f)
+            os.replace(tmp_path, self._assets_path)
+        return self.asset_ids[name]
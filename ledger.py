@@ -0,0 +1,237 @@
+import sqlite3
+import threading
+from decimal import Decimal
+
+from binance.error import ClientError
+
+from config import LEDGER_PATH
+
+# Binance returns at most 1000 trades per my_trades call
+PAGE_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    symbol TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    order_id INTEGER,
+    price TEXT NOT NULL,
+    qty TEXT NOT NULL,
+    quote_qty TEXT,
+    commission TEXT,
+    commission_asset TEXT,
+    time INTEGER NOT NULL,
+    is_buyer INTEGER NOT NULL,
+    is_maker INTEGER,
+    PRIMARY KEY (symbol, id)
+);
+CREATE INDEX IF NOT EXISTS trades_time ON trades (symbol, time);
+CREATE TABLE IF NOT EXISTS sync_state (
+    symbol TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS traded_symbols (
+    symbol TEXT PRIMARY KEY
+);
+"""
+
+
+# Binance quotes prices and quantities with at most 8 decimals
+SCALE_DIGITS = 8
+
+
+def to_units(number):
+    """Decimal string from the API as an integer number of 1e-8 units"""
+    if number is None:
+        return 0
+    whole, _, fraction = str(number).partition('.')
+    return int(whole + fraction[:SCALE_DIGITS].ljust(SCALE_DIGITS, '0'))
+
+
+def from_units(units):
+    return Decimal(units).scaleb(-SCALE_DIGITS)
+
+
+class Trade:
+    """
+    One account trade with its numbers parsed once into scaled integers.
+    Slots and integers keep it much smaller than the raw my_trades dict;
+    price, qty, quote_qty and commission read back as Decimal.
+    """
+
+    __slots__ = (
+        'symbol', 'id', 'order_id', 'price_units', 'qty_units', 'quote_qty_units',
+        'commission_units', 'commission_asset', 'time', 'is_buyer', 'is_maker',
+    )
+
+    def __init__(self, symbol, id, order_id, price, qty, quote_qty, commission, commission_asset,
+                 time, is_buyer, is_maker):
+        self.symbol = symbol
+        self.id = id
+        self.order_id = order_id
+        self.price_units = to_units(price)
+        self.qty_units = to_units(qty)
+        self.quote_qty_units = to_units(quote_qty)
+        self.commission_units = to_units(commission)
+        self.commission_asset = commission_asset
+        self.time = time
+        self.is_buyer = bool(is_buyer)
+        self.is_maker = bool(is_maker)
+
+    @classmethod
+    def from_api(cls, symbol, data):
+        """Trade from a my_trades response item"""
+        return cls(
+            symbol, data['id'], data.get('orderId'), data['price'], data['qty'], data.get('quoteQty'),
+            data.get('commission'), data.get('commissionAsset'), data['time'],
+            data['isBuyer'], data.get('isMaker', False)
+        )
+
+    @property
+    def price(self):
+        return from_units(self.price_units)
+
+    @property
+    def qty(self):
+        return from_units(self.qty_units)
+
+    @property
+    def quote_qty(self):
+        return from_units(self.quote_qty_units)
+
+    @property
+    def commission(self):
+        return from_units(self.commission_units)
+
+    @property
+    def side(self):
+        return "BUY" if self.is_buyer else "SELL"
+
+    @property
+    def value(self):
+        return self.qty * self.price
+
+    def row(self):
+        return (
+            self.symbol, self.id, self.order_id, format(self.price, 'f'), format(self.qty, 'f'),
+            format(self.quote_qty, 'f'), format(self.commission, 'f'), self.commission_asset, self.time,
+            int(self.is_buyer), int(self.is_maker)
+        )
+
+
+class TradeLedger:
+    """
+    Local SQLite copy of the account trades.
+    Every symbol remembers the last trade id seen, so a sync only asks Binance
+    for newer trades (fromId pagination) instead of the whole history.
+    The client only needs an awaitable my_trades(symbol=..., fromId=..., limit=...)
+    method, so a fake Spot client can be passed in place of the real one.
+    It also keeps the index of symbols the account has traded, in memory and on disk.
+    Trades are parsed into Trade objects once and then kept in memory per symbol.
+    """
+
+    def __init__(self, client, path=None):
+        self.client = client
+        self.path = path or LEDGER_PATH
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._symbols = {row[0] for row in self._db.execute("SELECT symbol FROM traded_symbols")}
+        self._trades = {}
+
+    def last_id(self, symbol):
+        """Last trade id stored for symbol, None if it was never synced"""
+        with self._lock:
+            row = self._db.execute("SELECT last_id FROM sync_state WHERE symbol = ?", (symbol,)).fetchone()
+        return row[0] if row else None
+
+    async def sync(self, symbol):
+        """Download trades newer than the stored watermark, return how many were added"""
+        last_id = self.last_id(symbol)
+        from_id = 0 if last_id is None else last_id + 1
+        added = 0
+
+        while True:
+            trades = await self.client.my_trades(symbol=symbol, fromId=from_id, limit=PAGE_SIZE)
+            if trades:
+                self._store(symbol, [Trade.from_api(symbol, t) for t in trades])
+                added += len(trades)
+                from_id = trades[-1]['id'] + 1
+            elif last_id is None:
+                # Remember that the symbol was synced even when it has no trades
+                self._set_last_id(symbol, -1)
+            if len(trades) < PAGE_SIZE:
+                return added
+
+    async def backfill(self, symbols):
+        """Bulk first-run import, skips symbols that Binance does not know"""
+        added = {}
+        for symbol in symbols:
+            try:
+                added[symbol] = await self.sync(symbol)
+            except ClientError as e:
+                if "Invalid symbol" in str(e.error_message):
+                    continue
+                raise e
+        return added
+
+    async def trades(self, symbol, sync=True):
+        """
+        Trades of symbol as Trade objects, oldest first.
+        With sync=False the stored trades are returned without a request, unless
+        the symbol was never synced.
+        The Trade objects are shared between callers and must not be changed.
+        """
+        if sync or self.last_id(symbol) is None:
+            await self.sync(symbol)
+        if symbol not in self._trades:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT symbol, id, order_id, price, qty, quote_qty, commission, commission_asset, "
+                    "time, is_buyer, is_maker FROM trades WHERE symbol = ? ORDER BY id",
+                    (symbol,)
+                ).fetchall()
+            self._trades[symbol] = [Trade(*row) for row in rows]
+        return list(self._trades[symbol])
+
+    def traded_symbols(self):
+        """Symbols the account has traded, from memory without any request"""
+        return sorted(self._symbols)
+
+    def add_symbol(self, symbol):
+        """Add a symbol to the index, e.g. after a trade event from the stream"""
+        if symbol in self._symbols:
+            return
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO traded_symbols VALUES (?)", (symbol,))
+        self._symbols.add(symbol)
+
+    def reset_symbols(self):
+        """Rebuild the index from the trades already in the ledger"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM traded_symbols")
+            self._db.execute("INSERT INTO traded_symbols SELECT DISTINCT symbol FROM trades")
+            self._symbols = {row[0] for row in self._db.execute("SELECT symbol FROM traded_symbols")}
+
+    def _store(self, symbol, trades):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO trades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [t.row() for t in trades]
+            )
+            self._db.execute(
+                "INSERT INTO sync_state VALUES (?, ?) "
+                "ON CONFLICT (symbol) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)",
+                (symbol, trades[-1].id)
+            )
+
+        cached = self._trades.get(symbol)
+        if cached is not None:
+            # Two overlapping syncs may store the same page
+            last_id = cached[-1].id if cached else -1
+            cached.extend(t for t in trades if t.id > last_id)
+
+        self.add_symbol(symbol)
+
+    def _set_last_id(self, symbol, last_id):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO sync_state VALUES (?, ?)", (symbol, last_id))
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+import time
+
+from config import EXCHANGE_INFO_PATH, EXCHANGE_INFO_TTL
+
+
+class Markets:
+    """
+    Cached exchange_info, kept on disk so a restart starts warm.
+    The payload is reduced to an index of symbol -> base, quote and filters
+    and of (base, quote) -> symbol, which replaces string tricks on symbol names.
+    """
+
+    def __init__(self, client, path=None, ttl=None):
+        self.client = client
+        self.path = path or EXCHANGE_INFO_PATH
+        self.ttl = ttl if ttl is not None else EXCHANGE_INFO_TTL
+        self.updated = 0
+        self.symbols = {}
+        self.pairs = {}
+        self.quotes_by_base = {}
+        self._lock = asyncio.Lock()
+        self._load()
+
+    async def refresh(self, force=False):
+        """Download exchange_info again when the cached copy is older than the TTL"""
+        async with self._lock:
+            if not force and self.symbols and time.time() - self.updated < self.ttl:
+                return self
+            exchange_info = await self.client.exchange_info()
+            symbols = {
+                s['symbol']: {
+                    'base': s['baseAsset'],
+                    'quote': s['quoteAsset'],
+                    'status': s['status'],
+                    'filters': {f['filterType']: f for f in s['filters']},
+                }
+                for s in exchange_info['symbols']
+            }
+            self._build(symbols, time.time())
+            self._save()
+            return self
+
+    def symbol(self, base, quote):
+        """Symbol trading base against quote, None if Binance has no such pair"""
+        return self.pairs.get((base, quote))
+
+    def base_asset(self, symbol):
+        return self.symbols[symbol]['base']
+
+    def quote_asset(self, symbol):
+        return self.symbols[symbol]['quote']
+
+    def filters(self, symbol):
+        return self.symbols[symbol]['filters']
+
+    def normalize(self, text, default_quote='USDT'):
+        """
+        Symbol for user input like BTC, btcusdt or BNBBTC: a known symbol is kept,
+        an asset is paired with default_quote or else with its first quote.
+        Returns None when nothing matches.
+        """
+        text = text.upper()
+        if text in self.symbols:
+            return text
+        quotes = self.quotes_by_base.get(text)
+        if not quotes:
+            return None
+        return self.pairs.get((text, default_quote)) or self.pairs[(text, quotes[0])]
+
+    def _build(self, symbols, updated):
+        self.symbols = symbols
+        self.updated = updated
+        self.pairs = {(s['base'], s['quote']): name for name, s in symbols.items()}
+        quotes_by_base = {}
+        for s in symbols.values():
+            quotes_by_base.setdefault(s['base'], []).append(s['quote'])
+        self.quotes_by_base = quotes_by_base
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._build(cached['symbols'], cached['updated'])
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({'updated': self.updated, 'symbols': self.symbols}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,273 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from telegram.request import HTTPXRequest
+
+# Upper bounds in seconds, the Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+# How often the event loop lag is sampled
+LAG_INTERVAL = 0.5
+
+# Command whose update is being handled, spans are recorded under it
+current_command = contextvars.ContextVar("command", default=None)
+# Errors met while handling it, including the ones the handler answers itself
+command_failures = contextvars.ContextVar("command_failures", default=None)
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Counts of observations per bucket, recording one costs a bisect"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile q, inf past the last bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """
+    Latency of the commands, of the Binance endpoints and of the spans inside
+    the commands, event loop lag and gauges read when metrics are exported.
+    Everything is kept in memory in fixed buckets, cheap enough to stay on.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.commands = {}
+        self.command_errors = Counter()
+        self.requests = {}
+        self.request_errors = Counter()
+        self.spans = {}
+        self.loop_lag = Histogram(LAG_BUCKETS)
+        # name: (help, function returning the value)
+        self.gauges = {}
+        self._lag_task = None
+
+    def command(self, name, handler):
+        """
+        Wrap a handler to time it and record the spans it runs under name.
+        A command counts as one error when it raises or reports errors with error().
+        """
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            token = current_command.set(name)
+            failures = []
+            failures_token = command_failures.set(failures)
+            start = self.clock()
+            try:
+                return await handler(update, context)
+            except Exception as e:
+                failures.append(e)
+                raise
+            finally:
+                if failures:
+                    self.command_errors[name] += 1
+                self._histogram(self.commands, name).observe(self.clock() - start)
+                command_failures.reset(failures_token)
+                current_command.reset(token)
+
+        return wrapper
+
+    def error(self, error):
+        """Record an error the current command caught and answered itself"""
+        failures = command_failures.get()
+        if failures is not None:
+            failures.append(error)
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Time a block of the current command, nothing outside of a command"""
+        command = current_command.get()
+        if command is None:
+            yield
+            return
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self._histogram(self.spans, (command, name)).observe(self.clock() - start)
+
+    @contextlib.contextmanager
+    def request(self, endpoint):
+        """Time one Binance call, also as a span of the current command"""
+        start = self.clock()
+        try:
+            with self.span("binance." + endpoint):
+                yield
+        except Exception:
+            self.request_errors[endpoint] += 1
+            raise
+        finally:
+            self._histogram(self.requests, endpoint).observe(self.clock() - start)
+
+    def gauge(self, name, help, value):
+        self.gauges[name] = (help, value)
+
+    def start(self):
+        """Sample the event loop lag in the running loop"""
+        if self._lag_task is None:
+            self._lag_task = asyncio.get_running_loop().create_task(self._watch_loop())
+
+    def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+
+    async def _watch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            # Anything past the interval is time the loop was busy elsewhere
+            self.loop_lag.observe(max(loop.time() - start - LAG_INTERVAL, 0))
+
+    def prometheus(self):
+        """Every metric in the Prometheus text format"""
+        lines = []
+        self._export_histograms(lines, "bot_command_seconds", "Command latency", "command", self.commands)
+        self._export_counter(lines, "bot_command_errors_total", "Commands that failed in full or in part", "command", self.command_errors)
+        self._export_histograms(
+            lines, "bot_span_seconds", "Awaited calls inside commands", ("command", "span"), self.spans
+        )
+        self._export_histograms(lines, "binance_request_seconds", "Binance call latency", "endpoint", self.requests)
+        self._export_counter(
+            lines, "binance_request_errors_total", "Binance calls that failed", "endpoint", self.request_errors
+        )
+        self._export_histograms(lines, "bot_event_loop_lag_seconds", "Event loop lag", None, {None: self.loop_lag})
+        for name, (help, value) in self.gauges.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            try:
+                lines.append(f"{name} {float(value())}")
+            except Exception as e:
+                logger.warning("Gauge %s failed: %s", name, e)
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Lines of /stats: the slowest commands and endpoints first"""
+        lines = ["Commands (count, p50, p99, errors):"]
+        for name, h in sorted(self.commands.items(), key=lambda item: -item[1].quantile(0.99)):
+            lines.append(f"/{name}: {h.count}, {_ms(h.quantile(0.5))}, {_ms(h.quantile(0.99))}, "
+                         f"{self.command_errors[name]}")
+        lines.append("\nBinance endpoints (count, p50, p99, errors):")
+        for name, h in sorted(self.requests.items(), key=lambda item: -item[1].sum):
+            lines.append(f"{name}: {h.count}, {_ms(h.quantile(0.5))}, {_ms(h.quantile(0.99))}, "
+                         f"{self.request_errors[name]}")
+        if self.loop_lag.count:
+            lines.append(f"\nEvent loop lag p50 {_ms(self.loop_lag.quantile(0.5), LAG_BUCKETS)}, "
+                         f"p99 {_ms(self.loop_lag.quantile(0.99), LAG_BUCKETS)}")
+        for name, (help, value) in self.gauges.items():
+            try:
+                lines.append(f"{help}: {value():g}")
+            except Exception as e:
+                lines.append(f"{help}: {e}")
+        return lines
+
+    def span_summary(self, command):
+        """Lines of /stats COMMAND: its spans with the most total time first"""
+        spans = [(span, h) for (name, span), h in self.spans.items() if name == command]
+        spans.sort(key=lambda item: -item[1].sum)
+        lines = [f"/{command} spans (count, total, p50, p99):"]
+        for span, h in spans:
+            lines.append(f"{span}: {h.count}, {h.sum * 1000:.0f} ms, {_ms(h.quantile(0.5))}, {_ms(h.quantile(0.99))}")
+        return lines
+
+    def _histogram(self, histograms, key):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram()
+        return histogram
+
+    @staticmethod
+    def _export_histograms(lines, name, help, label, histograms):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, h in histograms.items():
+            labels = _labels(label, key)
+            seen = 0
+            for bound, count in zip(h.buckets, h.counts):
+                seen += count
+                lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {seen}')
+            lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {h.count}')
+            series = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{name}_sum{series} {h.sum}")
+            lines.append(f"{name}_count{series} {h.count}")
+
+    @staticmethod
+    def _export_counter(lines, name, help, label, counter):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} counter")
+        for key, count in counter.items():
+            lines.append(f"{name}{{{_labels(label, key).rstrip(',')}}} {count}")
+
+
+class TracedRequest(HTTPXRequest):
+    """Telegram Bot API requests recorded as spans, e.g. telegram.sendMessage"""
+
+    def __init__(self, metrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def do_request(self, url, method, *args, **kwargs):
+        with self.metrics.span("telegram." + url.rsplit("/", 1)[-1]):
+            return await super().do_request(url, method, *args, **kwargs)
+
+
+async def serve(metrics, port, host="0.0.0.0"):
+    """Minimal HTTP server answering every request with the Prometheus metrics"""
+    async def handle(reader, writer):
+        try:
+            # The request itself does not matter, read up to the end of its headers
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            body = metrics.prometheus().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+def _labels(label, key):
+    if label is None:
+        return ""
+    if isinstance(label, tuple):
+        return "".join(f'{l}="{k}",' for l, k in zip(label, key))
+    return f'{label}="{key}",'
+
+
+def _ms(seconds, buckets=LATENCY_BUCKETS):
+    return f">{buckets[-1] * 1000:g} ms" if seconds == float("inf") else f"≤{seconds * 1000:g} ms"
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+
+from stream import OPEN_ORDER_STATUSES, order_of
+
+# Final order statuses and the change they are reported as
+CLOSED_STATUSES = {
+    'FILLED': 'filled',
+    'CANCELED': 'canceled',
+    'EXPIRED': 'expired',
+    'EXPIRED_IN_MATCH': 'expired',
+    'REJECTED': 'rejected',
+}
+
+logger = logging.getLogger(__name__)
+
+
+class OrderChange:
+    """
+    A fill, partial fill or end of an order. filled is the quantity executed
+    since the order was last seen and price its average price.
+    """
+
+    __slots__ = ('kind', 'order', 'filled', 'price')
+
+    def __init__(self, kind, order, filled, price):
+        self.kind = kind
+        self.order = order
+        self.filled = filled
+        self.price = price
+
+
+class OrderWatcher:
+    """
+    Open orders of one account in memory, keyed by orderId, turned into
+    notifications when they fill or end.
+    on_event is a LiveState listener: every executionReport touches only its
+    own order. Without the stream, poll() diffs get_open_orders() against the
+    known orders: only the orders whose status or executed quantity moved are
+    looked at, and only the ones that left the open set cost a get_order()
+    to learn whether they filled or were canceled.
+    The first snapshot only fills the set, orders that changed while the bot
+    was down are not reported. Changes are queued and sent in batches through
+    notify, an awaitable notify(changes).
+    """
+
+    def __init__(self, client, notify=None):
+        self.client = client
+        self.notify = notify
+        self.orders = {}
+        self.primed = False
+        self.updated = 0
+        self.pending = []
+        self._flush = None
+        self._syncs = set()
+
+    def update(self, order):
+        """Apply one order in the get_open_orders() shape, returns its change or None"""
+        order_id = order['orderId']
+        known = self.orders.get(order_id)
+        if order['status'] in OPEN_ORDER_STATUSES:
+            self.orders[order_id] = order
+            kind = 'partial'
+        else:
+            if known is None:
+                # Already reported, or it opened and ended while nobody watched
+                return None
+            del self.orders[order_id]
+            kind = CLOSED_STATUSES.get(order['status'], 'canceled')
+
+        filled = float(order['executedQty']) - (float(known['executedQty']) if known else 0.0)
+        if kind == 'partial' and filled <= 0:
+            return None
+        quote = float(order.get('cummulativeQuoteQty') or 0) - (
+            float(known.get('cummulativeQuoteQty') or 0) if known else 0.0
+        )
+        price = quote / filled if filled > 0 and quote > 0 else float(order['price'])
+        return OrderChange(kind, order, max(filled, 0.0), price)
+
+    def on_event(self, event):
+        event_type = event.get('e')
+        if event_type == 'executionReport':
+            self._queue([self.update(order_of(event))])
+        elif event_type == 'openOrders':
+            # The stream (re)connected, some orders may have moved while it was down
+            task = asyncio.get_running_loop().create_task(self._sync_logged(event['orders']))
+            self._syncs.add(task)
+            task.add_done_callback(self._syncs.discard)
+
+    async def poll(self):
+        """Diff a get_open_orders() response against the known orders"""
+        await self.sync(await self.client.get_open_orders())
+
+    async def sync(self, open_orders):
+        if not self.primed:
+            self.orders = {order['orderId']: order for order in open_orders}
+            self.primed = True
+            self.updated = time.time()
+            return
+
+        changes = []
+        still_open = set()
+        for order in open_orders:
+            still_open.add(order['orderId'])
+            known = self.orders.get(order['orderId'])
+            if known is None or known['executedQty'] != order['executedQty'] or known['status'] != order['status']:
+                changes.append(self.update(order))
+
+        gone = [order for order_id, order in self.orders.items() if order_id not in still_open]
+        # Only the final state of an order that left tells a fill from a cancel
+        finals = await asyncio.gather(*(
+            self.client.get_order(symbol=order['symbol'], orderId=order['orderId']) for order in gone
+        ), return_exceptions=True)
+        for order, final in zip(gone, finals):
+            if isinstance(final, Exception):
+                logger.warning("Order %s left the open orders, lookup failed: %s", order['orderId'], final)
+                self.orders.pop(order['orderId'], None)
+                continue
+            changes.append(self.update(final))
+        self.updated = time.time()
+        self._queue(changes)
+
+    def _queue(self, changes):
+        changes = [change for change in changes if change is not None]
+        if not changes or self.notify is None:
+            return
+        self.pending += changes
+        # Every change until the flush runs goes out in the same batch
+        if self._flush is None:
+            self._flush = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        batch, self.pending = self.pending, []
+        self._flush = None
+        try:
+            await self.notify(batch)
+        except Exception as e:
+            logger.warning("Order notification failed: %s", e)
+
+    async def _sync_logged(self, open_orders):
+        try:
+            await self.sync(open_orders)
+        except Exception as e:
+            logger.warning("Open orders sync failed: %s", e)
@@ -0,0 +1,176 @@
+import numpy as np
+
+from ledger import SCALE_DIGITS
+
+UNITS = 10 ** SCALE_DIGITS
+
+METHODS = ('fifo', 'lifo', 'average')
+
+
+class TradeColumns:
+    """
+    Trades of one base asset as NumPy columns, oldest first.
+    Prices and commissions are converted to the price snapshot currency (USDT)
+    once at load time. Trades on BTC or ETH pairs are converted at the current
+    rate, since historical rates are not stored.
+    qty is the base quantity that moved, net of commissions paid in the base
+    asset, value is qty * price and fee is every other commission.
+    """
+
+    def __init__(self, time, is_buy, qty, value, fee):
+        self.time = time
+        self.is_buy = is_buy
+        self.qty = qty
+        self.value = value
+        self.fee = fee
+
+    def __len__(self):
+        return len(self.time)
+
+    @classmethod
+    def load(cls, trades, markets, prices):
+        """Columns of ledger Trade objects"""
+        trades = sorted(trades, key=lambda t: (t.time, t.id))
+        count = len(trades)
+
+        time = np.fromiter((t.time for t in trades), dtype=np.int64, count=count)
+        is_buy = np.fromiter((t.is_buyer for t in trades), dtype=bool, count=count)
+        # Scaled integers become floats in one vectorized division
+        qty = np.fromiter((t.qty_units for t in trades), dtype=float, count=count) / UNITS
+        price = np.fromiter((t.price_units for t in trades), dtype=float, count=count) / UNITS
+        commission = np.fromiter((t.commission_units for t in trades), dtype=float, count=count) / UNITS
+
+        # One conversion rate per quote and commission asset, not per trade
+        rates = {}
+
+        def rate(asset):
+            if asset not in rates:
+                rates[asset] = prices.usd_price(asset) or 0.0
+            return rates[asset]
+
+        quote_rate = np.fromiter((rate(markets.quote_asset(t.symbol)) for t in trades), dtype=float, count=count)
+        base_fee = np.fromiter(
+            (t.commission_asset == markets.base_asset(t.symbol) for t in trades), dtype=bool, count=count
+        )
+        fee_rate = np.fromiter(
+            (rate(t.commission_asset) if t.commission_asset else 0.0 for t in trades), dtype=float, count=count
+        )
+
+        value = qty * price * quote_rate
+        fee = np.where(base_fee, 0.0, commission * fee_rate)
+        # A base asset commission shrinks what a buy receives and grows what a sell gives
+        qty = np.where(base_fee, np.where(is_buy, qty - commission, qty + commission), qty)
+        return cls(time, is_buy, qty, value, fee)
+
+
+def average_buy_price(cols):
+    """Average price paid per unit bought, commissions included"""
+    buys = cols.is_buy
+    bought = float(np.sum(cols.qty[buys]))
+    if bought <= 0:
+        return 0.0
+    return float(np.sum(cols.value[buys] + cols.fee[buys])) / bought
+
+
+def fifo_costs(cols):
+    """
+    Cost basis of every sell matching the oldest lots bought before it, and
+    the cost and quantity of the lots left.
+    Cumulative bought quantity against cumulative cost is a piecewise linear
+    curve. After sell k the curve is consumed up to
+    C_k = min(C_k-1 + sold_k, bought before k), which unrolls to the sold
+    quantity plus the running minimum of (bought before - sold), capped at 0.
+    The cost of each sell is the curve read before and after it, one
+    np.interp for all sells. Sold quantity without earlier lots costs nothing
+    and leaves the later lots alone.
+    """
+    buys = cols.is_buy
+    bought = np.concatenate(([0.0], np.cumsum(cols.qty[buys])))
+    cost = np.concatenate(([0.0], np.cumsum(cols.value[buys] + cols.fee[buys])))
+    sold = np.cumsum(cols.qty[~buys])
+    bought_before = np.cumsum(np.where(buys, cols.qty, 0.0))[~buys]
+    shortfall = np.minimum(np.minimum.accumulate(bought_before - sold), 0.0) if len(sold) else sold
+    matched = np.concatenate(([0.0], sold + shortfall))
+    consumed = np.interp(matched, bought, cost)
+    return np.diff(consumed), cost[-1] - consumed[-1], max(bought[-1] - matched[-1], 0.0)
+
+
+def lifo_costs(cols):
+    """Cost basis of every sell matching the newest lots first, the cost and quantity of the lots left"""
+    # Which lots are left depends on every earlier sell, so this is one sequential pass
+    lots = []
+    sell_costs = []
+    for is_buy, qty, cost in zip(cols.is_buy.tolist(), cols.qty.tolist(), (cols.value + cols.fee).tolist()):
+        if is_buy:
+            if qty > 0:
+                lots.append([qty, cost / qty])
+            continue
+        sell_cost = 0.0
+        while qty > 0 and lots:
+            lot = lots[-1]
+            used = min(qty, lot[0])
+            sell_cost += used * lot[1]
+            qty -= used
+            lot[0] -= used
+            if lot[0] <= 0:
+                lots.pop()
+        sell_costs.append(sell_cost)
+    return np.array(sell_costs), sum(qty * unit_cost for qty, unit_cost in lots), sum(qty for qty, _ in lots)
+
+
+def average_costs(cols):
+    """Cost basis of every sell at the average cost of the position before it"""
+    # The average depends on the position left by earlier sells, one sequential pass
+    position = 0.0
+    position_cost = 0.0
+    sell_costs = []
+    for is_buy, qty, cost in zip(cols.is_buy.tolist(), cols.qty.tolist(), (cols.value + cols.fee).tolist()):
+        if is_buy:
+            position += qty
+            position_cost += cost
+            continue
+        used = min(qty, position)
+        sell_cost = position_cost * used / position if position > 0 else 0.0
+        position -= used
+        position_cost -= sell_cost
+        sell_costs.append(sell_cost)
+    return np.array(sell_costs), position_cost, position
+
+
+# method -> function of the columns returning (cost of every sell, cost basis, quantity held)
+COST_FUNCTIONS = {
+    'fifo': fifo_costs,
+    'lifo': lifo_costs,
+    'average': average_costs,
+}
+
+
+def analyze(cols, current_price, method='fifo'):
+    """Realized and unrealized P&L of the trades, commissions included"""
+    buys = cols.is_buy
+    buy_cost = float(np.sum(cols.value[buys] + cols.fee[buys]))
+    sell_revenue = float(np.sum(cols.value[~buys] - cols.fee[~buys]))
+    # What is left of the lots bought, sells of coins never bought here (e.g. deposits) do not consume it
+    sell_costs, cost_basis, position = COST_FUNCTIONS[method](cols)
+    position = float(position)
+    realized = sell_revenue - float(np.sum(sell_costs))
+    unrealized = position * current_price - cost_basis if current_price else 0.0
+
+    return {
+        'method': method,
+        'buy_cost': buy_cost,
+        'sell_revenue': sell_revenue,
+        'fees': float(np.sum(cols.fee)),
+        'position': position,
+        'cost_basis': float(cost_basis),
+        'realized': realized,
+        'unrealized': unrealized,
+    }
+
+
+def realized_series(cols, method='fifo'):
+    """Times of the sells and the realized P&L accumulated up to each of them"""
+    sells = ~cols.is_buy
+    sell_costs, _, _ = COST_FUNCTIONS[method](cols)
+    revenue = cols.value[sells] - cols.fee[sells]
+    return cols.time[sells], np.cumsum(revenue - sell_costs)
@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+import numpy as np
+
+from pnl import TradeColumns, analyze, average_buy_price
+from prices import USD_ASSET
+
+# No cost basis, and valued at 1 USDT when their pairs have no price
+STABLE_ASSETS = ("BUSD", "USDT")
+
+# Quotes whose trades make up the cost basis of an asset
+COST_QUOTES = ("USDT", "USDC")
+
+
+class Portfolio:
+    """
+    Valuation, cost basis and P&L of every asset held, computed ahead of the
+    commands that show them.
+    The cost basis is only computed again when the account updateTime or the
+    ledger watermark of a held asset moved, otherwise a refresh only revalues
+    the balances at the current prices.
+    """
+
+    def __init__(self, ledger, markets, prices, method='fifo'):
+        self.ledger = ledger
+        self.markets = markets
+        self.prices = prices
+        self.method = method
+        self.assets = []
+        self.total_value = 0.0
+        self.updated = 0
+        # Bumped whenever the snapshot changes, e.g. to key rendered charts
+        self.version = 0
+        self.fingerprint = None
+        self.prices_updated = None
+        self._costs = {}
+
+    @property
+    def age(self):
+        """Seconds since the last refresh"""
+        return time.time() - self.updated
+
+    def state(self):
+        """The snapshot as JSON-compatible data, for restore() after a restart"""
+        return {
+            'assets': self.assets,
+            'total_value': self.total_value,
+            'updated': self.updated,
+            'fingerprint': self.fingerprint,
+            'prices_updated': self.prices_updated,
+            'costs': self._costs,
+        }
+
+    def restore(self, state):
+        self.assets = state['assets']
+        self.total_value = state['total_value']
+        # The age of the snapshot carries over, commands show how old it is
+        self.updated = state['updated']
+        update_time, held, watermarks = state['fingerprint']
+        self.fingerprint = update_time, tuple(map(tuple, held)), tuple(map(tuple, watermarks))
+        self.prices_updated = state['prices_updated']
+        self._costs = state['costs']
+        self.version += 1
+
+    def pairs(self, asset):
+        return [pair for pair in (self.markets.symbol(asset, quote) for quote in COST_QUOTES) if pair]
+
+    async def refresh(self, account, sync=True):
+        """
+        Update the snapshot from an account() response, return False when
+        nothing changed since the last refresh.
+        With sync=False the ledger is trusted to be current, e.g. while the
+        user data stream syncs it on every fill.
+        """
+        await self.prices.snapshot()
+        held = {
+            b['asset']: float(b['free']) + float(b['locked'])
+            for b in account['balances'] if float(b['free']) + float(b['locked']) > 0
+        }
+        fingerprint = self._fingerprint(account, held)
+        changed = fingerprint != self.fingerprint
+        if not changed and self.prices.updated == self.prices_updated:
+            self.updated = time.time()
+            return False
+
+        if changed:
+            if sync:
+                # The client caps how many of these run at once
+                results = await asyncio.gather(*(
+                    self.ledger.sync(pair)
+                    for asset in held if asset not in STABLE_ASSETS for pair in self.pairs(asset)
+                ), return_exceptions=True)
+                for result in results:
+                    if isinstance(result, Exception):
+                        raise result
+                # The sync moved the watermarks it is keyed on
+                fingerprint = self._fingerprint(account, held)
+            self._costs = {asset: await self._cost(asset) for asset in held}
+            self.fingerprint = fingerprint
+
+        self._value(held)
+        self.prices_updated = self.prices.updated
+        self.updated = time.time()
+        self.version += 1
+        return True
+
+    def _fingerprint(self, account, held):
+        watermarks = tuple(
+            (pair, self.ledger.last_id(pair))
+            for asset in sorted(held) if asset not in STABLE_ASSETS for pair in self.pairs(asset)
+        )
+        return account.get('updateTime'), tuple(sorted(held.items())), watermarks
+
+    async def _cost(self, asset):
+        if asset in STABLE_ASSETS:
+            return None
+        trades = []
+        for pair in self.pairs(asset):
+            trades += await self.ledger.trades(pair, sync=False)
+        if not trades:
+            return None
+        cols = TradeColumns.load(trades, self.markets, self.prices)
+        # The current price only feeds the unrealized P&L, which is revalued below
+        result = analyze(cols, 0, self.method)
+        result['avg_price'] = average_buy_price(cols)
+        return result
+
+    def rates(self, assets, quote=USD_ASSET):
+        """Prices of assets in quote, pegged stablecoins without a price at par and 0 without a path"""
+        rates = self.prices.rates(assets, quote)
+        stable = np.fromiter((asset in STABLE_ASSETS for asset in assets), dtype=bool, count=len(assets))
+        if np.isnan(rates[stable]).any():
+            rates = np.where(np.isnan(rates) & stable, self.prices.rates([USD_ASSET], quote)[0], rates)
+        return np.nan_to_num(rates)
+
+    def values_in(self, quote):
+        """Value of every asset of the snapshot in quote, at the current prices"""
+        quantities = np.array([a['quantity'] for a in self.assets], dtype=float)
+        return quantities * self.rates([a['asset'] for a in self.assets], quote)
+
+    def _value(self, held):
+        names = list(held)
+        quantities = np.fromiter(held.values(), dtype=float, count=len(names))
+        # Every asset priced in one pass over the conversion graph
+        prices = self.rates(names)
+        values = quantities * prices
+        assets = []
+        for asset, qty, price, value in zip(names, quantities.tolist(), prices.tolist(), values.tolist()):
+            cost = self._costs.get(asset)
+            entry = {
+                'asset': asset,
+                'quantity': qty,
+                'price': price,
+                'value_usd': value,
+                'avg_price': 1.0 if asset in STABLE_ASSETS else 0.0,
+                'cost_basis': None,
+                'realized': None,
+                'unrealized': None,
+            }
+            if cost is not None:
+                entry['avg_price'] = cost['avg_price']
+                entry['cost_basis'] = cost['cost_basis']
+                entry['realized'] = cost['realized']
+                entry['unrealized'] = cost['position'] * price - cost['cost_basis'] if price else 0.0
+            assets.append(entry)
+
+        self.assets = assets
+        self.total_value = float(values.sum())
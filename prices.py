@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import math
+import time
+
+from config import PRICE_TTL
+
+USD_ASSET = 'USDT'
+
+logger = logging.getLogger(__name__)
+
+
+class Prices:
+    """
+    Short-lived snapshot of every Binance price, downloaded with one bulk
+    ticker_price call and shared by every command that needs a price.
+    """
+
+    def __init__(self, client, markets, ttl=None):
+        self.client = client
+        self.markets = markets
+        self.ttl = ttl if ttl is not None else PRICE_TTL
+        self.updated = 0
+        self.prices = {}
+        # Called with {symbol: price} of the prices that changed
+        self.listeners = []
+        # Built on the first conversion, NumPy is not imported before
+        self.graph = None
+        self._lock = asyncio.Lock()
+
+    def state(self):
+        return {'updated': self.updated, 'prices': self.prices}
+
+    def restore(self, state):
+        """Prices saved by state(), they are downloaded again once older than the TTL"""
+        self.prices = state['prices']
+        self.updated = state['updated']
+
+    async def snapshot(self):
+        """Download all prices again when the snapshot is older than the TTL"""
+        async with self._lock:
+            if self.prices and time.time() - self.updated < self.ttl:
+                return self
+            await self.markets.refresh()
+            tickers = await self.client.ticker_price()
+            self.prices = {t['symbol']: float(t['price']) for t in tickers}
+            self.updated = time.time()
+            self._notify(self.prices)
+            return self
+
+    def update(self, changed):
+        """Apply {symbol: price} pushed by a stream"""
+        self.prices.update(changed)
+        self.updated = time.time()
+        self._notify(changed)
+
+    def _notify(self, changed):
+        for listener in self.listeners:
+            try:
+                listener(changed)
+            except Exception:
+                logger.exception("Price listener failed")
+
+    def price(self, symbol):
+        """Last price of symbol, None if it is not traded"""
+        return self.prices.get(symbol)
+
+    def rates(self, assets, quote=USD_ASSET):
+        """Prices of assets in quote as an array, NaN where no chain of pairs connects them"""
+        if self.graph is None:
+            from conversion import ConversionGraph
+
+            self.graph = ConversionGraph(self.markets)
+        return self.graph.rates(self.prices, assets, quote)
+
+    def convert(self, asset, quote):
+        """Price of one asset in quote through the best path of pairs, None if there is none"""
+        rate = float(self.rates([asset], quote)[0])
+        return None if math.isnan(rate) else rate
+
+    def usd_price(self, asset):
+        """USDT price of asset"""
+        return self.convert(asset, USD_ASSET)
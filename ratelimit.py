@@ -0,0 +1,153 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import time
+
+# Request weight of the Spot methods, see the Binance API docs of each endpoint
+WEIGHTS = {
+    "account": 20,
+    "my_trades": 20,
+    "exchange_info": 20,
+    "ticker_price": 2,
+    "ticker_24hr": 2,
+    "avg_price": 2,
+    "get_open_orders": 6,
+    "get_order": 4,
+    "new_listen_key": 2,
+    "renew_listen_key": 2,
+    "close_listen_key": 2,
+    "ping": 1,
+    "time": 1,
+    "deposit_history": 1,
+    # Counted against the UID limit rather than the IP, charged here all the same
+    "get_convert_trade_history": 3000,
+}
+
+# Same endpoints called without a symbol, i.e. for the whole exchange
+ALL_SYMBOLS_WEIGHTS = {
+    "ticker_price": 4,
+    "ticker_24hr": 80,
+    "get_open_orders": 80,
+}
+
+DEFAULT_WEIGHT = 1
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+current_priority = contextvars.ContextVar("binance_priority", default=INTERACTIVE)
+
+
+def request_weight(name, kwargs):
+    """Weight Binance charges for calling Spot method name with kwargs"""
+    if name in ALL_SYMBOLS_WEIGHTS and not kwargs.get("symbol") and not kwargs.get("symbols"):
+        return ALL_SYMBOLS_WEIGHTS[name]
+    return WEIGHTS.get(name, DEFAULT_WEIGHT)
+
+
+@contextlib.contextmanager
+def background():
+    """Binance calls made inside this block wait behind interactive commands"""
+    token = current_priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class Clock:
+    """Wall clock used by the scheduler"""
+
+    def time(self):
+        return time.monotonic()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+
+class SimulatedClock:
+    """Clock for offline tests, sleeping moves the time forward instantly"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += max(seconds, 0)
+        await asyncio.sleep(0)
+
+
+class WeightScheduler:
+    """
+    Token bucket of Binance request weight shared by every call.
+    The bucket holds limit weight and refills it over interval seconds. Callers
+    wait their turn by priority (interactive first) and then for enough weight.
+    The bucket is corrected with the used-weight headers of the responses, and
+    a Retry-After from Binance blocks every call until it has passed.
+    """
+
+    def __init__(self, limit=6000, interval=60, clock=None):
+        self.limit = limit
+        self.rate = limit / interval
+        self.clock = clock or Clock()
+        self.tokens = float(limit)
+        self.used_weight = 0
+        self.blocked_until = 0.0
+        self._updated = self.clock.time()
+        self._order = itertools.count()
+        self._waiting = []
+        self._turn = asyncio.Condition()
+
+    async def acquire(self, weight, priority=None):
+        """Wait until a request of the given weight may be sent"""
+        # A request heavier than the whole bucket waits for a full bucket
+        weight = min(weight, self.limit)
+        if priority is None:
+            priority = current_priority.get()
+        ticket = (priority, next(self._order))
+        heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                async with self._turn:
+                    await self._turn.wait_for(lambda: self._waiting[0] == ticket)
+                wait = self._wait_time(weight)
+                if wait <= 0:
+                    self.tokens -= weight
+                    return
+                # A more urgent request may take the turn while this one sleeps
+                await self.clock.sleep(wait)
+        finally:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            async with self._turn:
+                self._turn.notify_all()
+
+    def observe(self, headers):
+        """Correct the bucket with the X-MBX-USED-WEIGHT-1M response header"""
+        for key, value in headers.items():
+            if key.lower() == "x-mbx-used-weight-1m":
+                self.used_weight = int(value)
+                self._refill()
+                self.tokens = min(self.tokens, self.limit - self.used_weight)
+
+    def retry_after(self, seconds):
+        """Hold every request for the given number of seconds"""
+        self.blocked_until = max(self.blocked_until, self.clock.time() + seconds)
+
+    def _refill(self):
+        now = self.clock.time()
+        self.tokens = min(self.limit, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait_time(self, weight):
+        self._refill()
+        now = self.clock.time()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= weight:
+            return 0
+        return (weight - self.tokens) / self.rate
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.helpers import escape_markdown
+
+# Telegram rejects messages longer than 4096 UTF-16 code units
+MAX_MESSAGE_LENGTH = 4096
+
+# Pagers kept per chat, the oldest one stops paging when a new one is created
+MAX_PAGERS = 10
+
+CALLBACK_PREFIX = "page"
+
+
+def escape(text):
+    """Escape user or API text for Markdown messages"""
+    return escape_markdown(str(text), version=1)
+
+
+def message_length(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+def truncate(text, length):
+    """text cut to at most length UTF-16 units, the unit Telegram counts in"""
+    # A surrogate pair cut in half is dropped
+    return text.encode("utf-16-le")[:2 * length].decode("utf-16-le", errors="ignore")
+
+
+class Pager:
+    """
+    Splits an iterator of Markdown lines into messages of whole lines.
+    A page is only rendered when it is first asked for, so a long history is
+    read from the iterator a page at a time and never held as one string.
+    """
+
+    def __init__(self, title, lines, limit=MAX_MESSAGE_LENGTH):
+        self.title = title
+        self.limit = limit
+        self.pages = []
+        self._lines = iter(lines)
+        self._pending = None
+
+    def page(self, number):
+        """Text of page number, None past the last page"""
+        while len(self.pages) <= number:
+            page = self._render_next()
+            if page is None:
+                return None
+            self.pages.append(page)
+        return self.pages[number]
+
+    def has_page(self, number):
+        if number < len(self.pages):
+            return True
+        # Only peek one line ahead, the next page is rendered when it is opened
+        if self._pending is None:
+            self._pending = next(self._lines, None)
+        return number == len(self.pages) and self._pending is not None
+
+    def _render_next(self):
+        text = self.title + "\n\n" if self.title else ""
+        room = self.limit - message_length(text)
+        lines = []
+        while True:
+            line = self._pending if self._pending is not None else next(self._lines, None)
+            self._pending = None
+            if line is None:
+                break
+            length = message_length(line) + 1
+            if length > room:
+                if lines:
+                    self._pending = line
+                    break
+                # A single line longer than a message is cut
+                line = truncate(line, room - 2) + "…"
+                length = room
+            lines.append(line)
+            room -= length
+        if not lines:
+            return None
+        return text + "\n".join(lines)
+
+
+def keyboard(pager_id, number, pager):
+    buttons = []
+    if number > 0:
+        buttons.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"{CALLBACK_PREFIX}:{pager_id}:{number - 1}"))
+    if pager.has_page(number + 1):
+        buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"{CALLBACK_PREFIX}:{pager_id}:{number + 1}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+async def send_pages(update, context, title, lines):
+    """Reply with the first page of lines, the next ones are opened with inline buttons"""
+    pager = Pager(title, lines)
+    text = pager.page(0)
+    if text is None:
+        return
+
+    pagers = context.chat_data.setdefault("pagers", OrderedDict())
+    pager_id = context.chat_data["pager_ids"] = context.chat_data.get("pager_ids", 0) + 1
+    pagers[pager_id] = pager
+    while len(pagers) > MAX_PAGERS:
+        pagers.popitem(last=False)
+
+    await update.message.reply_text(
+        text, parse_mode="Markdown", reply_markup=keyboard(pager_id, 0, pager)
+    )
+
+
+async def turn_page(update, context):
+    """CallbackQueryHandler for the Prev / Next buttons"""
+    query = update.callback_query
+    _, pager_id, number = query.data.split(":")
+    pager_id, number = int(pager_id), int(number)
+
+    pager = context.chat_data.get("pagers", {}).get(pager_id)
+    text = pager.page(number) if pager else None
+    if text is None:
+        await query.answer("These results expired, run the command again.")
+        await query.edit_message_reply_markup(reply_markup=None)
+        return
+
+    await query.answer()
+    await query.edit_message_text(text, parse_mode="Markdown", reply_markup=keyboard(pager_id, number, pager))
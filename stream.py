@@ -0,0 +1,218 @@
+import asyncio
+import functools
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+STREAM_URL = "wss://stream.binance.com:9443"
+
+# Binance closes a listenKey after 60 minutes without a keepalive
+KEEPALIVE_INTERVAL = 30 * 60
+
+# Binance pings every 20 seconds and the miniTicker stream pushes every second,
+# silence longer than this is a dead connection
+RECV_TIMEOUT = 60
+
+MAX_RECONNECT_DELAY = 60
+
+OPEN_ORDER_STATUSES = ("NEW", "PARTIALLY_FILLED")
+
+logger = logging.getLogger(__name__)
+
+
+def order_of(event):
+    """executionReport event as an order in the get_open_orders() shape"""
+    return {
+        'symbol': event['s'],
+        'orderId': event['i'],
+        'side': event['S'],
+        'type': event['o'],
+        'price': event['p'],
+        'origQty': event['q'],
+        'executedQty': event['z'],
+        'cummulativeQuoteQty': event['Z'],
+        'status': event['X'],
+        'updateTime': event['E'],
+    }
+
+
+class LiveState:
+    """
+    Balances, prices and open orders kept current by the Binance streams.
+    listeners get every user data event, and after every resync an
+    openOrders event with the REST snapshot of the open orders.
+    """
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.balances = {}
+        self.open_orders = {}
+        self.update_time = None
+        self.live = False
+        self.listeners = []
+
+    def account(self):
+        """Balances in the same shape as the account() response"""
+        return {
+            'updateTime': self.update_time,
+            'balances': [
+                {'asset': asset, 'free': free, 'locked': locked}
+                for asset, (free, locked) in self.balances.items()
+            ]
+        }
+
+    def orders(self):
+        """Open orders in the same shape as the get_open_orders() response"""
+        return list(self.open_orders.values())
+
+
+class StreamEngine:
+    """
+    Background task reading the all-market miniTicker stream and the user data
+    stream over one combined WebSocket connection.
+    After every (re)connection the state is resynced with REST, so nothing is
+    lost while the connection was down, and the listenKey is kept alive.
+    stream_url can point to a local fake server.
+    With several accounts only one engine needs tickers, the others only
+    follow their user data stream.
+    """
+
+    def __init__(self, client, state, ledger=None, stream_url=STREAM_URL, tickers=True):
+        self.client = client
+        self.state = state
+        self.ledger = ledger
+        self.stream_url = stream_url
+        self.tickers = tickers
+        # recv blocks for as long as the connection lives, one thread per engine
+        # keeps it off the default executor
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream")
+        self._task = None
+        self._ws = None
+        self._syncs = set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._disconnect()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def resync(self):
+        """Replace the state with a REST snapshot of balances, orders and prices"""
+        account_info = await self.client.account()
+        open_orders = await self.client.get_open_orders()
+        self.state.balances = {
+            b['asset']: (b['free'], b['locked'])
+            for b in account_info['balances'] if float(b['free']) + float(b['locked']) > 0
+        }
+        self.state.open_orders = {o['orderId']: o for o in open_orders}
+        self.state.update_time = account_info.get('updateTime')
+        for listener in self.state.listeners:
+            listener({'e': 'openOrders', 'orders': open_orders})
+        if self.tickers:
+            # Force a fresh bulk download, the stream only pushes symbols that changed
+            self.state.prices.updated = 0
+        await self.state.prices.snapshot()
+
+    def handle(self, event):
+        """Apply one stream event to the state"""
+        if isinstance(event, list):
+            self.state.prices.update({ticker['s']: float(ticker['c']) for ticker in event})
+            return
+
+        event_type = event.get('e')
+        if event_type == 'outboundAccountPosition':
+            self.state.update_time = event['u']
+            for balance in event['B']:
+                if float(balance['f']) + float(balance['l']) > 0:
+                    self.state.balances[balance['a']] = (balance['f'], balance['l'])
+                else:
+                    self.state.balances.pop(balance['a'], None)
+        elif event_type == 'executionReport':
+            self._handle_order(event)
+        elif event_type == 'listenKeyExpired':
+            raise ConnectionError("listenKey expired")
+
+        for listener in self.state.listeners:
+            listener(event)
+
+    def _handle_order(self, event):
+        order = order_of(event)
+        if order['status'] in OPEN_ORDER_STATUSES:
+            self.state.open_orders[order['orderId']] = order
+        else:
+            self.state.open_orders.pop(order['orderId'], None)
+
+        if event['x'] == 'TRADE' and self.ledger is not None:
+            self.ledger.add_symbol(event['s'])
+            # Pull the fill into the ledger now rather than on the next command
+            task = asyncio.get_running_loop().create_task(self._sync_ledger(event['s']))
+            self._syncs.add(task)
+            task.add_done_callback(self._syncs.discard)
+
+    async def _sync_ledger(self, symbol):
+        try:
+            await self.ledger.sync(symbol)
+        except Exception as e:
+            logger.warning("Ledger sync of %s failed: %s", symbol, e)
+
+    async def _run(self):
+        # websocket-client is only loaded when streams are on
+        from websocket import create_connection
+
+        delay = 1
+        while True:
+            keepalive = None
+            try:
+                listen_key = (await self.client.new_listen_key())['listenKey']
+                streams = f"!miniTicker@arr/{listen_key}" if self.tickers else listen_key
+                url = f"{self.stream_url}/stream?streams={streams}"
+                self._ws = await self._in_thread(create_connection, url, timeout=RECV_TIMEOUT)
+                keepalive = asyncio.create_task(self._keepalive(listen_key))
+                await self.resync()
+                self.state.live = True
+                delay = 1
+
+                while True:
+                    message = await self._in_thread(self._ws.recv)
+                    if not message:
+                        raise ConnectionError("Stream closed")
+                    self.handle(json.loads(message)['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Binance stream disconnected: %s, reconnecting in %ss", e, delay)
+            finally:
+                self.state.live = False
+                if keepalive is not None:
+                    keepalive.cancel()
+                self._disconnect()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _in_thread(self, func, *args, **kwargs):
+        return asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def _disconnect(self):
+        if self._ws is None:
+            return
+        # abort wakes up the thread blocked in recv, shutdown closes the socket
+        self._ws.abort()
+        self._ws.shutdown()
+        self._ws = None
+
+    async def _keepalive(self, listen_key):
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            try:
+                await self.client.renew_listen_key(listen_key)
+            except Exception as e:
+                logger.warning("listenKey keepalive failed: %s", e)
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+from binance.error import ClientError
+
+# Convert history can only be queried 30 days at a time
+CONVERT_HISTORY_DAYS = 30
+
+
+async def seed_assets(client):
+    """Assets the account holds, deposited or converted recently"""
+    account_info = await client.account()
+    assets = {b['asset'] for b in account_info['balances'] if float(b['free']) + float(b['locked']) > 0}
+
+    try:
+        assets.update(d['coin'] for d in await client.deposit_history())
+    except Exception:
+        pass
+
+    try:
+        now = int(time.time() * 1000)
+        start = now - CONVERT_HISTORY_DAYS * 24 * 60 * 60 * 1000
+        history = await client.get_convert_trade_history(startTime=start, endTime=now)
+        for convert in history.get('list', []):
+            assets.update((convert['fromAsset'], convert['toAsset']))
+    except Exception:
+        pass
+
+    return assets
+
+
+async def rebuild(client, ledger, markets, quotes):
+    """
+    Rebuild the traded symbols index of the ledger.
+    Every seeded asset is synced against each quote it is listed against,
+    the pairs that have trades end up in the index. Errors other than an
+    unknown symbol are raised, rather than leaving an index that misses pairs.
+    """
+    ledger.reset_symbols()
+    assets = await seed_assets(client)
+    await markets.refresh()
+    candidates = sorted({
+        symbol for symbol in (markets.symbol(asset, quote) for asset in assets for quote in quotes) if symbol
+    })
+    results = await asyncio.gather(*(ledger.sync(symbol) for symbol in candidates), return_exceptions=True)
+    for result in results:
+        if isinstance(result, ClientError) and "Invalid symbol" in str(result.error_message):
+            continue
+        if isinstance(result, Exception):
+            raise result
+    return ledger.traded_symbols()
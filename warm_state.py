@@ -0,0 +1,63 @@
+import json
+import logging
+import os
+import time
+
+from config import WARM_STATE_MAX_AGE, WARM_STATE_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class WarmState:
+    """
+    Prices and portfolio snapshots kept on disk, so the first commands after a
+    restart answer from them while the bot refreshes in the background.
+    Exchange metadata and the trade ledger with its watermarks are already on
+    disk, this covers what only lived in memory. A state older than max_age
+    seconds is ignored.
+    """
+
+    def __init__(self, path=None, max_age=None):
+        self.path = path or WARM_STATE_PATH
+        self.max_age = max_age if max_age is not None else WARM_STATE_MAX_AGE
+        self.portfolios = {}
+
+    def load(self, prices):
+        """Read the saved state and restore the prices, False if there is none worth using"""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if time.time() - state['saved'] > self.max_age:
+            return False
+        prices.restore(state['prices'])
+        self.portfolios = state['portfolios']
+        return True
+
+    def restore(self, account):
+        """Restore the portfolio snapshot of an account, once"""
+        portfolio = self.portfolios.pop(account.name, None)
+        if portfolio is None:
+            return False
+        try:
+            account.portfolio.restore(portfolio)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning("Saved portfolio of %s ignored: %s", account.name, e)
+            return False
+        return True
+
+    def save(self, prices, accounts):
+        state = {
+            'saved': time.time(),
+            'prices': prices.state(),
+            'portfolios': {a.name: a.portfolio.state() for a in accounts if a.portfolio.updated},
+        }
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # Only the next restart is slower without it
+            logger.warning("Could not save the warm state: %s", e)